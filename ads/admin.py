@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ExchangeProposal, Ad
+from .models import ExchangeProposal, Ad, UserStats
 
 
 class AdAdmin(admin.ModelAdmin):
@@ -10,5 +10,10 @@ class ProposalAdmin(admin.ModelAdmin):
     list_display = ['id', 'ad_sender', 'ad_receiver', 'status', 'created_at']
 
 
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'listings_count', 'proposals_sent', 'proposals_received', 'trades_accepted']
+
+
 admin.site.register(Ad, AdAdmin)
 admin.site.register(ExchangeProposal, ProposalAdmin)
+admin.site.register(UserStats, UserStatsAdmin)
@@ -1,11 +1,25 @@
-from rest_framework import generics, permissions, filters, serializers
-from django.db.models import Q
+from django.conf import settings
+from rest_framework import exceptions, generics, permissions, serializers, status
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from .cache import CachedResponseMixin
+from .conditional import ConditionalListMixin, ConditionalRetrieveMixin
+from .exports import AD_EXPORT_COLUMNS, PROPOSAL_EXPORT_COLUMNS, export_response
+from .facets import FACETS, ad_facets
+from .filters import FullTextSearchFilter
+from .imports import JSONArrayRowParser, NDJSONRowParser, import_ads
 from .models import Ad, ExchangeProposal
+from .pagination import CURSOR_PARAM, OptionalCursorPagination
+from .proposals import ProposalConflict, apply_batch, user_proposals
+from .recommendations import ranked_ads, recommendations
+from .sparse import SparseFieldsMixin
 from .serializers import (
-    AdCreateUpdateSerializer, AdRetrieveSerializer, ExchangeProposalCreateSerializer,
-    ExchangeProposalRetrieveSerializer, ExchangeProposalStatusSerializer)
+    AD_FIELD_COLUMNS, PROPOSAL_FIELD_COLUMNS, AdCreateUpdateSerializer, AdRetrieveSerializer, AdRowSerializer,
+    ExchangeProposalCreateSerializer, ExchangeProposalRetrieveSerializer, ExchangeProposalStatusSerializer,
+    ProposalBatchSerializer, SuggestionQuerySerializer, TradeCycleQuerySerializer)
 from .permissions import IsOwnerOrReadOnly, IsProposalReceiver, IsProposalParticipant
+from .renderers import CSVRenderer, NDJSONRenderer
+from .trades import trade_graph
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
@@ -33,15 +47,30 @@ ad_list_params = [
     openapi.Parameter(
         'search',
         openapi.IN_QUERY,
-        description="Search in title and description",
+        description="Full-text search in title and description, ordered by relevance",
+        type=openapi.TYPE_STRING
+    ),
+    openapi.Parameter(
+        'fields',
+        openapi.IN_QUERY,
+        description="Comma-separated fields to return, e.g. 'id,title'",
+        type=openapi.TYPE_STRING
+    ),
+    openapi.Parameter(
+        'cursor',
+        openapi.IN_QUERY,
+        description="Switch to cursor pagination; empty for the first page, then the cursor from 'next'",
         type=openapi.TYPE_STRING
     ),
 ]
 
 
-class AdListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Ad.objects.all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+class AdListCreateAPIView(CachedResponseMixin, SparseFieldsMixin, ConditionalListMixin, generics.ListCreateAPIView):
+    queryset = Ad.objects.select_related('user')
+    field_columns = AD_FIELD_COLUMNS
+    row_serializer_class = AdRowSerializer
+    pagination_class = OptionalCursorPagination
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
     filterset_fields = ['category', 'condition', 'user']
     search_fields = ['title', 'description']
 
@@ -51,48 +80,245 @@ class AdListCreateAPIView(generics.ListCreateAPIView):
     def get_serializer_class(self):
         return AdRetrieveSerializer if self.request.method == 'GET' else AdCreateUpdateSerializer
 
+    def get_facets(self):
+        """Facet counts for page-number pages; cursor pages stay free of COUNTs."""
+        # Read after filter_queryset has validated the parameters.
+        if not hasattr(self, '_facets'):
+            params = self.request.query_params
+            self._facets = None if CURSOR_PARAM in params else ad_facets(
+                params.get('search', ''), {'user': params.get('user')}, {name: params.get(name) for name in FACETS},
+            )
+        return self._facets
+
+    def conditional_response(self, request, state, times=()):
+        # Facets also count ads outside the filtered list; a change to those must change the ETag too.
+        return super().conditional_response(request, [state, self.get_facets()], times)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.get_facets() is not None:
+            response.data['facets'] = self.get_facets()
+        return response
+
     @swagger_auto_schema(manual_parameters=ad_list_params)
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
 
-class AdRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Ad.objects.all()
+class AdRetrieveUpdateDestroyAPIView(CachedResponseMixin, SparseFieldsMixin, ConditionalRetrieveMixin,
+                                     generics.RetrieveUpdateDestroyAPIView):
+    queryset = Ad.objects.select_related('user')
+    field_columns = AD_FIELD_COLUMNS
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
     def get_serializer_class(self):
         return AdRetrieveSerializer if self.request.method == 'GET' else AdCreateUpdateSerializer
 
 
-class ExchangeProposalListCreateAPIView(generics.ListCreateAPIView):
+class ExchangeProposalListCreateAPIView(SparseFieldsMixin, ConditionalListMixin, generics.ListCreateAPIView):
+    modified_fields = ('updated_at', 'ad_sender__updated_at', 'ad_receiver__updated_at')
+    field_columns = PROPOSAL_FIELD_COLUMNS
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OptionalCursorPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'ad_sender', 'ad_receiver']
 
     def get_queryset(self):
-        user = self.request.user
-        return ExchangeProposal.objects.filter(
-            Q(ad_sender__user=user) |
-            Q(ad_receiver__user=user)
+        return user_proposals(self.request.user.pk).select_related(
+            'ad_sender__user', 'ad_receiver__user'
         ).order_by('-created_at')
 
     def get_serializer_class(self):
         return ExchangeProposalRetrieveSerializer if self.request.method == 'GET' else ExchangeProposalCreateSerializer
 
     def perform_create(self, serializer):
-        if self.request.user == serializer.validated_data['ad_receiver'].user:
+        if self.request.user.pk == serializer.validated_data['ad_receiver'].user_id:
             raise serializers.ValidationError("You cannot send a proposal to yourself.")
-        if serializer.validated_data['ad_sender'].user != self.request.user:
+        if serializer.validated_data['ad_sender'].user_id != self.request.user.pk:
             raise serializers.ValidationError("You cannot send a proposal for this ad.")
 
         serializer.save(ad_sender=serializer.validated_data['ad_sender'])
 
 
-class ExchangeProposalRetrieveUpdateAPIView(generics.RetrieveUpdateAPIView):
-    queryset = ExchangeProposal.objects.all()
+class ExchangeProposalRetrieveUpdateAPIView(SparseFieldsMixin, ConditionalRetrieveMixin,
+                                            generics.RetrieveUpdateAPIView):
+    modified_fields = ('updated_at', 'ad_sender__updated_at', 'ad_receiver__updated_at')
+    field_columns = PROPOSAL_FIELD_COLUMNS
+    # Loaded for IsProposalParticipant whichever fields are requested.
+    base_columns = ('id', 'created_at', 'updated_at', 'ad_sender__user', 'ad_receiver__user')
+    queryset = ExchangeProposal.objects.select_related('ad_sender__user', 'ad_receiver__user')
 
     def get_serializer_class(self):
         return ExchangeProposalRetrieveSerializer if self.request.method == 'GET' else ExchangeProposalStatusSerializer
 
     def get_permissions(self):
         return [IsProposalParticipant()] if self.request.method == 'GET' else [IsProposalReceiver()]
+
+
+export_params = [
+    openapi.Parameter('format', openapi.IN_QUERY, description="'ndjson' (default) or 'csv'; or send Accept",
+                      type=openapi.TYPE_STRING, enum=['ndjson', 'csv']),
+]
+
+
+class ExportAPIView(generics.GenericAPIView):
+    """Stream every matching row as NDJSON or CSV, without pagination."""
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    export_columns = None
+    export_name = None
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(
+            request._request, queryset, self.export_columns, request.accepted_renderer.format, self.export_name,
+        )
+
+
+class AdExportAPIView(ExportAPIView):
+    queryset = Ad.objects.all()
+    filter_backends = AdListCreateAPIView.filter_backends
+    filterset_fields = AdListCreateAPIView.filterset_fields
+    search_fields = AdListCreateAPIView.search_fields
+    export_columns = AD_EXPORT_COLUMNS
+    export_name = 'ads'
+
+    @swagger_auto_schema(manual_parameters=ad_list_params[:4] + export_params)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class AdImportAPIView(generics.GenericAPIView):
+    """
+    Create many ads for the current user from an NDJSON or JSON array body,
+    each row shaped like a POST to the ad list. Valid rows are inserted and
+    the rest reported by row number, counted from 1.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [NDJSONRowParser, JSONArrayRowParser]
+
+    @swagger_auto_schema(request_body=AdCreateUpdateSerializer(many=True), responses={200: 'Import report'})
+    def post(self, request, *args, **kwargs):
+        # The parsers return a lazy iterator of rows; an empty body parses to an empty dict instead.
+        if isinstance(request.data, dict):
+            raise exceptions.ParseError('Send the rows as NDJSON or a JSON array.')
+        return Response(import_ads(request.user.pk, request.data))
+
+
+class ExchangeProposalExportAPIView(ExportAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    filterset_fields = ExchangeProposalListCreateAPIView.filterset_fields
+    export_columns = PROPOSAL_EXPORT_COLUMNS
+    export_name = 'proposals'
+
+    def get_queryset(self):
+        return user_proposals(self.request.user.pk)
+
+    @swagger_auto_schema(manual_parameters=export_params)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class ExchangeProposalBatchAPIView(generics.GenericAPIView):
+    """
+    Create, accept or reject up to 100 proposals in one request. Each
+    operation gets its own result; the valid ones are applied together.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ProposalBatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            results = apply_batch(request.user, serializer.validated_data['operations'])
+        except ProposalConflict as error:
+            return Response({'detail': str(error)}, status=status.HTTP_409_CONFLICT)
+        return Response({'results': results})
+
+
+trade_cycle_params = [
+    openapi.Parameter('ad', openapi.IN_QUERY, description="Only cycles through this ad of yours",
+                      type=openapi.TYPE_INTEGER),
+    openapi.Parameter('max_length', openapi.IN_QUERY, description="Longest cycle, in ads (default 4)",
+                      type=openapi.TYPE_INTEGER),
+    openapi.Parameter('limit', openapi.IN_QUERY, description="Number of cycles (default 10, at most 50)",
+                      type=openapi.TYPE_INTEGER),
+]
+
+
+class IndexLoading(exceptions.APIException):
+    """An in-memory index is still being loaded by this worker, e.g. right after it started."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Still loading, try again shortly.'
+    default_code = 'index_loading'
+    wait = 5  # Sent as Retry-After.
+
+
+class TradeCycleAPIView(generics.GenericAPIView):
+    """
+    Suggest multi-party trades for the current user's ads, shortest first.
+    In each cycle the owner of ``ads[i]`` gives it for the next ad, through
+    the pending proposal ``proposals[i]``; the last ad goes to the first owner.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(manual_parameters=trade_cycle_params)
+    def get(self, request, *args, **kwargs):
+        params = TradeCycleQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+
+        own_ads = Ad.objects.filter(user=request.user.pk)
+        if 'ad' in params:
+            own_ads = own_ads.filter(pk=params['ad'])
+        own_ads = list(own_ads.values_list('pk', flat=True))
+        if not trade_graph.sync():
+            raise IndexLoading()
+        cycles = trade_graph.find_cycles(
+            own_ads, params['max_length'], params['limit'], settings.TRADE_CYCLE_MAX_STEPS,
+        )
+
+        ads = Ad.objects.select_related('user').in_bulk({ad for cycle_ads, _ in cycles for ad in cycle_ads})
+        results = [
+            {
+                'length': len(cycle_ads),
+                'ads': AdRetrieveSerializer([ads[ad] for ad in cycle_ads], many=True).data,
+                'proposals': proposals,
+            }
+            for cycle_ads, proposals in cycles
+            if all(ad in ads for ad in cycle_ads)
+        ]
+        return Response({'results': results})
+
+
+suggestion_params = [
+    openapi.Parameter('limit', openapi.IN_QUERY, description="Number of similar listings (default 10, at most 50)",
+                      type=openapi.TYPE_INTEGER),
+]
+
+
+class AdSuggestionAPIView(generics.GenericAPIView):
+    """
+    Suggested trades for an ad, best first: up to ``limit`` of the current
+    user's ads most alike to it in ``your_ads``, and of other users' listings
+    in ``similar``. Each entry has a ``score``, the cosine similarity of their
+    TF-IDF vectors with a bonus for the same category.
+    """
+    queryset = Ad.objects.all()
+
+    @swagger_auto_schema(manual_parameters=suggestion_params)
+    def get(self, request, *args, **kwargs):
+        params = SuggestionQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        limit = params.validated_data['limit']
+        ad = self.get_object()
+        if not recommendations.sync():
+            raise IndexLoading()
+        own, similar = recommendations.suggest(ad, request.user.pk, limit)
+        context = self.get_serializer_context()
+        response = {}
+        for name, ranked in (('your_ads', own[:limit]), ('similar', similar)):
+            ads = ranked_ads(ranked)
+            data = AdRetrieveSerializer(ads, many=True, context=context).data
+            response[name] = [{'score': item.score, 'ad': row} for item, row in zip(ads, data)]
+        return Response(response)
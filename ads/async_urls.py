@@ -0,0 +1,10 @@
+"""Experimental async API endpoints (``ads.async_views``), routed only when ``ASYNC_API_ENABLED`` is set."""
+from django.urls import path
+
+from .async_views import AdListAsyncAPIView, AdRetrieveAsyncAPIView, ExchangeProposalListAsyncAPIView
+
+urlpatterns = [
+    path('api/async/ads/', AdListAsyncAPIView.as_view(), name='api_async_ad_list'),
+    path('api/async/ads/<int:pk>/', AdRetrieveAsyncAPIView.as_view(), name='api_async_ad_detail'),
+    path('api/async/proposals/', ExchangeProposalListAsyncAPIView.as_view(), name='api_async_proposal_list'),
+]
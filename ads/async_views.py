@@ -0,0 +1,60 @@
+"""
+Async entry points for the read-heavy API endpoints, served under
+``/api/async/`` by an ASGI server (``uvicorn barter_platform.asgi:application``).
+
+Each view runs its sync counterpart from ``ads.api_views`` whole, so
+responses, the response cache included, match the sync API. The work is
+one hop to a fixed pool of ``ASYNC_API_THREADS`` threads, not one hop per
+query. The pool's threads also keep their database connections across
+requests, which are checked before reuse as in a WSGI worker. Otherwise
+Django runs sync code under ASGI in a new thread per request and opens a
+new connection each time. The event loop stays free while a request runs.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.http import HttpResponse
+from django.views import View
+
+from .api_views import AdListCreateAPIView, AdRetrieveUpdateDestroyAPIView, ExchangeProposalListCreateAPIView
+
+executor = ThreadPoolExecutor(settings.ASYNC_API_THREADS, thread_name_prefix='async-api')
+
+
+class AsyncAPIView(View):
+    api_view_class = None
+
+    def respond(self, request, kwargs):
+        # What request_started and request_finished do for the connections of this thread.
+        close_old_connections()
+        try:
+            response = self.api_view_class.as_view()(request, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    async def get(self, request, **kwargs):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Other threads cannot read an in-memory database, as in tests.
+            respond = sync_to_async(self.respond)
+        else:
+            respond = sync_to_async(self.respond, thread_sensitive=False, executor=executor)
+        response = await respond(request, kwargs)
+        # A plain response: Django would render a template response again in a worker thread.
+        return HttpResponse(response.content, status=response.status_code, headers=response.headers)
+
+
+class AdListAsyncAPIView(AsyncAPIView):
+    api_view_class = AdListCreateAPIView
+
+
+class AdRetrieveAsyncAPIView(AsyncAPIView):
+    api_view_class = AdRetrieveUpdateDestroyAPIView
+
+
+class ExchangeProposalListAsyncAPIView(AsyncAPIView):
+    api_view_class = ExchangeProposalListCreateAPIView
@@ -0,0 +1,160 @@
+"""
+JWT authentication without a ``SELECT`` on ``auth_user`` per request.
+
+``CachedJWTAuthentication`` keeps resolved users in the cache for
+``JWT_USER_CACHE_TIMEOUT`` seconds; saving or deleting a user drops the
+entry (see ``ads.signals``). Only ``CACHED_USER_FIELDS`` and the digest of
+the password hash that simplejwt puts in tokens are cached, never the hash
+itself; other fields of a cached user load from the database on access.
+With ``JWT_STATELESS_SAFE_METHODS`` on, safe requests skip the user row
+entirely and get a ``StatelessUser`` built from the token claims; those
+users only carry an id, so read-only views must compare ids rather than
+user instances. Deactivated and deleted users are refused in both modes:
+stateless requests check them against ``RevokedToken`` rows kept for the
+access token lifetime, whose user ids are cached as one set. Revoking drops
+the set once the change commits, and an evicted set is reloaded, so the
+database stays the authority; a per-process cache only delays revocations
+in the other workers by up to ``JWT_USER_CACHE_TIMEOUT``.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import KEY_PREFIX, get_cache
+from .models import RevokedToken
+
+REVOKED_USERS_KEY = f'{KEY_PREFIX}:revoked-users'
+# Besides the primary key and USER_ID_FIELD: what authentication and permission checks read.
+CACHED_USER_FIELDS = ('username', 'is_active', 'is_staff', 'is_superuser')
+# RevokedToken rows of whole users; token jtis are hex and never start with it.
+REVOKED_USER_PREFIX = 'user:'
+
+
+def _user_key(user_id):
+    return f'{KEY_PREFIX}:user:{user_id}'
+
+
+def _user_id(value):
+    return get_user_model()._meta.pk.to_python(value)
+
+
+def _forget_revoked_users():
+    # Dropped again on commit, in case another worker reloaded the set before it.
+    cache = get_cache()
+    cache.delete(REVOKED_USERS_KEY)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(REVOKED_USERS_KEY))
+
+
+def forget_user(user):
+    """Drop ``user`` from the cache."""
+    get_cache().delete(_user_key(getattr(user, api_settings.USER_ID_FIELD)))
+
+
+def revoke_user(user_id):
+    """Refuse every access token of ``user_id`` until they expire."""
+    RevokedToken.objects.update_or_create(
+        jti=f'{REVOKED_USER_PREFIX}{user_id}',
+        defaults={'expires_at': timezone.now() + api_settings.ACCESS_TOKEN_LIFETIME},
+    )
+    _forget_revoked_users()
+
+
+def restore_user(user_id):
+    """Accept the tokens of a reactivated user again."""
+    RevokedToken.objects.filter(jti=f'{REVOKED_USER_PREFIX}{user_id}').delete()
+    _forget_revoked_users()
+
+
+def revoked_users():
+    """The ids of users whose access tokens are refused, from the cache or one query."""
+    cache = get_cache()
+    users = cache.get(REVOKED_USERS_KEY)
+    if users is None:
+        jtis = RevokedToken.objects.filter(
+            jti__startswith=REVOKED_USER_PREFIX, expires_at__gt=timezone.now(),
+        ).values_list('jti', flat=True)
+        users = frozenset(_user_id(jti[len(REVOKED_USER_PREFIX):]) for jti in jtis)
+        cache.set(REVOKED_USERS_KEY, users, settings.JWT_USER_CACHE_TIMEOUT)
+    return users
+
+
+def _cache_entry(user):
+    names = dict.fromkeys([user._meta.pk.attname, api_settings.USER_ID_FIELD, *CACHED_USER_FIELDS])
+    return {name: getattr(user, name) for name in names}, get_md5_hash_password(user.password)
+
+
+def _cached_instance(entry):
+    fields, password_digest = entry
+    model = get_user_model()
+    # from_db() takes the values in field order; the fields left out are deferred.
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in fields]
+    user = model.from_db(model.objects.db, names, [fields[name] for name in names])
+    user.password_digest = password_digest
+    return user
+
+
+def get_cached_user(user_id):
+    """
+    Return the user with ``user_id``, from the cache when possible; None if
+    there is none. ``password_digest`` is compared with the token's
+    revocation claim.
+    """
+    cache = get_cache()
+    entry = cache.get(_user_key(user_id))
+    if entry is not None:
+        return _cached_instance(entry)
+    user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+    if user is not None:
+        entry = _cache_entry(user)
+        cache.set(_user_key(user_id), entry, settings.JWT_USER_CACHE_TIMEOUT)
+        user.password_digest = entry[1]
+    return user
+
+
+class StatelessUser(TokenUser):
+    """A ``TokenUser`` whose id has the user model's pk type; tokens carry it as a string."""
+
+    @cached_property
+    def id(self):
+        return _user_id(self.token[api_settings.USER_ID_CLAIM])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        # Authenticators are instantiated per request, so this is safe to keep.
+        self.request = request
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        if settings.JWT_STATELESS_SAFE_METHODS and self.request.method in SAFE_METHODS:
+            if _user_id(user_id) in revoked_users():
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            return StatelessUser(validated_token)
+
+        user = get_cached_user(user_id)
+        # The same checks as JWTAuthentication.get_user, against the cached row.
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != user.password_digest
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -0,0 +1,175 @@
+"""
+In-process benchmarks of the hot paths.
+
+A case is a function registered with ``@case(name)``; it receives a
+``BenchmarkEnv`` for the current dataset scale and returns the zero-argument
+callable to time. ``run()`` seeds each scale, counts the queries of one call,
+then times ``iterations`` calls and reports latency percentiles. A callable
+with an ``objects`` attribute also reports objects per second at p50, and
+one with a ``bytes`` attribute reports that payload size.
+"""
+import importlib
+import platform
+import random
+import sqlite3
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..datagen import DataGenerator
+from ..models import Ad
+from ..recommendations import recommendations as recommendation_index  # Not to be shadowed by the submodule.
+from ..trades import trade_graph
+
+CASE_MODULES = ['ads.benchmarks.views', 'ads.benchmarks.trades', 'ads.benchmarks.tokens', 'ads.benchmarks.renderers',
+                'ads.benchmarks.recommendations']
+CASES = {}
+
+
+def case(name):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+
+def load_cases():
+    for module in CASE_MODULES:
+        importlib.import_module(module)
+    return CASES
+
+
+class BenchmarkEnv:
+    """Dataset handles shared by the cases of one scale."""
+
+    def __init__(self, scale, seed=0):
+        self.scale = scale
+        self.random = random.Random(seed)
+        self.ad_ids = list(Ad.objects.values_list('pk', flat=True))
+        # The busiest trader has the largest inbox, the worst case for proposal pages.
+        self.trader = User.objects.annotate(
+            received=Count('ads__received_proposals')
+        ).order_by('-received').first()
+        self.search_term = Ad.objects.values_list('title', flat=True).first().split()[-1]
+        # Loaded up front, as in a warm worker; requests would start them in the background.
+        trade_graph.load()
+        recommendation_index.load()
+
+        self.anonymous = Client()
+        self.logged_in = Client()
+        self.logged_in.force_login(self.trader)
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.trader).access_token}')
+
+    def random_ad_id(self):
+        return self.random.choice(self.ad_ids)
+
+
+def seed_scale(scale, current, seed=0):
+    """Grow the dataset from ``current`` to ``scale`` ads (users and proposals follow)."""
+    if scale <= current:
+        return
+    users = max(2, scale // 10) - (max(2, current // 10) if current else 0)
+    DataGenerator(seed=seed + scale, username_prefix=f'bench{scale}_').generate(
+        users=users, ads=scale - current, proposals=2 * (scale - current)
+    )
+
+
+def summarize(samples):
+    samples_ms = [sample * 1000 for sample in samples]
+    percentiles = statistics.quantiles(samples_ms, n=100, method='inclusive')
+    return {
+        'iterations': len(samples_ms),
+        'mean_ms': statistics.fmean(samples_ms),
+        'min_ms': min(samples_ms),
+        'p50_ms': percentiles[49],
+        'p90_ms': percentiles[89],
+        'p99_ms': percentiles[98],
+        'max_ms': max(samples_ms),
+    }
+
+
+def measure(func, iterations, warmup=3):
+    for _ in range(warmup):
+        func()
+    # Requests clear the query log when they start; begin from an empty one.
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    query_count = len(queries.captured_queries)
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    result = summarize(samples)
+    result['queries'] = query_count
+    if hasattr(func, 'objects'):
+        result['objects_per_s'] = func.objects / (result['p50_ms'] / 1000)
+    if hasattr(func, 'bytes'):
+        result['bytes'] = func.bytes
+    return result
+
+
+def run(scales, names=None, iterations=50, seed=0, progress=None):
+    """Benchmark ``names`` (all cases when None) at every scale; returns the JSON-ready report."""
+    progress = progress or (lambda message: None)
+    cases = load_cases()
+    names = names or sorted(cases)
+    unknown = set(names) - set(cases)
+    if unknown:
+        raise KeyError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    current = 0
+    for scale in sorted(scales):
+        progress(f'Seeding {scale} ads...')
+        seed_scale(scale, current, seed)
+        current = scale
+        env = BenchmarkEnv(scale, seed)
+        for name in names:
+            result = measure(cases[name](env), iterations)
+            results[f'{name}@{scale}'] = result
+            extra = ''.join([
+                f", {result['objects_per_s']:.0f} objects/s" if 'objects_per_s' in result else '',
+                f", {result['bytes']} bytes" if 'bytes' in result else '',
+            ])
+            progress(f"{name}@{scale}: p50 {result['p50_ms']:.2f}ms, p99 {result['p99_ms']:.2f}ms, "
+                     f"{result['queries']} queries{extra}")
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'iterations': iterations,
+            'scales': sorted(scales),
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=0.2):
+    """
+    List regressions of ``report`` against ``baseline``: p50 latency more
+    than ``threshold`` slower, or more queries than before.
+    """
+    regressions = []
+    for key, result in report['results'].items():
+        previous = baseline.get('results', {}).get(key)
+        if previous is None:
+            continue
+        if result['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+            regressions.append(f"{key}: p50 {previous['p50_ms']:.2f}ms -> {result['p50_ms']:.2f}ms")
+        if result['queries'] > previous['queries']:
+            regressions.append(f"{key}: queries {previous['queries']} -> {result['queries']}")
+    return regressions
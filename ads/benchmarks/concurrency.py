@@ -0,0 +1,134 @@
+"""
+Multi-process read/write throughput against a SQLite file, like several
+Gunicorn workers sharing ``db.sqlite3``.
+
+Each profile runs the same workload: reads fetch a page of a listing table
+and count it, writes read a row and then insert one inside a transaction,
+the shape of a proposal decision. ``default`` is SQLite as Django used it
+before: a new connection per request, rollback journal, deferred
+transactions and Python's 5 second timeout. ``configured`` applies the
+options in ``settings.DATABASES['default']`` and keeps one connection per
+worker.
+"""
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+
+PAGE_SIZE = 20
+
+
+def profiles():
+    database = settings.DATABASES['default']
+    options = database.get('OPTIONS', {})
+    return {
+        'default': {'persistent': False, 'timeout': 5.0, 'transaction_mode': 'DEFERRED', 'init_commands': []},
+        'configured': {
+            'persistent': bool(database.get('CONN_MAX_AGE')),
+            'timeout': options.get('timeout', 5.0),
+            'transaction_mode': options.get('transaction_mode') or 'DEFERRED',
+            'init_commands': [command for command in options.get('init_command', '').split(';') if command.strip()],
+        },
+    }
+
+
+def create_database(path, rows):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, title TEXT NOT NULL, created_at REAL NOT NULL)')
+    conn.execute('CREATE INDEX item_created_at ON item (created_at)')
+    conn.execute('BEGIN')
+    conn.executemany('INSERT INTO item (title, created_at) VALUES (?, ?)',
+                     ((f'Item {i}', float(i)) for i in range(rows)))
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def _connect(path, profile):
+    conn = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None)
+    for command in profile['init_commands']:
+        conn.execute(command)
+    return conn
+
+
+def _read(conn):
+    conn.execute('SELECT id, title FROM item ORDER BY created_at DESC LIMIT ?', (PAGE_SIZE,)).fetchall()
+    conn.execute('SELECT COUNT(*) FROM item').fetchone()
+
+
+def _write(conn, profile, rand):
+    conn.execute(f"BEGIN {profile['transaction_mode']}")
+    try:
+        conn.execute('SELECT title FROM item WHERE id = ?', (rand.randrange(1, 1000),)).fetchone()
+        conn.execute('INSERT INTO item (title, created_at) VALUES (?, ?)', ('New item', time.time()))
+        conn.execute('COMMIT')
+    except sqlite3.Error:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _worker(path, profile, duration, write_ratio, seed, results):
+    rand = random.Random(seed)
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    conn = _connect(path, profile) if profile['persistent'] else None
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        request_conn = conn or _connect(path, profile)
+        write = rand.random() < write_ratio
+        try:
+            if write:
+                _write(request_conn, profile, rand)
+            else:
+                _read(request_conn)
+            counts['writes' if write else 'reads'] += 1
+        except sqlite3.OperationalError:
+            counts['errors'] += 1
+        finally:
+            if conn is None:
+                request_conn.close()
+    if conn is not None:
+        conn.close()
+    results.put(counts)
+
+
+def run_profile(profile, workers=4, duration=5.0, write_ratio=0.2, rows=10000):
+    """Run ``workers`` processes on a fresh database for ``duration`` seconds; returns the throughput."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.sqlite3')
+        create_database(path, rows)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_worker, args=(path, profile, duration, write_ratio, seed, results))
+            for seed in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        for _ in processes:
+            for key, value in results.get().items():
+                totals[key] += value
+        for process in processes:
+            process.join()
+    return {
+        'workers': workers,
+        'duration_s': duration,
+        'reads_per_s': totals['reads'] / duration,
+        'writes_per_s': totals['writes'] / duration,
+        'errors': totals['errors'],
+    }
+
+
+def run(names=None, progress=None, **kwargs):
+    """Benchmark every profile in ``names`` (all when None); returns ``{name: result}``."""
+    progress = progress or (lambda message: None)
+    available = profiles()
+    results = {}
+    for name in names or sorted(available):
+        result = run_profile(available[name], **kwargs)
+        results[name] = result
+        progress(f"{name}: {result['reads_per_s']:.0f} reads/s, {result['writes_per_s']:.0f} writes/s, "
+                 f"{result['errors']} errors")
+    return results
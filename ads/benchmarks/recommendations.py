@@ -0,0 +1,51 @@
+import random
+from collections import Counter
+
+from django.urls import reverse
+
+from ..datagen import _power_law
+from ..models import Ad
+from ..recommendations import CATEGORIES, RecommendationIndex
+from . import case
+from .views import _get
+
+# Synthetic indexes are sized from the scale: 10000 gives a million ads.
+SYNTHETIC_ADS_PER_SCALE = 100
+SYNTHETIC_VOCABULARY = 50000
+SYNTHETIC_WORDS_PER_AD = 24
+
+
+@case('api_ad_suggestions')
+def api_ad_suggestions(env):
+    return _get(env.api, reverse('api_ad_suggestions', kwargs={'pk': env.random_ad_id()}))
+
+
+@case('recommendation_load')
+def recommendation_load(env):
+    return RecommendationIndex().load
+
+
+@case('recommendations_synthetic')
+def recommendations_synthetic(env):
+    """Rank suggestions in an index far larger than the seeded database, without touching it."""
+    rand = random.Random(env.scale)
+    ad_count = env.scale * SYNTHETIC_ADS_PER_SCALE
+    user_count = max(2, ad_count // 5)
+    categories = list(CATEGORIES)
+    # Word frequencies follow Zipf's law, as in real listing text.
+    words = [f'w{rank}' for rank in range(SYNTHETIC_VOCABULARY)]
+    weights = _power_law(SYNTHETIC_VOCABULARY, 1.0)
+
+    index = RecommendationIndex()
+    entries = []
+    for ad_id in range(ad_count):
+        counts = Counter(rand.choices(words, cum_weights=weights, k=SYNTHETIC_WORDS_PER_AD))
+        entries.append((ad_id, rand.randrange(user_count), rand.randrange(len(categories)),
+                        [index._term_id(word) for word in counts], list(counts.values())))
+    index._rebuild(entries)
+
+    def call():
+        text = rand.choices(words, cum_weights=weights, k=SYNTHETIC_WORDS_PER_AD)
+        ad = Ad(pk=-1, category=rand.choice(categories), title=' '.join(text[:4]), description=' '.join(text[4:]))
+        index.suggest(ad, rand.randrange(user_count))
+    return call
@@ -0,0 +1,41 @@
+"""Encode time and payload size of a large proposal page, per renderer."""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from ..models import ExchangeProposal
+from ..renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+from ..serializers import ExchangeProposalRetrieveSerializer
+from . import case
+
+RENDER_PAGE_SIZE = 100
+
+
+def _render(env, renderer):
+    queryset = ExchangeProposal.objects.select_related(
+        'ad_sender__user', 'ad_receiver__user'
+    ).order_by('-created_at')[:RENDER_PAGE_SIZE]
+    context = {'request': APIRequestFactory().get('/')}
+    data = {'results': ExchangeProposalRetrieveSerializer(queryset, many=True, context=context).data}
+
+    def call():
+        renderer.render(data, renderer.media_type)
+    call.objects = RENDER_PAGE_SIZE
+    call.bytes = len(renderer.render(data, renderer.media_type))
+    return call
+
+
+@case('render_proposal_page_json')
+def render_proposal_page_json(env):
+    """DRF's stock renderer, the baseline."""
+    return _render(env, JSONRenderer())
+
+
+@case('render_proposal_page_orjson')
+def render_proposal_page_orjson(env):
+    return _render(env, ORJSONRenderer())
+
+
+if msgpack is not None:
+    @case('render_proposal_page_msgpack')
+    def render_proposal_page_msgpack(env):
+        return _render(env, MessagePackRenderer())
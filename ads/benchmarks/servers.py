@@ -0,0 +1,121 @@
+"""
+WSGI against ASGI at equal worker counts, over real sockets.
+
+Gunicorn's sync workers serve the sync API and Uvicorn workers serve the
+async variants under ``/api/async/``, each in its own process group on a
+seeded copy of the database. Requests carry a JWT so neither side answers
+from the anonymous response cache. The load generator opens one connection
+per request with ``concurrency`` requests in flight.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+from . import summarize
+
+SERVERS = {
+    'wsgi': ['-m', 'gunicorn', 'barter_platform.wsgi', '--workers', '{workers}', '--bind', '127.0.0.1:{port}',
+             '--log-level', 'warning'],
+    'asgi': ['-m', 'uvicorn', 'barter_platform.asgi:application', '--workers', '{workers}', '--port', '{port}',
+             '--log-level', 'warning'],
+}
+# The endpoint each server handles, by name: sync views for WSGI, their async variants for ASGI.
+ENDPOINTS = {
+    'ad_list': {'wsgi': '/api/ads/', 'asgi': '/api/async/ads/'},
+    'proposal_list': {'wsgi': '/api/proposals/', 'asgi': '/api/async/proposals/'},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def fetch(port, path, token):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n'
+            f'Connection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def load(port, path, token, concurrency, requests):
+    """Send ``requests`` GETs, ``concurrency`` at a time; returns the latency summary and throughput."""
+    samples, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, path, token)
+            except OSError:
+                status = None
+            samples.append(time.perf_counter() - started)
+            errors += status != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    result = summarize(samples)
+    result.update(requests_per_s=requests / elapsed, errors=errors)
+    return result
+
+
+class Server:
+    def __init__(self, kind, workers, database):
+        self.port = free_port()
+        args = [arg.format(workers=workers, port=self.port) for arg in SERVERS[kind]]
+        env = dict(os.environ, SQLITE_PATH=str(database), DJANGO_SETTINGS_MODULE='barter_platform.settings',
+                   ASYNC_API_ENABLED='1')
+        self.process = subprocess.Popen([sys.executable, *args], cwd=settings.BASE_DIR, env=env)
+
+    def wait_ready(self, token, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if asyncio.run(fetch(self.port, '/api/ads/', token)) == 200:
+                    return
+            except OSError:
+                pass
+            if self.process.poll() is not None:
+                raise RuntimeError(f'Server exited with code {self.process.returncode}.')
+            time.sleep(0.2)
+        raise RuntimeError('Server did not start in time.')
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+def run(database, token, workers=2, concurrency_levels=(1, 16, 64), requests=1000, progress=None):
+    """Benchmark every server and endpoint at every concurrency level; returns ``{key: result}``."""
+    progress = progress or (lambda message: None)
+    results = {}
+    for kind in SERVERS:
+        server = Server(kind, workers, database)
+        try:
+            server.wait_ready(token)
+            for endpoint, paths in ENDPOINTS.items():
+                for concurrency in concurrency_levels:
+                    result = asyncio.run(load(server.port, paths[kind], token, concurrency, requests))
+                    key = f'{kind}:{endpoint}@{concurrency}'
+                    results[key] = result
+                    progress(f"{key}: {result['requests_per_s']:.0f} req/s, p50 {result['p50_ms']:.2f}ms, "
+                             f"p99 {result['p99_ms']:.2f}ms, {result['errors']} errors")
+        finally:
+            server.stop()
+    return results
@@ -0,0 +1,33 @@
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import case
+
+
+@case('api_token_refresh')
+def api_token_refresh(env):
+    """Rotate a refresh token chain: every call revokes the token the previous one returned."""
+    client = APIClient()
+    url = reverse('token_refresh')
+    state = {'refresh': str(RefreshToken.for_user(env.trader))}
+
+    def call():
+        response = client.post(url, state)
+        assert response.status_code == 200, response.status_code
+        state['refresh'] = response.data['refresh']
+    return call
+
+
+@case('api_token_refresh_revoked')
+def api_token_refresh_revoked(env):
+    """Replay a refresh token that has already been rotated."""
+    client = APIClient()
+    url = reverse('token_refresh')
+    refresh = {'refresh': str(RefreshToken.for_user(env.trader))}
+    assert client.post(url, refresh).status_code == 200
+
+    def call():
+        response = client.post(url, refresh)
+        assert response.status_code == 401, response.status_code
+    return call
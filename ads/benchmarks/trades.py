@@ -0,0 +1,50 @@
+import random
+
+from django.conf import settings
+from django.urls import reverse
+
+from ..datagen import _power_law
+from ..trades import TradeGraph
+from . import case
+from .views import _get
+
+# Synthetic graphs are sized from the scale: 10000 gives 100000 ads and a million proposals.
+SYNTHETIC_ADS_PER_SCALE = 10
+SYNTHETIC_EDGES_PER_SCALE = 100
+SYNTHETIC_ADS_PER_USER = 5
+
+
+@case('api_trade_cycles')
+def api_trade_cycles(env):
+    return _get(env.api, reverse('api_trade_cycles'), {'max_length': 4})
+
+
+@case('trade_graph_load')
+def trade_graph_load(env):
+    return TradeGraph().load
+
+
+@case('trade_cycles_synthetic')
+def trade_cycles_synthetic(env):
+    """Search an in-memory graph far larger than the seeded database, without touching it."""
+    rand = random.Random(env.scale)
+    ad_count = env.scale * SYNTHETIC_ADS_PER_SCALE
+    user_count = max(2, ad_count // SYNTHETIC_ADS_PER_USER)
+    owners = [rand.randrange(user_count) for _ in range(ad_count)]
+    user_ads = {}
+    for ad, owner in enumerate(owners):
+        user_ads.setdefault(owner, []).append(ad)
+
+    graph = TradeGraph()
+    edge_count = env.scale * SYNTHETIC_EDGES_PER_SCALE
+    # Popular ads receive most proposals, as in the generated datasets.
+    receivers = rand.choices(range(ad_count), cum_weights=_power_law(ad_count, 0.8), k=edge_count)
+    for proposal_id, receiver in enumerate(receivers):
+        sender = rand.randrange(ad_count)
+        if owners[sender] != owners[receiver]:
+            graph.add_edge(proposal_id, sender, receiver, owners[sender], owners[receiver])
+    users = list(user_ads)
+
+    def call():
+        graph.find_cycles(user_ads[rand.choice(users)], 4, 10, settings.TRADE_CYCLE_MAX_STEPS)
+    return call
@@ -0,0 +1,90 @@
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory
+
+from ..models import Ad, ExchangeProposal
+from ..serializers import AD_FIELD_COLUMNS, AdRetrieveSerializer, AdRowSerializer, ExchangeProposalRetrieveSerializer
+from . import case
+
+SERIALIZE_PAGE_SIZE = 100
+
+
+def _get(client, url, params=None):
+    def call():
+        response = client.get(url, params)
+        assert response.status_code == 200, response.status_code
+    return call
+
+
+@case('html_ad_list')
+def html_ad_list(env):
+    return _get(env.anonymous, reverse('ad_list'))
+
+
+@case('html_ad_list_search')
+def html_ad_list_search(env):
+    return _get(env.anonymous, reverse('ad_list'), {'search': env.search_term})
+
+
+@case('html_ad_detail')
+def html_ad_detail(env):
+    def call():
+        response = env.anonymous.get(reverse('ad_detail', kwargs={'pk': env.random_ad_id()}))
+        assert response.status_code == 200, response.status_code
+    return call
+
+
+@case('html_proposal_list')
+def html_proposal_list(env):
+    return _get(env.logged_in, reverse('manage_proposals'))
+
+
+@case('api_ad_list')
+def api_ad_list(env):
+    return _get(env.api, reverse('api_ad_list'))
+
+
+@case('api_ad_list_search')
+def api_ad_list_search(env):
+    return _get(env.api, reverse('api_ad_list'), {'search': env.search_term})
+
+
+@case('api_ad_list_fields')
+def api_ad_list_fields(env):
+    return _get(env.api, reverse('api_ad_list'), {'fields': 'id,title,category'})
+
+
+@case('api_proposal_list')
+def api_proposal_list(env):
+    return _get(env.api, reverse('api_proposal_list'))
+
+
+@case('serialize_proposal_page')
+def serialize_proposal_page(env):
+    queryset = ExchangeProposal.objects.filter(
+        ad_receiver__user=env.trader
+    ).select_related('ad_sender__user', 'ad_receiver__user').order_by('-created_at')
+
+    def call():
+        ExchangeProposalRetrieveSerializer(queryset[:9], many=True).data
+    return call
+
+
+def _serialize(serializer_class, queryset):
+    """Serialize a page of ``SERIALIZE_PAGE_SIZE`` ads, from the query to the output dicts."""
+    context = {'request': APIRequestFactory().get('/')}
+
+    def call():
+        serializer_class(queryset[:SERIALIZE_PAGE_SIZE], many=True, context=context).data
+    call.objects = SERIALIZE_PAGE_SIZE
+    return call
+
+
+@case('serialize_ad_page_objects')
+def serialize_ad_page_objects(env):
+    return _serialize(AdRetrieveSerializer, Ad.objects.select_related('user').order_by('-created_at'))
+
+
+@case('serialize_ad_page_rows')
+def serialize_ad_page_rows(env):
+    columns = {column for columns in AD_FIELD_COLUMNS.values() for column in columns}
+    return _serialize(AdRowSerializer, Ad.objects.order_by('-created_at').values(*columns))
@@ -0,0 +1,209 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.request import Request
+
+KEY_PREFIX = 'ads'
+STAT_NAMES = ('hits', 'misses')
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:version:{namespace}'
+
+
+def _initial_version():
+    # Seeded from the clock so a lost version key never reuses an old number.
+    return int(time.time() * 1000)
+
+
+def get_versions(namespaces):
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _incr(key, initial=0):
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+        return cache.incr(key)
+
+
+def incr_version(namespace):
+    """Increment ``namespace`` once, right now, and return its new version."""
+    return _incr(_version_key(namespace), _initial_version())
+
+
+def bump_version(namespace):
+    """
+    Invalidate every cached response depending on ``namespace``. The bump is
+    repeated after commit so a response cached from pre-commit data while the
+    transaction was open does not survive it.
+    """
+    incr_version(namespace)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: incr_version(namespace))
+
+
+def _log_key(namespace, version):
+    return f'{KEY_PREFIX}:log:{namespace}:{version}'
+
+
+def log_changes(namespace, changes):
+    """Increment ``namespace`` and store ``changes`` under the new version, which is returned."""
+    version = incr_version(namespace)
+    get_cache().set(_log_key(namespace, version), changes, settings.INDEX_LOG_TIMEOUT)
+    return version
+
+
+def read_changes(namespace, since, until):
+    """
+    ``(version, changes)`` logged after ``since`` up to ``until``, in order.
+    Stops before the first entry that is missing: expired, or not stored yet
+    by a writer that has just incremented the version.
+    """
+    keys = [_log_key(namespace, version) for version in range(since + 1, until + 1)]
+    entries = get_cache().get_many(keys)
+    logged = []
+    for version, key in enumerate(keys, since + 1):
+        if key not in entries:
+            break
+        logged.append((version, entries[key]))
+    return logged
+
+
+def _stat_key(name, stat):
+    return f'{KEY_PREFIX}:stats:{name}:{stat}'
+
+
+def record(name, stat):
+    _incr(_stat_key(name, stat))
+
+
+def cache_stats():
+    """Return ``{view_name: {'hits': n, 'misses': n}}`` for every cached view."""
+    keys = {
+        (name, stat): _stat_key(name, stat)
+        for name in sorted(CachedResponseMixin.registry) for stat in STAT_NAMES
+    }
+    values = get_cache().get_many(list(keys.values()))
+    stats = {}
+    for (name, stat), key in keys.items():
+        stats.setdefault(name, {})[stat] = values.get(key, 0)
+    return stats
+
+
+class CachedResponseMixin:
+    """
+    Cache successful anonymous GET responses, keyed on the sorted query
+    string and the current version of each namespace in ``cache_namespaces``.
+    Entries are never served stale: writes bump the version instead of
+    waiting for ``RESPONSE_CACHE_TIMEOUT``, which only frees space. A view
+    sets ``partial_response`` to keep a response it could not complete, e.g.
+    while an index loads, out of the cache.
+    """
+    cache_namespaces = ('ads',)
+    partial_response = False
+    registry = set()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        CachedResponseMixin.registry.add(cls.cache_name())
+
+    @classmethod
+    def cache_name(cls):
+        return cls.__name__
+
+    def is_cacheable(self, request):
+        return (
+            settings.RESPONSE_CACHE_ENABLED
+            and request.method == 'GET'
+            and 'HTTP_AUTHORIZATION' not in request.META
+            and not request.user.is_authenticated
+        )
+
+    def response_variant(self, request, kwargs):
+        """
+        The representation asked for besides the URL. API views key on the
+        renderer ``Accept`` selects rather than on the raw header, which
+        differs between browsers; HTML views have a single representation.
+        """
+        if not hasattr(self, 'get_renderers'):
+            return ''
+        try:
+            renderer, _ = self.get_content_negotiator().select_renderer(
+                Request(request), self.get_renderers(), kwargs.get(self.settings.FORMAT_SUFFIX_KWARG),
+            )
+        except NotAcceptable:
+            return request.META.get('HTTP_ACCEPT', '')
+        return renderer.format
+
+    def response_cache_key(self, request, kwargs):
+        params = sorted((key, value.strip()) for key, values in request.GET.lists() for value in values)
+        parts = [
+            request.path,
+            repr(sorted(kwargs.items())),
+            repr(params),
+            self.response_variant(request, kwargs),
+        ]
+        digest = hashlib.md5('\n'.join(parts).encode(), usedforsecurity=False).hexdigest()
+        versions = '.'.join(str(version) for version in get_versions(self.cache_namespaces))
+        return f'{KEY_PREFIX}:response:{self.cache_name()}:{versions}:{digest}'
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = self.response_cache_key(request, kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            record(self.cache_name(), 'hits')
+            status, headers, content = cached
+            response = get_conditional_response(
+                request, etag=headers.get('ETag'), last_modified=parse_http_date_safe(headers.get('Last-Modified', '')),
+            )
+            if response is not None:
+                for header in ('ETag', 'Last-Modified'):
+                    if header in headers:
+                        response[header] = headers[header]
+            else:
+                response = HttpResponse(content, status=status, headers=headers)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record(self.cache_name(), 'misses')
+        response = super().dispatch(request, *args, **kwargs)
+        response['X-Cache'] = 'MISS'
+        if response.status_code == 200 and not self.partial_response:
+            def store(rendered):
+                if not rendered.cookies:
+                    cache.set(
+                        key,
+                        (rendered.status_code, dict(rendered.headers), rendered.content),
+                        settings.RESPONSE_CACHE_TIMEOUT,
+                    )
+
+            if hasattr(response, 'add_post_render_callback'):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+        return response
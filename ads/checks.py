@@ -0,0 +1,33 @@
+import os
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+# Gunicorn and Uvicorn both read their default worker count from here.
+WORKERS_VARIABLE = 'WEB_CONCURRENCY'
+
+
+def _process_local_cache_error():
+    if settings.RESPONSE_CACHE_ENABLED and isinstance(caches[settings.RESPONSE_CACHE_ALIAS], LocMemCache):
+        return [Error(
+            'The response cache uses a per-process LocMemCache, so writes only invalidate the worker '
+            'that made them.',
+            hint='Point CACHE_BACKEND and CACHE_LOCATION at a shared cache such as Redis or Memcached, '
+                 'or set RESPONSE_CACHE_ENABLED = False.',
+            id='ads.E001',
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if int(os.getenv(WORKERS_VARIABLE) or 1) > 1:
+        return _process_local_cache_error()
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache_deploy(app_configs, **kwargs):
+    return _process_local_cache_error()
@@ -0,0 +1,113 @@
+"""
+Conditional GET for the API: strong ETags built from ``updated_at``, so a
+client polling an unchanged resource gets ``304 Not Modified`` before
+anything is serialized. Details also send ``Last-Modified``, in whole
+seconds like ``If-Modified-Since``. Lists do not: a newest time says nothing
+of rows removed from the set, which only the ETag covers.
+
+``modified_fields`` lists the ``updated_at`` columns a response depends on,
+its own and those of related rows it nests. Details are validated against
+the object the view loads anyway. Page-number lists replace the paginator's
+COUNT with one aggregate of the row count and the newest value of each
+field, which changes whenever a row in the filtered set is added, edited or
+removed. Cursor pages are validated against the rows on the page. Writes
+through ``QuerySet.update()`` must set ``updated_at`` themselves.
+
+Every representation nests the owners' usernames, which have no
+``updated_at``: renaming a user bumps the ``usernames`` version
+(``ads.signals``), part of every ETag. ``Last-Modified`` only follows the
+rows, so clients relying on ``If-Modified-Since`` alone see a rename once
+the row itself changes.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .cache import get_versions
+from .pagination import CURSOR_PARAM
+
+# Bumped when a user is renamed; nested owners show their username.
+USERNAMES_NAMESPACE = 'usernames'
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+class ConditionalMixin:
+    modified_fields = ('updated_at',)
+    etag = last_modified = None
+
+    def get_modified_fields(self):
+        return self.modified_fields
+
+    def modified_times(self, obj):
+        """The ``modified_fields`` of a model instance or of a ``values()`` row."""
+        if isinstance(obj, dict):
+            return [obj[field] for field in self.get_modified_fields()]
+        times = []
+        for field in self.get_modified_fields():
+            value = obj
+            for name in field.split('__'):
+                value = getattr(value, name)
+            times.append(value)
+        return times
+
+    def conditional_response(self, request, state, times=()):
+        """
+        A ``304`` (or ``412``) response when ``request``'s validators match
+        ``state``, or the newest of ``times``, else None.
+        """
+        self.etag = make_etag(
+            request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), request.user.pk,
+            get_versions([USERNAMES_NAMESPACE])[0], state,
+        )
+        times = [time for time in times if time is not None]
+        # HTTP dates have no fractions; compared with them, microseconds would never match.
+        self.last_modified = int(max(times).timestamp()) if times else None
+        return get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if self.last_modified is not None:
+                response['Last-Modified'] = http_date(self.last_modified)
+        return response
+
+
+class ConditionalRetrieveMixin(ConditionalMixin):
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        times = self.modified_times(instance)
+        response = self.conditional_response(request, [instance.pk, *times], times)
+        if response is not None:
+            return response
+        return Response(self.get_serializer(instance).data)
+
+
+class ConditionalListMixin(ConditionalMixin):
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if CURSOR_PARAM in request.query_params:
+            page = self.paginate_queryset(queryset)
+            rows = [(obj['id'] if isinstance(obj, dict) else obj.pk, *self.modified_times(obj)) for obj in page]
+            state = [rows, self.paginator.next_cursor]
+        else:
+            page = None
+            fields = self.get_modified_fields()
+            aggregates = queryset.order_by().aggregate(
+                count=Count('pk'), **{f'modified_{i}': Max(field) for i, field in enumerate(fields)}
+            )
+            self.paginator.set_count(aggregates['count'])
+            state = [aggregates['count'], [aggregates[f'modified_{i}'] for i in range(len(fields))]]
+
+        response = self.conditional_response(request, state)
+        if response is not None:
+            return response
+        if page is None:
+            page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
@@ -0,0 +1,186 @@
+import random
+import time
+from array import array
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import Ad, ExchangeProposal
+from .recommendations import invalidate as invalidate_recommendations
+from .stats import recompute_user_stats
+from .trades import invalidate as invalidate_trade_graph
+
+# Share of listings per category and condition, roughly what a marketplace sees.
+CATEGORY_WEIGHTS = {'electronics': 35, 'clothing': 25, 'home': 18, 'books': 12, 'other': 10}
+CONDITION_WEIGHTS = {'used': 62, 'new': 28, 'broken': 10}
+STATUS_WEIGHTS = {'pending': 70, 'rejected': 20, 'accepted': 10}
+
+ITEMS = {
+    'electronics': ['phone', 'laptop', 'tablet', 'headphones', 'camera', 'console', 'monitor', 'speaker', 'watch'],
+    'clothing': ['jacket', 'sneakers', 'dress', 'jeans', 'hoodie', 'boots', 'scarf', 'coat', 'shirt'],
+    'home': ['sofa', 'lamp', 'shelf', 'blender', 'rug', 'mirror', 'table', 'chair', 'kettle'],
+    'books': ['novel', 'cookbook', 'textbook', 'comic', 'atlas', 'biography', 'dictionary', 'anthology'],
+    'other': ['bicycle', 'guitar', 'tent', 'skateboard', 'telescope', 'drone', 'puzzle', 'backpack'],
+}
+ADJECTIVES = ['vintage', 'compact', 'classic', 'premium', 'handmade', 'portable', 'wireless', 'large',
+              'small', 'modern', 'rare', 'lightweight', 'sturdy', 'limited edition', 'refurbished']
+COLORS = ['black', 'white', 'red', 'blue', 'green', 'silver', 'grey', 'brown', 'yellow']
+PHRASES = ['barely used', 'comes with original box', 'minor scratches', 'works perfectly',
+           'smoke-free home', 'pickup preferred', 'open to offers', 'includes accessories',
+           'needs a new home', 'great condition for its age']
+
+
+def _cum_weights(weights):
+    return list(accumulate(weights))
+
+
+def _power_law(count, alpha):
+    """Cumulative Zipf weights: the i-th entry is picked with probability ~ 1 / (i + 1) ** alpha."""
+    return _cum_weights(1 / (rank + 1) ** alpha for rank in range(count))
+
+
+class DataGenerator:
+    """
+    Generate users, ads and proposals with ``bulk_create`` in batched
+    transactions. The same seed always produces the same dataset shape.
+    """
+
+    def __init__(self, seed=0, batch_size=5000, days=365, username_prefix='loadtest', progress=None):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.days = days
+        self.username_prefix = username_prefix
+        self.progress = progress or (lambda message: None)
+        self.now = timezone.now()
+
+    def generate(self, users, ads, proposals, user_alpha=1.1, ad_alpha=0.8):
+        """Create the rows and return ``{table: (rows, seconds)}``."""
+        report = {}
+        user_ids = self.create_users(users, report)
+        if not user_ids:
+            user_ids = array('q', User.objects.order_by('pk').values_list('pk', flat=True))
+        if ads and not user_ids:
+            raise ValueError('Ads need at least one user.')
+        # Power-law popularity: a few users own most listings.
+        self.random.shuffle(user_ids)
+        ad_ids, ad_owners = self.create_ads(ads, user_ids, _power_law(len(user_ids), user_alpha), report)
+        if not ad_ids:
+            rows = Ad.objects.order_by('pk').values_list('pk', 'user_id')
+            ad_ids, ad_owners = array('q'), array('q')
+            for pk, user_id in rows:
+                ad_ids.append(pk)
+                ad_owners.append(user_id)
+        self.create_proposals(proposals, ad_ids, ad_owners, ad_alpha, report)
+
+        started = time.perf_counter()
+        recompute_user_stats(batch_size=self.batch_size)
+        report['user stats'] = (len(user_ids), time.perf_counter() - started)
+        bump_version('ads')
+        bump_version('proposals')
+        invalidate_trade_graph()
+        invalidate_recommendations()
+        return report
+
+    def _insert(self, label, total, build_batch, report):
+        started = time.perf_counter()
+        done = 0
+        while done < total:
+            size = min(self.batch_size, total - done)
+            with transaction.atomic():
+                build_batch(size)
+            done += size
+            elapsed = time.perf_counter() - started
+            self.progress(f'{label}: {done}/{total} ({done / elapsed:,.0f} rows/s)')
+        report[label] = (total, time.perf_counter() - started)
+
+    def create_users(self, total, report):
+        password = make_password('password123')
+        offset = User.objects.filter(username__startswith=self.username_prefix).count()
+        user_ids = array('q')
+
+        def build_batch(size):
+            start = offset + len(user_ids)
+            created = User.objects.bulk_create([
+                User(
+                    username=f'{self.username_prefix}{start + i}',
+                    password=password,
+                    date_joined=self.random_past(),
+                )
+                for i in range(size)
+            ])
+            user_ids.extend(user.pk for user in created)
+
+        self._insert('users', total, build_batch, report)
+        return user_ids
+
+    def create_ads(self, total, user_ids, owner_weights, report):
+        categories, category_weights = zip(*CATEGORY_WEIGHTS.items())
+        conditions, condition_weights = zip(*CONDITION_WEIGHTS.items())
+        category_cum, condition_cum = _cum_weights(category_weights), _cum_weights(condition_weights)
+        ad_ids, ad_owners = array('q'), array('q')
+        rand = self.random
+
+        def build_batch(size):
+            owners = rand.choices(user_ids, cum_weights=owner_weights, k=size)
+            batch = []
+            for owner, category, condition in zip(
+                owners,
+                rand.choices(categories, cum_weights=category_cum, k=size),
+                rand.choices(conditions, cum_weights=condition_cum, k=size),
+            ):
+                item = rand.choice(ITEMS[category])
+                title = f'{rand.choice(ADJECTIVES).capitalize()} {rand.choice(COLORS)} {item}'
+                image = rand.randrange(10 ** 6)
+                batch.append(Ad(
+                    user_id=owner,
+                    title=title,
+                    description=f'{title}. {", ".join(rand.sample(PHRASES, 2)).capitalize()}.',
+                    image_url=f'https://example.com/{item}/{image}.jpg' if rand.random() < 0.7 else None,
+                    category=category,
+                    condition=condition,
+                    created_at=self.random_past(),
+                ))
+            for ad in Ad.objects.bulk_create(batch):
+                ad_ids.append(ad.pk)
+                ad_owners.append(ad.user_id)
+
+        self._insert('ads', total, build_batch, report)
+        return ad_ids, ad_owners
+
+    def create_proposals(self, total, ad_ids, ad_owners, alpha, report):
+        if total and len(set(ad_owners)) < 2:
+            raise ValueError('Proposals need ads from at least two different users.')
+        statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+        status_cum = _cum_weights(status_weights)
+        # Proposals concentrate on popular ads; senders offer any of their listings.
+        positions = list(range(len(ad_ids)))
+        self.random.shuffle(positions)
+        receiver_weights = _power_law(len(positions), alpha)
+        rand = self.random
+
+        def build_batch(size):
+            batch = []
+            receivers = rand.choices(positions, cum_weights=receiver_weights, k=size)
+            for receiver, status in zip(receivers, rand.choices(statuses, cum_weights=status_cum, k=size)):
+                sender = rand.randrange(len(ad_ids))
+                while ad_owners[sender] == ad_owners[receiver]:
+                    sender = rand.randrange(len(ad_ids))
+                batch.append(ExchangeProposal(
+                    ad_sender_id=ad_ids[sender],
+                    ad_receiver_id=ad_ids[receiver],
+                    comment=rand.choice(PHRASES).capitalize() if rand.random() < 0.5 else '',
+                    status=status,
+                ))
+            ExchangeProposal.objects.bulk_create(batch)
+
+        self._insert('proposals', total, build_batch, report)
+
+    def random_past(self):
+        # Recent dates are more likely, like a live catalogue.
+        age = min(self.random.expovariate(3 / self.days), self.days)
+        return self.now - timedelta(days=age)
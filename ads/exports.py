@@ -0,0 +1,126 @@
+"""
+Streaming exports of ads and proposals as NDJSON or CSV, for the export API
+views and ``manage.py export``.
+
+Rows are read through ``values()`` in keyset batches of
+``EXPORT_BATCH_SIZE`` on the primary key, and each batch is encoded and
+handed on before the next is read. Memory stays flat however large the
+export, and no batch costs more than the first: there is no COUNT and no
+OFFSET.
+"""
+import csv
+import io
+from datetime import datetime
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Output column -> values() lookup. The first column must be the primary key.
+AD_EXPORT_COLUMNS = {
+    'id': 'id',
+    'user_id': 'user_id',
+    'username': 'user__username',
+    'title': 'title',
+    'description': 'description',
+    'image_url': 'image_url',
+    'category': 'category',
+    'condition': 'condition',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+PROPOSAL_EXPORT_COLUMNS = {
+    'id': 'id',
+    'ad_sender_id': 'ad_sender_id',
+    'ad_receiver_id': 'ad_receiver_id',
+    'comment': 'comment',
+    'status': 'status',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def iter_batches(queryset, lookups, batch_size=None):
+    """Yield lists of ``values_list()`` tuples of ``lookups``, in primary key order."""
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    queryset = queryset.order_by('pk').values_list(*lookups)
+    last = None
+    while True:
+        batch = queryset if last is None else queryset.filter(pk__gt=last)
+        rows = list(batch[:batch_size])
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][0]
+
+
+def encode_ndjson(names, batches):
+    for rows in batches:
+        yield b''.join(
+            orjson.dumps(dict(zip(names, row)), option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE)
+            for row in rows
+        )
+
+
+def csv_cell(value):
+    """
+    Neutralize text a spreadsheet would run as a formula (CSV injection):
+    a leading ``=``, ``+``, ``-``, ``@``, tab or carriage return is escaped
+    with a quote, which spreadsheets show as text and do not display.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return '' if value is None else csv_cell(value)
+
+
+def encode_csv(names, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+ENCODERS = {'ndjson': encode_ndjson, 'csv': encode_csv}
+
+
+def export(queryset, columns, format, batch_size=None):
+    """Iterate over the encoded chunks of ``queryset``, one per batch."""
+    return ENCODERS[format](list(columns), iter_batches(queryset, list(columns.values()), batch_size))
+
+
+async def _aiterate(chunks):
+    # Each batch is read in the thread that serves the ORM; the event loop never waits on it.
+    while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+        yield chunk
+
+
+def export_response(request, queryset, columns, format, filename):
+    chunks = export(queryset, columns, format)
+    # Django buffers a sync iterator served over ASGI in full; hand it an async one.
+    if isinstance(request, ASGIRequest):
+        chunks = _aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{format}"'
+    return response
@@ -0,0 +1,61 @@
+"""
+Facet counts for the ad list: how many ads each category and condition
+option would show, within the current search and other filters.
+
+One GROUP BY over (category, condition) answers both facets. Each facet
+counts the ads matching every other selected facet, but not its own, so
+the options next to the selected one keep their counts. The grouped rows
+are cached per search and filter signature under the ``ads`` cache
+version, which every ad write bumps, bulk ones included.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count
+
+from .cache import KEY_PREFIX, get_cache, get_versions
+from .models import Ad
+from .search import search_ads
+
+FACETS = {
+    'category': Ad.CATEGORY_CHOICES,
+    'condition': Ad.CONDITION_CHOICES,
+}
+
+
+def facet_rows(search='', filters=None):
+    """``(category, condition, count)`` rows for the ads matching ``search`` and ``filters``, cached."""
+    search = search.strip()
+    filters = {name: value for name, value in (filters or {}).items() if value not in (None, '')}
+    signature = repr([search, sorted(filters.items())])
+    digest = hashlib.md5(signature.encode(), usedforsecurity=False).hexdigest()
+    key = f'{KEY_PREFIX}:facets:{get_versions(("ads",))[0]}:{digest}'
+    cache = get_cache()
+    rows = cache.get(key)
+    if rows is None:
+        queryset = Ad.objects.filter(**filters)
+        if search:
+            queryset = search_ads(queryset, search)
+        rows = list(queryset.order_by().values_list(*FACETS).annotate(count=Count('pk')))
+        cache.set(key, rows, settings.FACET_CACHE_TIMEOUT)
+    return rows
+
+
+def ad_facets(search='', filters=None, selected=None):
+    """
+    ``{facet: [{'value', 'label', 'count'}, ...]}`` for every option of
+    every facet, in choice order. ``selected`` maps facet names to the
+    chosen values; ``filters`` are the other model filters, like ``user``.
+    """
+    selected = {name: value for name, value in (selected or {}).items() if name in FACETS and value}
+    counts = {name: dict.fromkeys((value for value, _ in choices), 0) for name, choices in FACETS.items()}
+    for *values, count in facet_rows(search, filters):
+        row = dict(zip(FACETS, values))
+        for name in FACETS:
+            if all(row[other] == value for other, value in selected.items() if other != name):
+                if row[name] in counts[name]:
+                    counts[name][row[name]] += count
+    return {
+        name: [{'value': value, 'label': str(label), 'count': counts[name][value]} for value, label in choices]
+        for name, choices in FACETS.items()
+    }
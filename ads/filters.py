@@ -0,0 +1,13 @@
+from rest_framework import filters
+
+from .search import search_ads
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """``?search=`` backed by the full-text index, results ordered by relevance."""
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return search_ads(queryset, text)
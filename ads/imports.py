@@ -0,0 +1,196 @@
+"""
+Bulk ad import from NDJSON or a JSON array, for ``AdImportAPIView``.
+
+The parsers read the upload incrementally and yield one row at a time, so
+the request body is never held in memory. Rows are validated
+``IMPORT_BATCH_SIZE`` at a time with the fields of
+``AdCreateUpdateSerializer``, built once per import, and the valid ones are
+inserted with one ``bulk_create`` per batch. Each batch commits on its own
+with the owner's stats and the response cache version, so a failure late in
+a large file keeps the batches before it. Errors are reported per row,
+numbered from 1.
+"""
+import codecs
+import json
+import re
+
+import orjson
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ParseError
+from rest_framework.fields import SkipField, empty
+from rest_framework.parsers import BaseParser
+from rest_framework.serializers import ValidationError
+
+from .cache import bump_version
+from .models import Ad
+from .recommendations import record_changes as record_ad_changes
+from .serializers import AdCreateUpdateSerializer
+from .stats import apply_deltas, new_deltas
+
+CHUNK_SIZE = 64 * 1024
+# Longest single row accepted; a longer one is reported and skipped.
+MAX_ROW_BYTES = 64 * 1024
+WHITESPACE = re.compile(r'\s*')
+
+
+class MalformedRow:
+    """Stands in for a row that could not be parsed."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def iter_ndjson(stream):
+    while True:
+        line = stream.readline(MAX_ROW_BYTES + 1)
+        if not line:
+            return
+        if len(line) > MAX_ROW_BYTES and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(CHUNK_SIZE)
+            yield MalformedRow(f'Row is longer than {MAX_ROW_BYTES} bytes.')
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError as exc:
+            yield MalformedRow(f'Invalid JSON: {exc}')
+
+
+def iter_json_array(stream, chunk_size=CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array, reading ``stream`` a chunk at a time."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        try:
+            buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+        except UnicodeDecodeError as exc:
+            raise ParseError(f'Invalid UTF-8: {exc}')
+        pos = 0
+
+    def peek():
+        """The next non-whitespace character, or '' at the end of the input."""
+        nonlocal pos
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) or eof:
+                return buffer[pos:pos + 1]
+            fill()
+
+    if peek() != '[':
+        raise ParseError('Expected a JSON array.')
+    pos += 1
+    if peek() == ']':
+        return
+    while True:
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as exc:
+                if eof:
+                    yield MalformedRow(f'Invalid JSON: {exc.msg}; the rest of the input was not read.')
+                    return
+            else:
+                # Only trust a value that is followed by something: a number may continue in the next chunk.
+                if end < len(buffer) or eof:
+                    break
+            if len(buffer) - pos > MAX_ROW_BYTES:
+                yield MalformedRow(f'Row is longer than {MAX_ROW_BYTES} bytes; the rest of the input was not read.')
+                return
+            fill()
+        pos = end
+        yield value
+        separator = peek()
+        if separator == ']':
+            return
+        if separator != ',':
+            yield MalformedRow("Expected ',' or ']' after this row; the rest of the input was not read.")
+            return
+        pos += 1
+        peek()
+
+
+class NDJSONRowParser(BaseParser):
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_ndjson(stream)
+
+
+class JSONArrayRowParser(BaseParser):
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_json_array(stream)
+
+
+def import_fields():
+    serializer = AdCreateUpdateSerializer()
+    return {name: field for name, field in serializer.fields.items() if not field.read_only}
+
+
+def validate_row(row, fields):
+    """Return ``(data, errors)`` for one row, with the field rules and messages of the ad API."""
+    if isinstance(row, MalformedRow):
+        return None, {'non_field_errors': [row.message]}
+    if not isinstance(row, dict):
+        return None, {'non_field_errors': ['Expected an object.']}
+    data, errors = {}, {}
+    for name, field in fields.items():
+        try:
+            data[name] = field.run_validation(row.get(name, empty))
+        except ValidationError as exc:
+            errors[name] = exc.detail
+        except SkipField:
+            pass
+    return data, errors
+
+
+def _import_batch(user_id, batch, fields, report):
+    ads = []
+    for number, row in batch:
+        data, errors = validate_row(row, fields)
+        if errors:
+            report['failed'] += 1
+            if len(report['errors']) < settings.IMPORT_MAX_ERRORS:
+                report['errors'].append({'row': number, 'errors': errors})
+        else:
+            ads.append(Ad(user_id=user_id, **data))
+    if not ads:
+        return
+    # Bulk inserts send no signals: do the owner's stats and cache invalidation here.
+    with transaction.atomic():
+        Ad.objects.bulk_create(ads)
+        deltas = new_deltas()
+        deltas[user_id]['listings_count'] += len(ads)
+        apply_deltas(deltas)
+        bump_version('ads')
+        record_ad_changes([('add', ad.pk, user_id, ad.category, ad.title, ad.description) for ad in ads])
+    report['created'] += len(ads)
+
+
+def import_ads(user_id, rows, batch_size=None):
+    """
+    Create ads owned by ``user_id`` from an iterable of row dicts. Returns
+    ``{'created': n, 'failed': n, 'errors': [{'row': n, 'errors': {...}}]}``;
+    only the first ``IMPORT_MAX_ERRORS`` errors are listed.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    fields = import_fields()
+    report = {'created': 0, 'failed': 0, 'errors': []}
+    batch = []
+    for number, row in enumerate(rows, 1):
+        batch.append((number, row))
+        if len(batch) >= batch_size:
+            _import_batch(user_id, batch, fields, report)
+            batch = []
+    if batch:
+        _import_batch(user_id, batch, fields, report)
+    return report
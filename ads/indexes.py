@@ -0,0 +1,153 @@
+"""
+In-memory indexes kept in step across worker processes.
+
+Each process holds its own copy of an index: the trade graph
+(``ads.trades``), the suggestions index (``ads.recommendations``). Writers
+log their changes once their transaction commits: the index's version in
+the cache is incremented and the changes are stored under the new version
+(``ads.cache.log_changes``). ``sync()`` replays the entries between the
+process's version and the current one, so another worker's write costs a
+cache read, not a reload. Changes are upserts and removals, so replaying one
+that a load has already seen is harmless.
+
+A full load from the database happens on first use, after bulk writes that
+log ``RELOAD``, when more than ``INDEX_LOG_MAX_GAP`` entries are missed, or
+when an entry is still missing after ``INDEX_LOG_WAIT`` seconds. It runs in
+a background thread, without the lock, and is swapped in when complete; the
+index keeps serving its previous state meanwhile, and ``sync()`` returns
+False until the first load is in. On an in-memory SQLite database, as in
+tests, other threads cannot read the data, so loads run inline.
+
+The log lives in the cache (``RESPONSE_CACHE_ALIAS``); with a per-process
+cache, workers never see each other's changes, so run several workers with
+a shared one (see ``ads.checks``).
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from .cache import get_versions, log_changes, read_changes
+
+RELOAD = 'reload'
+logger = logging.getLogger(__name__)
+
+
+class SharedIndex:
+    """
+    Subclasses set ``namespace`` and implement ``clear_data()``,
+    ``populate()`` (fill an empty index from the database) and
+    ``apply_changes(changes)``. ``after_changes()`` runs, under the lock,
+    after changes have been applied.
+    """
+    namespace = None
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.worker = None
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.version = None
+            self.stale = False
+            self.missing_since = None
+            self.clear_data()
+
+    @property
+    def loaded(self):
+        return self.version is not None
+
+    def after_changes(self):
+        pass
+
+    def load(self):
+        """
+        Rebuild from the database without holding the lock, then swap the
+        result in. The version is read first, so every change committed
+        meanwhile is replayed from the log.
+        """
+        version, = get_versions([self.namespace])
+        fresh = type(self)()
+        fresh.populate()
+        fresh.version = version
+        self.replace(fresh)
+
+    def replace(self, fresh):
+        """Take over the data of ``fresh``, an index built off the lock, and catch up from its version."""
+        with self.lock:
+            vars(self).update({name: value for name, value in vars(fresh).items() if name not in ('lock', 'worker')})
+            if self.loaded:
+                self._catch_up(get_versions([self.namespace])[0])
+
+    def sync(self):
+        """
+        Replay the changes every process logged since the last sync and start
+        a load when one is due; returns False until the first load is in.
+        """
+        current, = get_versions([self.namespace])
+        with self.lock:
+            if self.loaded:
+                self._catch_up(current)
+            if not self.loaded or self.stale:
+                self.start(self.load)
+            return self.loaded
+
+    def _catch_up(self, current):
+        if current == self.version:
+            self.missing_since = None
+            return
+        if not 0 < current - self.version <= settings.INDEX_LOG_MAX_GAP:
+            self.stale = True
+            return
+        applied = False
+        for version, changes in read_changes(self.namespace, self.version, current):
+            if changes == RELOAD:
+                self.stale = True
+                break
+            self.apply_changes(changes)
+            self.version = version
+            applied = True
+        if self.version == current:
+            self.missing_since = None
+        elif self.missing_since is None:
+            self.missing_since = time.monotonic()
+        elif time.monotonic() - self.missing_since > settings.INDEX_LOG_WAIT:
+            self.stale = True  # Expired, or its writer died before storing it.
+        if applied:
+            self.after_changes()
+
+    def start(self, task):
+        """Run ``task`` in the background thread unless it is busy; inline on an in-memory database."""
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            task()
+        elif self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, args=(task,), name=f'{self.namespace}-index', daemon=True)
+            self.worker.start()
+
+    def _run(self, task):
+        try:
+            task()
+        except Exception:
+            logger.exception('Updating the %s index failed', self.namespace)
+        finally:
+            connections.close_all()
+
+    def commit(self, changes):
+        """Log ``changes`` made by this process and apply them here unless other changes came first."""
+        version = log_changes(self.namespace, changes)
+        with self.lock:
+            if self.loaded and version == self.version + 1:
+                self.apply_changes(changes)
+                self.version = version
+                self.after_changes()
+
+    def record(self, changes):
+        """Log and apply ``changes`` once the current transaction commits."""
+        transaction.on_commit(lambda: self.commit(changes))
+
+    def invalidate(self):
+        """Make every process reload, e.g. after bulk writes that skip the signals."""
+        transaction.on_commit(lambda: log_changes(self.namespace, RELOAD))
@@ -0,0 +1,77 @@
+import json
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from ads import benchmarks
+
+
+@contextmanager
+def benchmark_database(directory):
+    """Run against a throwaway file-backed copy of the schema, never the real database."""
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    test_settings['NAME'] = str(Path(directory) / 'benchmark.sqlite3')
+    try:
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        # Later test databases of this process must not land in the deleted directory.
+        test_settings['NAME'] = old_test_name
+
+
+class Command(BaseCommand):
+    help = 'Seed datasets at several scales and benchmark views, serializers and filters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run (default: all).')
+        parser.add_argument('--scales', default='1000,10000',
+                            help='Comma-separated dataset sizes in ads (default: 1000,10000).')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--baseline', help='JSON report to compare against; regressions fail the run.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed p50 slowdown against the baseline (default: 0.2 = 20%%).')
+        parser.add_argument('--with-response-cache', action='store_true',
+                            help='Keep the anonymous response cache on instead of measuring the database path.')
+        parser.add_argument('--list', action='store_true', help='List available benchmarks and exit.')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in sorted(benchmarks.load_cases()):
+                self.stdout.write(name)
+            return
+
+        scales = [int(scale) for scale in options['scales'].split(',')]
+        progress = self.stdout.write if options['verbosity'] > 0 else None
+        with tempfile.TemporaryDirectory() as directory, benchmark_database(directory), override_settings(
+            DEBUG=False,
+            RESPONSE_CACHE_ENABLED=options['with_response_cache'] and settings.RESPONSE_CACHE_ENABLED,
+        ):
+            try:
+                report = benchmarks.run(
+                    scales, options['names'], options['iterations'], options['seed'], progress
+                )
+            except KeyError as exc:
+                raise CommandError(exc.args[0])
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text())
+            regressions = benchmarks.compare(report, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
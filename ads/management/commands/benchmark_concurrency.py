@@ -0,0 +1,30 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ads.benchmarks import concurrency
+
+
+class Command(BaseCommand):
+    help = 'Compare multi-process SQLite read/write throughput with default and configured connection settings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('profiles', nargs='*', help='Profiles to run (default: all).')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile (default: 5).')
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        unknown = set(options['profiles']) - set(concurrency.profiles())
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(sorted(unknown))}")
+        results = concurrency.run(
+            options['profiles'], progress=self.stdout.write, workers=options['workers'],
+            duration=options['duration'], write_ratio=options['write_ratio'], rows=options['rows'],
+        )
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Report written to {options['output']}")
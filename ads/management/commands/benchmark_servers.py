@@ -0,0 +1,42 @@
+import importlib.util
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ads.benchmarks import BenchmarkEnv, seed_scale, servers
+from ads.management.commands.benchmark import benchmark_database
+
+
+class Command(BaseCommand):
+    help = 'Compare Gunicorn (WSGI, sync views) with Uvicorn (ASGI, async views) at equal worker counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', default='1,16,64',
+                            help='Comma-separated numbers of requests in flight (default: 1,16,64).')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per measurement.')
+        parser.add_argument('--scale', type=int, default=1000, help='Dataset size in ads (default: 1000).')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        missing = [name for name in ('gunicorn', 'uvicorn') if importlib.util.find_spec(name) is None]
+        if missing:
+            raise CommandError(f"Install {' and '.join(missing)} to run this benchmark.")
+
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        with tempfile.TemporaryDirectory() as directory, benchmark_database(directory):
+            self.stdout.write(f"Seeding {options['scale']} ads...")
+            seed_scale(options['scale'], 0)
+            token = str(RefreshToken.for_user(BenchmarkEnv(options['scale']).trader).access_token)
+            database = connection.settings_dict['NAME']
+            connection.close()
+            results = servers.run(database, token, options['workers'], levels, options['requests'],
+                                  self.stdout.write)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Report written to {options['output']}")
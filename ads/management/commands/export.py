@@ -0,0 +1,55 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ads.exports import AD_EXPORT_COLUMNS, ENCODERS, PROPOSAL_EXPORT_COLUMNS, export
+from ads.models import Ad, ExchangeProposal
+from ads.proposals import user_proposals
+from ads.search import search_ads
+
+
+class Command(BaseCommand):
+    help = "Stream all ads, or one user's proposals, as NDJSON or CSV in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['ads', 'proposals'])
+        parser.add_argument('--format', choices=sorted(ENCODERS), default='ndjson')
+        parser.add_argument('--output', help='File to write (default: standard output).')
+        parser.add_argument('--user', type=int, help="Ads of this user; required for proposals.")
+        parser.add_argument('--category', choices=[choice for choice, _ in Ad.CATEGORY_CHOICES])
+        parser.add_argument('--condition', choices=[choice for choice, _ in Ad.CONDITION_CHOICES])
+        parser.add_argument('--search', help='Full-text search in title and description.')
+        parser.add_argument('--status', choices=[choice for choice, _ in ExchangeProposal.STATUS_CHOICES])
+        parser.add_argument('--batch-size', type=int, help='Rows per query (default: EXPORT_BATCH_SIZE).')
+
+    def handle(self, *args, **options):
+        if options['kind'] == 'ads':
+            queryset = Ad.objects.all()
+            for field in ('user', 'category', 'condition'):
+                if options[field] is not None:
+                    queryset = queryset.filter(**{field: options[field]})
+            if options['search']:
+                queryset = search_ads(queryset, options['search'])
+            columns = AD_EXPORT_COLUMNS
+        else:
+            if options['user'] is None:
+                raise CommandError('--user is required for proposals.')
+            queryset = user_proposals(options['user'])
+            if options['status']:
+                queryset = queryset.filter(status=options['status'])
+            columns = PROPOSAL_EXPORT_COLUMNS
+
+        started = time.perf_counter()
+        written = 0
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in export(queryset, columns, options['format'], options['batch_size']):
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+        self.stderr.write(f'Wrote {written} bytes in {time.perf_counter() - started:.1f}s.')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ads.datagen import DataGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate users, ads and exchange proposals in bulk for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--ads', type=int, default=10000)
+        parser.add_argument('--proposals', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; same seed, same dataset.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create transaction.')
+        parser.add_argument('--days', type=int, default=365, help='Spread of created_at into the past.')
+        parser.add_argument('--username-prefix', default='loadtest')
+
+    def handle(self, *args, **options):
+        progress = self.stdout.write if options['verbosity'] > 0 else None
+        generator = DataGenerator(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            days=options['days'],
+            username_prefix=options['username_prefix'],
+            progress=progress,
+        )
+        try:
+            report = generator.generate(options['users'], options['ads'], options['proposals'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        for table, (rows, seconds) in report.items():
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(self.style.SUCCESS(f'{table}: {rows} rows in {seconds:.1f}s ({rate:,.0f} rows/s)'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ads.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of ads from the ads table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild.')
+
+    def handle(self, *args, **options):
+        if not rebuild_search_index(options['database']):
+            raise CommandError('Full-text search is only available on SQLite databases.')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ads.stats import recompute_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized per-user listing and proposal counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only recompute this user id (repeatable).')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = recompute_user_stats(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed stats for {written} users.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from ads.cache import cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the anonymous response cache.'
+
+    def handle(self, *args, **options):
+        for name, stats in cache_stats().items():
+            total = stats['hits'] + stats['misses']
+            ratio = stats['hits'] / total if total else 0
+            self.stdout.write(f"{name}: {stats['hits']} hits, {stats['misses']} misses ({ratio:.1%} hit rate)")
@@ -0,0 +1,246 @@
+"""
+Per-view request metrics in Prometheus text format.
+
+``MetricsMiddleware`` records latency, status codes, SQL query counts and
+SQL time for every request, labelled by the resolved URL name. SQL is
+observed through a database execute wrapper, so it works with DEBUG off.
+The wrapper is installed on every connection as it opens, in whichever
+thread, and reports to the request's recorder through a context variable:
+under ASGI the ORM runs in ``sync_to_async`` worker threads with their own
+connections, and asgiref carries the context into them.
+
+With ``METRICS_DIR`` set, each worker process periodically writes its
+counters to ``<METRICS_DIR>/<pid>.json`` and ``/metrics`` sums every file,
+so totals are correct whichever Gunicorn worker serves the scrape. Clear
+the directory when the master starts (e.g. in Gunicorn's ``on_starting``
+hook); files of exited workers are kept so counters never go backwards.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .cache import cache_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNRESOLVED = 'unresolved'
+
+
+class Registry:
+    """Counters of one process; ``snapshot()`` and ``merge()`` move them through JSON."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.requests = defaultdict(int)
+            self.latency = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+            self.latency_sum = defaultdict(float)
+            self.sql_queries = defaultdict(int)
+            self.sql_seconds = defaultdict(float)
+
+    def observe(self, view, method, status, seconds, queries, sql_seconds):
+        with self.lock:
+            self.requests[(view, method, str(status))] += 1
+            self.latency[view][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.latency_sum[view] += seconds
+            self.sql_queries[view] += queries
+            self.sql_seconds[view] += sql_seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': [[*key, value] for key, value in self.requests.items()],
+                'latency': {view: list(buckets) for view, buckets in self.latency.items()},
+                'latency_sum': dict(self.latency_sum),
+                'sql_queries': dict(self.sql_queries),
+                'sql_seconds': dict(self.sql_seconds),
+            }
+
+    def merge(self, snapshot):
+        with self.lock:
+            for view, method, status, value in snapshot['requests']:
+                self.requests[(view, method, status)] += value
+            for view, buckets in snapshot['latency'].items():
+                merged = self.latency[view]
+                for index, value in enumerate(buckets):
+                    merged[index] += value
+            for name in ('latency_sum', 'sql_queries', 'sql_seconds'):
+                totals = getattr(self, name)
+                for view, value in snapshot[name].items():
+                    totals[view] += value
+
+
+registry = Registry()
+
+
+def _metrics_dir():
+    return Path(settings.METRICS_DIR) if settings.METRICS_DIR else None
+
+
+def flush(force=False):
+    """Write this process's counters to its file in ``METRICS_DIR``, at most once per flush interval."""
+    directory = _metrics_dir()
+    now = time.monotonic()
+    if directory is None or (not force and now - registry.last_flush < settings.METRICS_FLUSH_INTERVAL):
+        return
+    registry.last_flush = now
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{os.getpid()}.json'
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(registry.snapshot()))
+    os.replace(tmp_path, path)
+
+
+def collect():
+    """Counters of every worker process (or just this one without ``METRICS_DIR``)."""
+    directory = _metrics_dir()
+    if directory is None:
+        return registry
+    flush(force=True)
+    combined = Registry()
+    for path in directory.glob('*.json'):
+        try:
+            combined.merge(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # A worker is replacing its file right now.
+    return combined
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+_recorder = ContextVar('metrics_query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_wrapper(sender, connection, **kwargs):
+    # Wrappers outlive reconnections of the same connection object.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        token = _recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.observe(request, response, recorder, started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        token = _recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.observe(request, response, recorder, started)
+        return response
+
+    def observe(self, request, response, recorder, started):
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else UNRESOLVED
+        registry.observe(view, request.method, response.status_code, elapsed, recorder.count, recorder.seconds)
+        flush()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render(metrics):
+    lines = [
+        '# HELP http_requests_total Requests by view, method and status code.',
+        '# TYPE http_requests_total counter',
+    ]
+    for (view, method, status), value in sorted(metrics.requests.items()):
+        lines.append(f'http_requests_total{_labels(view=view, method=method, status=status)} {value}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Request latency by view.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for view, buckets in sorted(metrics.latency.items()):
+        cumulative = 0
+        for bound, value in zip([*LATENCY_BUCKETS, '+Inf'], buckets):
+            cumulative += value
+            lines.append(f'http_request_duration_seconds_bucket{_labels(view=view, le=bound)} {cumulative}')
+        lines.append(f'http_request_duration_seconds_sum{_labels(view=view)} {metrics.latency_sum[view]}')
+        lines.append(f'http_request_duration_seconds_count{_labels(view=view)} {cumulative}')
+
+    for name, help_text, values in [
+        ('db_queries_total', 'SQL queries executed by view.', metrics.sql_queries),
+        ('db_query_duration_seconds_total', 'Time spent in SQL by view.', metrics.sql_seconds),
+    ]:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for view, value in sorted(values.items()):
+            lines.append(f'{name}{_labels(view=view)} {value}')
+
+    # Response cache counters already live in the shared cache.
+    lines += [
+        '# HELP response_cache_requests_total Anonymous response cache lookups by view and result.',
+        '# TYPE response_cache_requests_total counter',
+    ]
+    for view, stats in cache_stats().items():
+        for result, value in stats.items():
+            lines.append(f'response_cache_requests_total{_labels(view=view, result=result)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and request.META.get('HTTP_AUTHORIZATION') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# The FTS5 index as this migration created it; ads.search keeps the current
+# copy, which must not change what replaying history runs.
+FTS_SCHEMA_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS ads_ad_fts USING fts5(
+        title, description,
+        content='ads_ad', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ads_ad_fts_ai AFTER INSERT ON ads_ad BEGIN
+        INSERT INTO ads_ad_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ads_ad_fts_ad AFTER DELETE ON ads_ad BEGIN
+        INSERT INTO ads_ad_fts(ads_ad_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ads_ad_fts_au AFTER UPDATE OF title, description ON ads_ad BEGIN
+        INSERT INTO ads_ad_fts(ads_ad_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO ads_ad_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+FTS_REBUILD_SQL = "INSERT INTO ads_ad_fts(ads_ad_fts) VALUES ('rebuild')"
+
+FTS_DROP_SQL = [
+    'DROP TRIGGER IF EXISTS ads_ad_fts_ai',
+    'DROP TRIGGER IF EXISTS ads_ad_fts_ad',
+    'DROP TRIGGER IF EXISTS ads_ad_fts_au',
+    'DROP TABLE IF EXISTS ads_ad_fts',
+]
+
+
+class RunSQLiteSQL(migrations.RunSQL):
+    """``RunSQL`` on SQLite only; other databases search with icontains instead (``ads.search``)."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0002_ad_listing_indexes'),
+    ]
+
+    operations = [
+        RunSQLiteSQL(FTS_SCHEMA_SQL + [FTS_REBUILD_SQL], FTS_DROP_SQL),
+    ]
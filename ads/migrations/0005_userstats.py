@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_user_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Ad = apps.get_model('ads', 'Ad')
+    ExchangeProposal = apps.get_model('ads', 'ExchangeProposal')
+    UserStats = apps.get_model('ads', 'UserStats')
+
+    stats = {user_id: UserStats(user_id=user_id) for user_id in User.objects.values_list('pk', flat=True)}
+    grouped = [
+        ('listings_count', Ad.objects.all(), 'user'),
+        ('proposals_sent', ExchangeProposal.objects.all(), 'ad_sender__user'),
+        ('proposals_received', ExchangeProposal.objects.all(), 'ad_receiver__user'),
+        ('trades_accepted', ExchangeProposal.objects.filter(status='accepted'), 'ad_sender__user'),
+        ('trades_accepted', ExchangeProposal.objects.filter(status='accepted'), 'ad_receiver__user'),
+    ]
+    for field, queryset, group_by in grouped:
+        for row in queryset.order_by().values(group_by).annotate(total=Count('id')):
+            row_stats = stats[row[group_by]]
+            setattr(row_stats, field, getattr(row_stats, field) + row['total'])
+    UserStats.objects.bulk_create(stats.values(), batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0003_ad_search_index'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('listings_count', models.IntegerField(default=0)),
+                ('proposals_sent', models.IntegerField(default=0)),
+                ('proposals_received', models.IntegerField(default=0)),
+                ('trades_accepted', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'user stats',
+            },
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdSearchIndex',
+            fields=[
+                ('ad', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='ads.ad')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+            ],
+            options={
+                'db_table': 'ads_ad_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -25,13 +25,26 @@ class Ad(models.Model):
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     condition = models.CharField(max_length=50, choices=CONDITION_CHOICES)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='ad_created_idx'),
+            models.Index(fields=['category', 'created_at'], name='ad_category_created_idx'),
+            models.Index(fields=['condition', 'created_at'], name='ad_condition_created_idx'),
+            models.Index(fields=['category', 'condition', 'created_at'], name='ad_cat_cond_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='ad_user_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Owner counters are updated from post_save, keep them in the same transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class ExchangeProposal(models.Model):
     STATUS_CHOICES = [
@@ -45,6 +58,58 @@ class ExchangeProposal(models.Model):
     comment = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bulk status updates (ads.proposals) set this explicitly.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='proposal_created_idx'),
+        ]
 
     def __str__(self):
         return f"Proposal {self.id}: {self.ad_sender} -> {self.ad_receiver}"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class UserStats(models.Model):
+    """Per-user counters kept in step with Ad and ExchangeProposal writes by ``ads.signals``."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    listings_count = models.IntegerField(default=0)
+    proposals_sent = models.IntegerField(default=0)
+    proposals_received = models.IntegerField(default=0)
+    trades_accepted = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'user stats'
+
+    def __str__(self):
+        return f"Stats for {self.user}"
+
+
+class RevokedToken(models.Model):
+    """Refresh tokens that must not be used again; rows are purged once the token expires (``ads.tokens``)."""
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class AdSearchIndex(models.Model):
+    """
+    Row of the SQLite FTS5 table over ad titles and descriptions, created and
+    kept in step by ``ads.search``; joined to rank searches in one pass.
+    """
+    ad = models.OneToOneField(
+        Ad, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_index',
+    )
+    title = models.TextField()
+    description = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'ads_ad_fts'
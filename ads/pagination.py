@@ -0,0 +1,124 @@
+import base64
+import binascii
+from datetime import datetime
+from functools import partial
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .search import SEARCH_RANK
+
+CURSOR_PARAM = 'cursor'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CountedPaginator(Paginator):
+    """Paginator given its total up front, e.g. from an aggregate the view runs anyway."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
+
+def encode_cursor(obj, ranked=False):
+    """Cursor after ``obj``, a model instance or a ``values()`` row."""
+    if isinstance(obj, dict):
+        key, pk = obj[SEARCH_RANK if ranked else 'created_at'], obj['id']
+    else:
+        key, pk = getattr(obj, SEARCH_RANK) if ranked else obj.created_at, obj.pk
+    raw = f'{key!r}|{pk}' if ranked else f'{key.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, ranked=False):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        key, pk = raw.split('|')
+        return float(key) if ranked else datetime.fromisoformat(key), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursor(token) from exc
+
+
+def is_ranked(queryset):
+    """Whether ``queryset`` is a full-text search, ordered by relevance."""
+    return SEARCH_RANK in queryset.query.annotations
+
+
+def keyset_filter(queryset, cursor):
+    """
+    Order ``queryset`` by ``(-created_at, -id)``, or by ``(search_rank, -id)``
+    for a full-text search so its pages keep the relevance order, and keep
+    the rows after ``cursor``.
+    """
+    ranked = is_ranked(queryset)
+    queryset = queryset.order_by(SEARCH_RANK if ranked else '-created_at', '-pk')
+    if not cursor:
+        return queryset
+    key, pk = decode_cursor(cursor, ranked)
+    if ranked:
+        # bm25 scores are negative, best first; equal ones fall back to the id.
+        return queryset.filter(Q(**{f'{SEARCH_RANK}__gt': key}) | Q(**{SEARCH_RANK: key, 'pk__lt': pk}))
+    # The leading created_at bound keeps this an index range search.
+    return queryset.filter(
+        Q(created_at__lte=key) & (Q(created_at__lt=key) | Q(pk__lt=pk))
+    )
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    Return ``(objects, next_cursor)`` for the page after ``cursor``.
+    ``next_cursor`` is None on the last page.
+    """
+    objects = list(keyset_filter(queryset, cursor)[:page_size + 1])
+    next_cursor = encode_cursor(objects[page_size - 1], is_ranked(queryset)) if len(objects) > page_size else None
+    return objects[:page_size], next_cursor
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination by default; passing ``?cursor=`` (empty for the
+    first page) switches to keyset pagination on ``(created_at, id)``, or on
+    the search rank for searches, which needs no COUNT query and costs the
+    same on every page.
+    """
+    cursor_query_param = CURSOR_PARAM
+
+    def set_count(self, count):
+        """Use ``count`` for the next page-number page instead of a COUNT query."""
+        self.django_paginator_class = partial(CountedPaginator, count=count)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            objects, self.next_cursor = keyset_page(
+                queryset, request.query_params[self.cursor_query_param], page_size
+            )
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        return objects
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def get_next_cursor_link(self):
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
@@ -1,18 +1,20 @@
 from rest_framework import permissions
 
+# Compare ids: in stateless JWT mode request.user is a TokenUser, not a User.
+
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
 
 
 class IsProposalParticipant(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user in [obj.ad_sender.user, obj.ad_receiver.user]
+        return request.user.pk in (obj.ad_sender.user_id, obj.ad_receiver.user_id)
 
 
 class IsProposalReceiver(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.ad_receiver.user
+        return request.user.pk == obj.ad_receiver.user_id
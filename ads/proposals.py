@@ -0,0 +1,211 @@
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import Ad, ExchangeProposal
+from .stats import apply_deltas, new_deltas, proposal_deltas
+from .trades import record_changes
+
+BATCH_LIMIT = 100
+OPERATION_STATUS = {'accept': 'accepted', 'reject': 'rejected'}
+
+
+class ProposalConflict(Exception):
+    """The proposal was decided by another request in the meantime."""
+
+
+def user_proposals(user_id):
+    """Proposals the user sent or received."""
+    return ExchangeProposal.objects.filter(Q(ad_sender__user=user_id) | Q(ad_receiver__user=user_id))
+
+
+def _lock_ads(ad_ids):
+    """
+    Queue up concurrent decisions on the same ads by locking their rows in
+    pk order. SQLite has no row locks; there the conditional UPDATE that
+    starts every decision takes the database write lock instead.
+    """
+    if connection.features.has_select_for_update:
+        list(Ad.objects.select_for_update().filter(pk__in=ad_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def _reject_conflicts(ad_ids):
+    """Reject every pending proposal for ``ad_ids`` with one UPDATE; returns the trade graph changes."""
+    conflicts = ExchangeProposal.objects.filter(
+        Q(ad_sender__in=ad_ids) | Q(ad_receiver__in=ad_ids), status='pending',
+    )
+    rows = list(conflicts.values_list('pk', 'ad_sender_id', 'ad_receiver_id'))
+    if rows:
+        conflicts.filter(pk__in=[pk for pk, _, _ in rows]).update(status='rejected', updated_at=timezone.now())
+    return [('remove', *row) for row in rows]
+
+
+def accept_proposal(proposal):
+    """
+    Accept a pending proposal and reject all other pending proposals for its
+    two ads, which are no longer available. Raises ``ProposalConflict`` when
+    the proposal is not pending any more, e.g. because a competing accept
+    for one of the ads committed first. Signals are not sent, so do not
+    ``save()`` the instance afterwards.
+    """
+    ad_ids = [proposal.ad_sender_id, proposal.ad_receiver_id]
+    with transaction.atomic():
+        _lock_ads(ad_ids)
+        _decide(proposal, 'accepted', _reject_conflicts)
+    return proposal
+
+
+def reject_proposal(proposal):
+    """
+    Reject a pending proposal. Raises ``ProposalConflict`` when it is not
+    pending any more; like ``accept_proposal``, signals are not sent.
+    """
+    with transaction.atomic():
+        _decide(proposal, 'rejected')
+    return proposal
+
+
+def decide_proposal(proposal, status):
+    """
+    Give a pending proposal its new ``status``. Raises ``ProposalConflict``
+    when it was already decided: decisions are final.
+    """
+    if status == 'accepted':
+        return accept_proposal(proposal)
+    if status == 'rejected':
+        return reject_proposal(proposal)
+    if not ExchangeProposal.objects.filter(pk=proposal.pk, status='pending').exists():
+        raise ProposalConflict('This proposal is no longer pending.')
+    return proposal
+
+
+def _decide(proposal, status, then=None):
+    """
+    Move ``proposal`` from pending to ``status`` with a conditional UPDATE,
+    which a concurrent decision cannot slip past, and do the bookkeeping the
+    skipped signals would have done. ``then(ad_ids)`` returns further trade
+    graph changes.
+    """
+    ad_ids = [proposal.ad_sender_id, proposal.ad_receiver_id]
+    users = proposal.ad_sender.user_id, proposal.ad_receiver.user_id
+    now = timezone.now()
+    decided = ExchangeProposal.objects.filter(pk=proposal.pk, status='pending').update(status=status, updated_at=now)
+    if not decided:
+        raise ProposalConflict('This proposal is no longer pending.')
+    graph_changes = [('remove', proposal.pk, *ad_ids)] + (then(ad_ids) if then else [])
+    deltas = proposal_deltas(*users, 'pending', sign=-1)
+    apply_deltas(proposal_deltas(*users, status, deltas=deltas))
+    bump_version('proposals')
+    record_changes(graph_changes)
+    proposal.status = status
+    proposal.updated_at = now
+
+
+def _error(op, message):
+    return {'op': op, 'ok': False, 'error': message}
+
+
+def _success(op, proposal):
+    return {'op': op, 'ok': True, 'id': proposal.pk, 'status': proposal.status}
+
+
+def apply_batch(user, operations):
+    """
+    Apply validated ``create``/``accept``/``reject`` operations on behalf of
+    ``user`` and return one result per operation, in order. Permissions are
+    checked with one query for the proposals and one for the ads, and every
+    accepted operation is written by set-based statements in one
+    transaction, so the cost does not grow with the batch. Only pending
+    proposals can be decided. Accepts reject the other pending proposals for
+    their ads like ``accept_proposal``, and creates for those ads fail;
+    ``ProposalConflict`` is raised, and nothing written, when a decided
+    proposal changed since it was read.
+    """
+    proposal_ids = [op['id'] for op in operations if op['op'] in OPERATION_STATUS]
+    ad_ids = {op[field] for op in operations if op['op'] == 'create' for field in ('ad_sender_id', 'ad_receiver_id')}
+    proposals = {}
+    if proposal_ids:
+        proposals = ExchangeProposal.objects.filter(pk__in=proposal_ids).annotate(
+            sender_user_id=F('ad_sender__user_id'), receiver_user_id=F('ad_receiver__user_id'),
+        ).only('id', 'status', 'ad_sender', 'ad_receiver').in_bulk()
+    ad_owners = dict(Ad.objects.filter(pk__in=ad_ids).values_list('pk', 'user_id')) if ad_ids else {}
+
+    results = [None] * len(operations)
+    to_create, to_update, seen, traded_ads = [], [], set(), set()
+    graph_changes = []
+    deltas = new_deltas()
+    # Decisions first, so creates know every ad the batch trades away, wherever they appear in it.
+    for index, op in sorted(enumerate(operations), key=lambda item: item[1]['op'] == 'create'):
+        name = op['op']
+        if name == 'create':
+            sender_owner = ad_owners.get(op['ad_sender_id'])
+            receiver_owner = ad_owners.get(op['ad_receiver_id'])
+            if receiver_owner is None:
+                results[index] = _error(name, 'Ad to receive the proposal does not exist.')
+            elif sender_owner != user.pk:
+                results[index] = _error(name, 'You cannot send a proposal for this ad.')
+            elif receiver_owner == user.pk:
+                results[index] = _error(name, 'You cannot send a proposal to yourself.')
+            elif {op['ad_sender_id'], op['ad_receiver_id']} & traded_ads:
+                results[index] = _error(name, 'Ad is traded by a proposal accepted in this batch.')
+            else:
+                proposal = ExchangeProposal(
+                    ad_sender_id=op['ad_sender_id'], ad_receiver_id=op['ad_receiver_id'], comment=op['comment'],
+                )
+                to_create.append(proposal)
+                proposal_deltas(sender_owner, receiver_owner, proposal.status, deltas=deltas)
+                results[index] = proposal
+            continue
+
+        proposal = proposals.get(op['id'])
+        status = OPERATION_STATUS[name]
+        pair = {proposal.ad_sender_id, proposal.ad_receiver_id} if proposal else set()
+        if proposal is None:
+            results[index] = _error(name, 'Not found.')
+        elif proposal.receiver_user_id != user.pk:
+            results[index] = _error(name, 'You do not have permission to perform this action.')
+        elif proposal.pk in seen:
+            results[index] = _error(name, 'Duplicate operation for this proposal.')
+        elif proposal.status != 'pending':
+            # Decisions are final, as in decide_proposal().
+            results[index] = _error(name, 'This proposal is no longer pending.')
+        elif status == 'accepted' and pair & traded_ads:
+            results[index] = _error(name, 'Conflicts with a proposal accepted earlier in this batch.')
+        else:
+            seen.add(proposal.pk)
+            graph_changes.append(('remove', proposal.pk, proposal.ad_sender_id, proposal.ad_receiver_id))
+            proposal_deltas(proposal.sender_user_id, proposal.receiver_user_id, proposal.status, -1, deltas)
+            proposal_deltas(proposal.sender_user_id, proposal.receiver_user_id, status, deltas=deltas)
+            proposal.status = status
+            to_update.append(proposal)
+            if status == 'accepted':
+                traded_ads |= pair
+            results[index] = proposal
+
+    if to_create or to_update:
+        # Bulk writes skip the model signals; do their bookkeeping here.
+        with transaction.atomic():
+            _lock_ads(traded_ads)
+            for status in OPERATION_STATUS.values():
+                ids = [proposal.pk for proposal in to_update if proposal.status == status]
+                updated = ExchangeProposal.objects.filter(pk__in=ids, status='pending').update(
+                    status=status, updated_at=timezone.now(),
+                )
+                if updated < len(ids):
+                    raise ProposalConflict('Some proposals were decided by another request; retry the batch.')
+            if traded_ads:
+                graph_changes += _reject_conflicts(traded_ads)
+            ExchangeProposal.objects.bulk_create(to_create)
+            apply_deltas(deltas)
+            bump_version('proposals')
+            record_changes(graph_changes + [
+                ('add', proposal.pk, proposal.ad_sender_id, proposal.ad_receiver_id,
+                 ad_owners[proposal.ad_sender_id], ad_owners[proposal.ad_receiver_id])
+                for proposal in to_create
+            ])
+
+    return [
+        _success(op['op'], result) if isinstance(result, ExchangeProposal) else result
+        for op, result in zip(operations, results)
+    ]
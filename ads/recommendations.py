@@ -0,0 +1,292 @@
+"""
+Suggested trades: ads ranked by how well they would swap for a given ad.
+
+Each ad is a TF-IDF vector of the words of its title, counted twice as in
+search ranking, and of its description, with sublinear term frequencies
+and cosine similarity. The index is inverted: for every term, the rows of
+the ads using it and their weights, kept in growable arrays that NumPy
+reads without copying. A query keeps its ``RECOMMENDATION_QUERY_TERMS``
+strongest terms, sums their postings with ``np.bincount``, boosts ads of
+the same category and picks the top ones with ``np.argpartition``. Only the
+postings of those terms are read, never every vector, and common terms are
+left out once ``RECOMMENDATION_MAX_POSTINGS`` is spent.
+
+Like the trade graph (``ads.trades``), each process keeps its own index,
+patched from the Ad signals once their transaction commits and from the
+changes other workers log under ``recommendations`` (see ``ads.indexes``).
+A saved ad gets a new row. Its previous row, like a deleted ad's, is marked
+dead and scores nothing. Document norms use the IDF of when the row was
+added. The index is compacted once a quarter of its rows are dead or it has
+doubled since its weights were computed: rows are renumbered and every
+weight recomputed from the stored term counts, in the background thread
+that also loads the index.
+"""
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from .indexes import SharedIndex
+from .models import Ad
+
+VERSION_NAMESPACE = 'recommendations'
+TERM_RE = re.compile(r'\w\w+')
+TITLE_WEIGHT = 2
+# Rows store a category as its index in the choices, -1 when unknown.
+CATEGORIES = {value: index for index, (value, _) in enumerate(Ad.CATEGORY_CHOICES)}
+
+
+def term_counts(title, description):
+    counts = Counter(TERM_RE.findall(description.lower()))
+    for term in TERM_RE.findall(title.lower()):
+        counts[term] += TITLE_WEIGHT
+    return counts
+
+
+class RecommendationIndex(SharedIndex):
+    namespace = VERSION_NAMESPACE
+
+    def clear_data(self):
+        self.vocabulary = {}
+        # Live ads, and per term id: live ads using the term, and the rows and weights of its postings.
+        self.documents = 0
+        self.df = array('i')
+        self.posting_rows = []
+        self.posting_weights = []
+        # Per row. A row's term ids and counts are term_ids[offsets[row]:offsets[row + 1]].
+        self.ad_ids = array('q')
+        self.users = array('q')
+        self.categories = array('b')
+        self.alive = bytearray()
+        self.offsets = array('q', [0])
+        self.term_ids = array('i')
+        self.term_counts = array('f')
+        self.rows = {}
+        self.weighted_rows = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    # Mutations.
+
+    def _term_id(self, term):
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            term_id = self.vocabulary[term] = len(self.df)
+            self.df.append(0)
+            self.posting_rows.append(array('i'))
+            self.posting_weights.append(array('f'))
+        return term_id
+
+    def _idf(self, term_ids):
+        df = np.frombuffer(self.df, dtype=np.int32)[term_ids]
+        return np.log((1 + self.documents) / (1 + df)) + 1
+
+    def _append(self, ad_id, user_id, category, term_ids, counts):
+        """Add a row, weighted with the current IDF; ``documents`` and ``df`` must already count it."""
+        row = len(self.ad_ids)
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        weights = 1 + np.log(np.asarray(counts, dtype=np.float32))
+        norm = np.linalg.norm(weights * self._idf(term_ids))
+        for term_id, weight in zip(term_ids.tolist(), (weights / norm if norm else weights).tolist()):
+            self.posting_rows[term_id].append(row)
+            self.posting_weights[term_id].append(weight)
+        self.ad_ids.append(ad_id)
+        self.users.append(user_id)
+        self.categories.append(category)
+        self.alive.append(1)
+        self.term_ids.extend(term_ids.tolist())
+        self.term_counts.extend(counts)
+        self.offsets.append(len(self.term_ids))
+        self.rows[ad_id] = row
+
+    def add(self, ad_id, user_id, category, title, description):
+        """Index an ad, replacing its previous version."""
+        self.remove(ad_id)
+        counts = term_counts(title, description)
+        term_ids = [self._term_id(term) for term in counts]
+        for term_id in term_ids:
+            self.df[term_id] += 1
+        self.documents += 1
+        self._append(ad_id, user_id, CATEGORIES.get(category, -1), term_ids, list(counts.values()))
+
+    def remove(self, ad_id):
+        row = self.rows.pop(ad_id, None)
+        if row is None:
+            return
+        self.alive[row] = 0
+        self.documents -= 1
+        for term_id in self.term_ids[self.offsets[row]:self.offsets[row + 1]]:
+            self.df[term_id] -= 1
+
+    def _rebuild(self, entries):
+        """Replace every row with ``entries`` of ``(ad_id, user_id, category, term_ids, counts)``."""
+        vocabulary, terms = self.vocabulary, len(self.vocabulary)
+        self.clear_data()
+        self.vocabulary, self.documents = vocabulary, len(entries)
+        for ad_id, user_id, category, term_ids, counts in entries:
+            self.rows[ad_id] = len(self.ad_ids)
+            self.ad_ids.append(ad_id)
+            self.users.append(user_id)
+            self.categories.append(category)
+            self.term_ids.extend(term_ids)
+            self.term_counts.extend(counts)
+            self.offsets.append(len(self.term_ids))
+        self.alive = bytearray(b'\x01') * len(entries)
+        self.weighted_rows = len(entries)
+
+        # The weights of every row at once, as _append computes them one row at a time.
+        term_ids = np.array(self.term_ids, dtype=np.int32)
+        self.df = array('i', np.bincount(term_ids, minlength=terms).astype(np.int32).tobytes())
+        rows = np.repeat(np.arange(len(entries), dtype=np.int32), np.diff(np.array(self.offsets, dtype=np.int64)))
+        weights = 1 + np.log(np.array(self.term_counts, dtype=np.float64))
+        norms = np.sqrt(np.bincount(rows, (weights * self._idf(term_ids)) ** 2, minlength=len(entries)))
+        weights = (weights / np.where(norms > 0, norms, 1)[rows]).astype(np.float32)
+
+        order = np.argsort(term_ids, kind='stable')
+        bounds = np.searchsorted(term_ids[order], np.arange(terms + 1)).tolist()
+        rows, weights = rows[order], weights[order]
+        self.posting_rows = [array('i', rows[start:end].tobytes()) for start, end in zip(bounds, bounds[1:])]
+        self.posting_weights = [array('f', weights[start:end].tobytes()) for start, end in zip(bounds, bounds[1:])]
+
+    def compact(self):
+        """
+        Rebuild the live rows from a copy taken under the lock, without holding
+        it, and swap the result in; changes made meanwhile are replayed.
+        """
+        with self.lock:
+            version, vocabulary, alive = self.version, dict(self.vocabulary), bytes(self.alive)
+            ad_ids, users, categories = self.ad_ids[:], self.users[:], self.categories[:]
+            offsets, term_ids, counts = self.offsets[:], self.term_ids[:], self.term_counts[:]
+        fresh = type(self)()
+        fresh.vocabulary = vocabulary
+        fresh._rebuild([
+            (ad_ids[row], users[row], categories[row],
+             term_ids[offsets[row]:offsets[row + 1]], counts[offsets[row]:offsets[row + 1]])
+            for row in np.flatnonzero(np.frombuffer(alive, dtype=np.uint8)).tolist()
+        ])
+        fresh.version = version
+        self.replace(fresh)
+
+    def _needs_compaction(self):
+        dead = len(self.ad_ids) - len(self.rows)
+        return dead * 4 > len(self.ad_ids) or len(self.rows) > 2 * max(self.weighted_rows, 1000)
+
+    def after_changes(self):
+        if self._needs_compaction():
+            self.start(self.compact)
+
+    def populate(self):
+        entries = []
+        rows = Ad.objects.values_list(
+            'pk', 'user_id', 'category', 'title', 'description',
+        ).order_by('pk').iterator(chunk_size=10000)
+        for pk, user_id, category, title, description in rows:
+            counts = term_counts(title, description)
+            term_ids = [self._term_id(term) for term in counts]
+            entries.append((pk, user_id, CATEGORIES.get(category, -1), term_ids, list(counts.values())))
+        self._rebuild(entries)
+
+    def apply_changes(self, changes):
+        """``changes`` are ``('add', *add args)`` or ``('remove', ad_id)``."""
+        handlers = {'add': self.add, 'remove': self.remove}
+        for name, *args in changes:
+            handlers[name](*args)
+
+    # Queries.
+
+    def _query_terms(self, title, description):
+        """
+        The term ids and weights of the text's strongest terms, as many as
+        ``RECOMMENDATION_QUERY_TERMS`` and ``RECOMMENDATION_MAX_POSTINGS``
+        allow. Common terms have the lowest weights, so they are dropped first.
+        """
+        counts = {
+            self.vocabulary[term]: count for term, count in term_counts(title, description).items()
+            if term in self.vocabulary
+        }
+        term_ids = np.fromiter(counts, dtype=np.int32, count=len(counts))
+        idf = self._idf(term_ids)
+        weights = (1 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))) * idf
+        # Postings hold document weights without their IDF, applied here with the current one.
+        weights = weights / (np.linalg.norm(weights) or 1) * idf
+        chosen, budget = [], settings.RECOMMENDATION_MAX_POSTINGS
+        for i in np.argsort(-weights)[:settings.RECOMMENDATION_QUERY_TERMS].tolist():
+            size = len(self.posting_rows[term_ids[i]])
+            if chosen and size > budget:
+                continue
+            chosen.append(i)
+            budget -= size
+        return term_ids[chosen], weights[chosen]
+
+    def scores(self, title, description, category=None):
+        """``(rows, scores)`` of the live rows sharing a query term with the text, in row order."""
+        term_ids, weights = self._query_terms(title, description)
+        if not len(term_ids):
+            return np.zeros(0, dtype=np.intp), np.zeros(0)
+        rows = np.concatenate([np.frombuffer(self.posting_rows[term_id], dtype=np.int32) for term_id in term_ids])
+        postings = np.concatenate([
+            np.frombuffer(self.posting_weights[term_id], dtype=np.float32) * weight
+            for term_id, weight in zip(term_ids, weights)
+        ])
+        scores = np.bincount(rows, postings, minlength=len(self.ad_ids))
+        # Only the rows that scored go on; dead ones have no score.
+        rows = np.flatnonzero(scores)
+        rows = rows[np.frombuffer(self.alive, dtype=np.uint8)[rows].astype(bool)]
+        scores = scores[rows]
+        if category in CATEGORIES:
+            scores[np.frombuffer(self.categories, dtype=np.int8)[rows] == CATEGORIES[category]] *= (
+                1 + settings.RECOMMENDATION_CATEGORY_BOOST
+            )
+        return rows, scores
+
+    def suggest(self, ad, user_id=None, limit=10):
+        """
+        Rank swaps for ``ad``: returns ``(own, others)``, lists of ``(ad_id,
+        score)``. ``own`` ranks every indexed ad of ``user_id`` that scores,
+        ``others`` the best ``limit`` ads of anyone else, ``ad`` excluded.
+        """
+        with self.lock:
+            rows, scores = self.scores(ad.title, ad.description, ad.category)
+            keep = rows != self.rows.get(ad.pk, -1)
+            rows, scores = rows[keep], scores[keep]
+            own = []
+            if user_id is not None:
+                mine = np.frombuffer(self.users, dtype=np.int64)[rows] == user_id
+                own = self._ranked(rows[mine], scores[mine])
+                rows, scores = rows[~mine], scores[~mine]
+            if len(rows) > limit:
+                best = np.argpartition(-scores, limit - 1)[:limit]
+                rows, scores = rows[best], scores[best]
+            return own, self._ranked(rows, scores)
+
+    def _ranked(self, rows, scores):
+        order = np.argsort(-scores, kind='stable')
+        return [(self.ad_ids[row], score) for row, score in zip(rows[order].tolist(), scores[order].tolist())]
+
+
+recommendations = RecommendationIndex()
+
+
+def ranked_ads(ranked, queryset=None):
+    """The ads of ``(ad_id, score)`` pairs, in order and with a ``score``; ads deleted since are left out."""
+    queryset = Ad.objects.select_related('user') if queryset is None else queryset
+    ads = queryset.in_bulk([ad_id for ad_id, _ in ranked])
+    results = []
+    for ad_id, score in ranked:
+        if ad_id in ads:
+            ads[ad_id].score = score
+            results.append(ads[ad_id])
+    return results
+
+
+def record_changes(changes):
+    """Patch the index of every process with ``changes`` once the current transaction commits."""
+    recommendations.record(changes)
+
+
+def invalidate():
+    """Make every process reload the index, e.g. after bulk writes that skip the signals."""
+    recommendations.invalidate()
@@ -0,0 +1,108 @@
+import re
+
+from django.db import connections
+from django.db.models import F, FloatField, Func, Lookup, Q
+
+from .models import AdSearchIndex
+
+FTS_TABLE = 'ads_ad_fts'
+
+# Title matches weigh twice as much as description matches in the bm25 score.
+RANK_WEIGHTS = (2.0, 1.0)
+
+FTS_SCHEMA_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='ads_ad', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON ads_ad BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON ads_ad BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON ads_ad BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+FTS_REBUILD_SQL = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+TERM_RE = re.compile(r'\w+')
+# Annotation holding the bm25 score of each result; lower is a better match.
+SEARCH_RANK = 'search_rank'
+
+
+class SearchMatch(Lookup):
+    """
+    ``search_index__title__match``: MATCH takes the FTS table itself, not a
+    column, so the lookup names the join's alias. Filtering through the
+    relation joins the table once, as an INNER JOIN.
+    """
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        rhs, params = self.process_rhs(compiler, connection)
+        return f'{compiler.quote_name_unless_alias(self.lhs.alias)} MATCH {rhs}', params
+
+
+class SearchRank(Func):
+    """bm25() of the FTS row joined through ``Ad.search_index``, reusing the join of ``SearchMatch``."""
+    output_field = FloatField()
+
+    def __init__(self):
+        super().__init__(F('search_index__title'))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        column, = self.get_source_expressions()
+        table = compiler.quote_name_unless_alias(column.alias)
+        return f'bm25({table}, {", ".join(map(str, RANK_WEIGHTS))})', []
+
+
+AdSearchIndex._meta.get_field('title').register_lookup(SearchMatch)
+
+
+def supports_full_text(using):
+    return connections[using].vendor == 'sqlite'
+
+
+def build_match_query(text):
+    """Turn free user input into an FTS5 query where every word is a prefix term."""
+    return ' '.join(f'"{term}"*' for term in TERM_RE.findall(text))
+
+
+def search_ads(queryset, text):
+    """Filter ads matching ``text`` and order them by relevance, best match first."""
+    if not supports_full_text(queryset.db):
+        return queryset.filter(Q(title__icontains=text) | Q(description__icontains=text))
+
+    match = build_match_query(text)
+    if not match:
+        return queryset.none()
+
+    # One join of the FTS table: MATCH filters it and bm25() scores the same rows.
+    return queryset.filter(search_index__title__match=match).annotate(
+        **{SEARCH_RANK: SearchRank()}
+    ).order_by(SEARCH_RANK, '-created_at')
+
+
+def rebuild_search_index(using='default'):
+    if not supports_full_text(using):
+        return False
+    with connections[using].cursor() as cursor:
+        for sql in FTS_SCHEMA_SQL:
+            cursor.execute(sql)
+        cursor.execute(FTS_REBUILD_SQL)
+    return True
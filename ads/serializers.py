@@ -1,5 +1,11 @@
+from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework import serializers
 from .models import Ad, ExchangeProposal
+from .proposals import BATCH_LIMIT, ProposalConflict, decide_proposal
+from .sparse import prefixed
+from .thumbnails import thumbnail_urls
 from django.contrib.auth.models import User
 
 
@@ -20,15 +26,93 @@ class AdCreateUpdateSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'user']
 
 
-class AdRetrieveSerializer(serializers.ModelSerializer):
+class SparseFieldsSerializerMixin:
+    """Accepts ``fields``, the names of the fields to keep; None keeps them all."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ThumbnailUrlsMixin:
+    @cached_property
+    def base_uri(self):
+        request = self.context.get('request')
+        return request.build_absolute_uri('/')[:-1] if request else ''
+
+    def absolute_thumbnail_urls(self, pk, image_url):
+        urls = thumbnail_urls(pk, image_url)
+        if urls is None:
+            return None
+        return {size: self.base_uri + url for size, url in urls.items()}
+
+
+# The columns each readable ad field is built from, for sparse fieldsets.
+AD_FIELD_COLUMNS = {
+    'id': ('id',),
+    'user': ('user__id', 'user__username'),
+    'title': ('title',),
+    'description': ('description',),
+    'image_url': ('image_url',),
+    'thumbnails': ('id', 'image_url'),
+    'category': ('category',),
+    'condition': ('condition',),
+    'created_at': ('created_at',),
+}
+
+
+class AdRetrieveSerializer(SparseFieldsSerializerMixin, ThumbnailUrlsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Ad
-        fields = ['id', 'user', 'title', 'description', 'image_url', 'category', 'condition', 'created_at']
-
-
-class ExchangeProposalRetrieveSerializer(serializers.ModelSerializer):
+        fields = list(AD_FIELD_COLUMNS)
+
+    def get_thumbnails(self, ad):
+        return self.absolute_thumbnail_urls(ad.pk, ad.image_url)
+
+
+class AdRowSerializer(ThumbnailUrlsMixin, serializers.BaseSerializer):
+    """
+    Read-only fast path for ad lists: the output of ``AdRetrieveSerializer``,
+    built straight from ``values()`` rows with the ``AD_FIELD_COLUMNS``
+    columns, without model instances or a serializer field per value.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_fields = fields or AdRetrieveSerializer.Meta.fields
+        # Resolve the current time zone once, not for every value.
+        self.datetime_field = serializers.DateTimeField(default_timezone=timezone.get_current_timezone())
+
+    def to_representation(self, row):
+        data = {}
+        for name in self.output_fields:
+            if name == 'user':
+                data[name] = {'id': row['user__id'], 'username': row['user__username']}
+            elif name == 'thumbnails':
+                data[name] = self.absolute_thumbnail_urls(row['id'], row['image_url'])
+            elif name == 'created_at':
+                data[name] = self.datetime_field.to_representation(row[name])
+            else:
+                data[name] = row[name]
+        return data
+
+
+PROPOSAL_FIELD_COLUMNS = {
+    'id': ('id',),
+    'ad_sender': ('ad_sender__updated_at', *prefixed('ad_sender', AD_FIELD_COLUMNS)),
+    'ad_receiver': ('ad_receiver__updated_at', *prefixed('ad_receiver', AD_FIELD_COLUMNS)),
+    'comment': ('comment',),
+    'status': ('status',),
+    'created_at': ('created_at',),
+}
+
+
+class ExchangeProposalRetrieveSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     ad_sender = AdRetrieveSerializer(read_only=True)
     ad_receiver = AdRetrieveSerializer(read_only=True)
     ad_sender_id = serializers.PrimaryKeyRelatedField(
@@ -70,3 +154,43 @@ class ExchangeProposalStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExchangeProposal
         fields = ['status']
+
+    def update(self, instance, validated_data):
+        try:
+            return decide_proposal(instance, validated_data.get('status', instance.status))
+        except ProposalConflict as error:
+            raise serializers.ValidationError({'status': [str(error)]})
+
+
+class ProposalBatchOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['create', 'accept', 'reject'])
+    id = serializers.IntegerField(required=False, help_text="Proposal to accept or reject")
+    ad_sender_id = serializers.IntegerField(required=False)
+    ad_receiver_id = serializers.IntegerField(required=False)
+    comment = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        required = ['ad_sender_id', 'ad_receiver_id'] if attrs['op'] == 'create' else ['id']
+        missing = {field: ["This field is required."] for field in required if field not in attrs}
+        if missing:
+            raise serializers.ValidationError(missing)
+        return attrs
+
+
+class ProposalBatchSerializer(serializers.Serializer):
+    operations = ProposalBatchOperationSerializer(many=True, allow_empty=False, max_length=BATCH_LIMIT)
+
+
+class SuggestionQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class TradeCycleQuerySerializer(serializers.Serializer):
+    ad = serializers.IntegerField(required=False)
+    max_length = serializers.IntegerField(min_value=2, default=4)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+    def validate_max_length(self, value):
+        if value > settings.TRADE_CYCLE_MAX_LENGTH:
+            raise serializers.ValidationError(f"Ensure this value is at most {settings.TRADE_CYCLE_MAX_LENGTH}.")
+        return value
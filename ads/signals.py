@@ -0,0 +1,211 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .authentication import forget_user, restore_user, revoke_user
+from .cache import bump_version
+from .conditional import USERNAMES_NAMESPACE
+from .models import Ad, ExchangeProposal, UserStats
+from .recommendations import invalidate as invalidate_recommendations, record_changes as record_ad_changes
+from .stats import apply_deltas, new_deltas, proposal_deltas
+from .trades import invalidate as invalidate_trade_graph, record_changes
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=User)
+def remember_user_state(sender, instance, **kwargs):
+    instance._cached_state = (instance.__dict__.get('username'), instance.__dict__.get('is_active'))
+
+
+@receiver(post_save, sender=User)
+def forget_saved_user(sender, instance, created, **kwargs):
+    forget_user(instance)
+    was_active = instance._cached_state[1]
+    if not instance.is_active and (created or was_active is not False):
+        revoke_user(instance.pk)
+    elif instance.is_active and not created and was_active is not True:
+        restore_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_renamed_user(sender, instance, created, **kwargs):
+    # Cached ad pages and API ETags cover their owners' usernames.
+    if not created and instance._cached_state[0] not in (None, instance.username):
+        bump_version('ads')
+        bump_version(USERNAMES_NAMESPACE)
+
+
+@receiver(post_save, sender=User)
+def remember_saved_user_state(sender, instance, **kwargs):
+    # Connected after the receivers above, which compare against the previous state.
+    instance._cached_state = (instance.username, instance.is_active)
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    forget_user(instance)
+    revoke_user(instance.pk)
+
+
+# post_init snapshots read __dict__ directly so deferred fields are never loaded.
+
+@receiver(post_init, sender=Ad)
+def remember_ad_owner(sender, instance, **kwargs):
+    instance._stats_user_id = instance.__dict__.get('user_id')
+
+
+@receiver(post_save, sender=Ad)
+def count_saved_ad(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    deltas = new_deltas()
+    if created:
+        deltas[instance.user_id]['listings_count'] += 1
+    elif instance._stats_user_id not in (None, instance.user_id):
+        deltas[instance._stats_user_id]['listings_count'] -= 1
+        deltas[instance.user_id]['listings_count'] += 1
+        record_changes([('move', instance.pk, instance.user_id)])
+    apply_deltas(deltas)
+    instance._stats_user_id = instance.user_id
+
+
+@receiver(post_delete, sender=Ad)
+def count_deleted_ad(sender, instance, **kwargs):
+    deltas = new_deltas()
+    deltas[instance.user_id]['listings_count'] -= 1
+    apply_deltas(deltas, create_missing=False)
+
+
+def _proposal_users(instance):
+    return instance.ad_sender.user_id, instance.ad_receiver.user_id
+
+
+PROPOSAL_STATE_FIELDS = ('ad_sender_id', 'ad_receiver_id', 'status')
+
+
+@receiver(post_init, sender=ExchangeProposal)
+def remember_proposal_state(sender, instance, **kwargs):
+    instance._stats_state = tuple(instance.__dict__.get(field) for field in PROPOSAL_STATE_FIELDS)
+
+
+@receiver(post_save, sender=ExchangeProposal)
+def count_saved_proposal(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    state = tuple(getattr(instance, field) for field in PROPOSAL_STATE_FIELDS)
+    old_sender_id, old_receiver_id, old_status = instance._stats_state
+    if created:
+        apply_deltas(proposal_deltas(*_proposal_users(instance), instance.status))
+    elif None not in instance._stats_state and state != instance._stats_state:
+        if (old_sender_id, old_receiver_id) == state[:2]:
+            old_users = _proposal_users(instance)
+        else:
+            ads = Ad.objects.in_bulk([old_sender_id, old_receiver_id])
+            old_users = ads[old_sender_id].user_id, ads[old_receiver_id].user_id
+        deltas = proposal_deltas(*old_users, old_status, sign=-1)
+        apply_deltas(proposal_deltas(*_proposal_users(instance), instance.status, deltas=deltas))
+
+
+@receiver(post_save, sender=ExchangeProposal)
+def update_trade_graph(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if not created and None in instance._stats_state:
+        invalidate_trade_graph()  # Loaded without its previous state, e.g. via only().
+        return
+    state = tuple(getattr(instance, field) for field in PROPOSAL_STATE_FIELDS)
+    if not created and state == instance._stats_state:
+        return  # E.g. a new comment: the edge is unchanged, so its owners need not be loaded.
+    old_sender_id, old_receiver_id, old_status = instance._stats_state
+    changes = []
+    if not created and old_status == 'pending':
+        changes.append(('remove', instance.pk, old_sender_id, old_receiver_id))
+    if instance.status == 'pending':
+        changes.append(('add', instance.pk, instance.ad_sender_id, instance.ad_receiver_id,
+                        *_proposal_users(instance)))
+    if changes:
+        record_changes(changes)
+
+
+@receiver(post_save, sender=ExchangeProposal)
+def remember_saved_proposal_state(sender, instance, **kwargs):
+    # Connected after the receivers above, which compare against the previous state.
+    instance._stats_state = tuple(getattr(instance, field) for field in PROPOSAL_STATE_FIELDS)
+
+
+def _deleted_proposal_ads(instance):
+    return instance._stats_state[0] or instance.ad_sender_id, instance._stats_state[1] or instance.ad_receiver_id
+
+
+@receiver(pre_delete, sender=ExchangeProposal)
+def collect_deleted_proposal(sender, instance, origin=None, **kwargs):
+    # A cascade sends every pre_delete before any post_delete, so the owners of
+    # all its proposals can be loaded with one query on the first post_delete.
+    if origin is not None:
+        origin.__dict__.setdefault('_deleted_proposals', []).append(instance)
+
+
+def _deleted_proposal_users(instance, origin):
+    if not hasattr(instance, '_stats_users'):
+        proposals = origin.__dict__.pop('_deleted_proposals', None) if origin is not None else None
+        proposals = proposals or [instance]
+        owners = {}
+        if isinstance(origin, Ad):
+            owners[origin.pk] = origin.user_id
+        for proposal in proposals:
+            for field in ('ad_sender', 'ad_receiver'):
+                if ExchangeProposal._meta.get_field(field).is_cached(proposal):
+                    ad = getattr(proposal, field)
+                    owners[ad.pk] = ad.user_id
+        missing = {ad_id for proposal in proposals for ad_id in _deleted_proposal_ads(proposal)} - set(owners)
+        if missing:
+            owners.update(Ad.objects.filter(pk__in=missing).values_list('pk', 'user_id'))
+        for proposal in proposals:
+            sender_id, receiver_id = _deleted_proposal_ads(proposal)
+            proposal._stats_users = owners.get(sender_id), owners.get(receiver_id)
+    return instance._stats_users
+
+
+@receiver(post_delete, sender=ExchangeProposal)
+def count_deleted_proposal(sender, instance, origin=None, **kwargs):
+    status = instance._stats_state[2] or instance.status
+    apply_deltas(proposal_deltas(*_deleted_proposal_users(instance, origin), status, sign=-1), create_missing=False)
+    if status == 'pending':
+        record_changes([('remove', instance.pk, *_deleted_proposal_ads(instance))])
+
+
+@receiver(post_save, sender=Ad)
+@receiver(post_delete, sender=Ad)
+def invalidate_ad_responses(sender, instance, **kwargs):
+    bump_version('ads')
+
+
+@receiver(post_save, sender=ExchangeProposal)
+@receiver(post_delete, sender=ExchangeProposal)
+def invalidate_proposal_responses(sender, instance, **kwargs):
+    # Owner stats on the ad detail page depend on proposals.
+    bump_version('proposals')
+
+
+RECOMMENDATION_FIELDS = {'user_id', 'category', 'title', 'description'}
+
+
+@receiver(post_save, sender=Ad)
+def index_saved_ad(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    if instance.get_deferred_fields() & RECOMMENDATION_FIELDS:
+        invalidate_recommendations()  # Saved without loading its text, e.g. via only().
+        return
+    record_ad_changes([('add', instance.pk, instance.user_id, instance.category, instance.title,
+                        instance.description)])
+
+
+@receiver(post_delete, sender=Ad)
+def unindex_deleted_ad(sender, instance, **kwargs):
+    record_ad_changes([('remove', instance.pk)])
@@ -0,0 +1,103 @@
+from collections import Counter, defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When
+
+from .models import Ad, ExchangeProposal, UserStats
+
+STAT_FIELDS = ('listings_count', 'proposals_sent', 'proposals_received', 'trades_accepted')
+
+
+def new_deltas():
+    return defaultdict(Counter)
+
+
+def proposal_deltas(sender_user_id, receiver_user_id, status, sign=1, deltas=None):
+    """Counter changes caused by one proposal existing (``sign=1``) or going away (``sign=-1``)."""
+    deltas = new_deltas() if deltas is None else deltas
+    deltas[sender_user_id]['proposals_sent'] += sign
+    deltas[receiver_user_id]['proposals_received'] += sign
+    if status == 'accepted':
+        deltas[sender_user_id]['trades_accepted'] += sign
+        deltas[receiver_user_id]['trades_accepted'] += sign
+    return deltas
+
+
+def apply_deltas(deltas, create_missing=True):
+    """
+    Apply ``{user_id: {field: delta}}`` with one UPDATE per touched field,
+    however many users are involved. Users without a stats row yet are
+    recomputed from scratch instead, unless ``create_missing`` is False:
+    deletes pass that, since their user may be the one being deleted.
+    """
+    missing = set()
+    for field in STAT_FIELDS:
+        changes = {user_id: counter[field] for user_id, counter in deltas.items() if counter[field]}
+        if not changes:
+            continue
+        updated = UserStats.objects.filter(user_id__in=changes).update(**{
+            field: F(field) + Case(
+                *[When(user_id=user_id, then=Value(delta)) for user_id, delta in changes.items()],
+                default=Value(0),
+            )
+        })
+        if updated < len(changes) and create_missing:
+            existing = UserStats.objects.filter(user_id__in=changes).values_list('user_id', flat=True)
+            missing.update(set(changes) - set(existing))
+    if missing:
+        recompute_user_stats(missing)
+
+
+def compute_user_stats(user_ids):
+    """Count everything from the source tables for ``user_ids``; returns ``{user_id: Counter}``."""
+    stats = {user_id: Counter() for user_id in user_ids}
+    grouped = [
+        ('listings_count', Ad.objects.filter(user__in=user_ids), 'user'),
+        ('proposals_sent', ExchangeProposal.objects.filter(ad_sender__user__in=user_ids), 'ad_sender__user'),
+        ('proposals_received', ExchangeProposal.objects.filter(ad_receiver__user__in=user_ids), 'ad_receiver__user'),
+        ('trades_accepted', ExchangeProposal.objects.filter(status='accepted', ad_sender__user__in=user_ids),
+         'ad_sender__user'),
+        ('trades_accepted', ExchangeProposal.objects.filter(status='accepted', ad_receiver__user__in=user_ids),
+         'ad_receiver__user'),
+    ]
+    for field, queryset, group_by in grouped:
+        for row in queryset.order_by().values(group_by).annotate(total=Count('id')):
+            stats[row[group_by]][field] += row['total']
+    return stats
+
+
+def recompute_user_stats(user_ids=None, batch_size=5000):
+    """Rebuild stats rows for ``user_ids`` (all users when None); returns the number of rows written."""
+    if user_ids is None:
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size)
+    written = 0
+    batch = []
+    for user_id in user_ids:
+        batch.append(user_id)
+        if len(batch) == batch_size:
+            written += _write_stats(batch)
+            batch = []
+    if batch:
+        written += _write_stats(batch)
+    return written
+
+
+def _write_stats(user_ids):
+    with transaction.atomic():
+        rows = [
+            UserStats(user_id=user_id, **{field: counter[field] for field in STAT_FIELDS})
+            for user_id, counter in compute_user_stats(user_ids).items()
+        ]
+        UserStats.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['user'], update_fields=STAT_FIELDS
+        )
+    return len(rows)
+
+
+def get_user_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        recompute_user_stats([user.pk])
+        return UserStats.objects.get(user=user)
@@ -0,0 +1,11 @@
+from django import template
+
+from ..thumbnails import thumbnail_url as ad_thumbnail_url
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail_url(ad, size):
+    """``{{ ad|thumbnail_url:'card' }}``; empty when the ad has no image."""
+    return ad_thumbnail_url(ad, size) or ''
@@ -0,0 +1,6 @@
+"""The default URLconf with the experimental async endpoints, for their tests."""
+from django.urls import include, path
+
+from barter_platform.urls import urlpatterns as default_urlpatterns
+
+urlpatterns = default_urlpatterns + [path('', include('ads.async_urls'))]
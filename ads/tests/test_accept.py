@@ -0,0 +1,148 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Ad, ExchangeProposal, UserStats
+from ..proposals import ProposalConflict, accept_proposal
+from ..stats import STAT_FIELDS, compute_user_stats
+
+# Tries of each thread before it gives up on a database that stays locked.
+MAX_ATTEMPTS = 100
+
+
+class ProposalFixtureMixin:
+    def create_fixture(self, senders=3):
+        self.receiver = User.objects.create_user(username='receiver', password='testpass123')
+        self.wanted = self.create_ad(self.receiver, 'Guitar')
+        self.other = self.create_ad(self.receiver, 'Lamp')
+        self.senders = [User.objects.create_user(username=f'sender{i}', password='testpass123')
+                        for i in range(senders)]
+        self.offers = [self.create_ad(user, f'Offer {i}') for i, user in enumerate(self.senders)]
+        self.proposals = [
+            ExchangeProposal.objects.create(ad_sender=offer, ad_receiver=self.wanted) for offer in self.offers
+        ]
+
+    def create_ad(self, user, title):
+        return Ad.objects.create(user=user, title=title, description=title, category='other', condition='used')
+
+    def assertStatsConsistent(self):
+        for stats in UserStats.objects.all():
+            recount = compute_user_stats([stats.user_id])[stats.user_id]
+            self.assertEqual({field: getattr(stats, field) for field in STAT_FIELDS},
+                             {field: recount[field] for field in STAT_FIELDS})
+
+
+class AcceptProposalTests(ProposalFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixture()
+        # The sender's offered ad is traded away too.
+        self.counter_offer = ExchangeProposal.objects.create(ad_sender=self.offers[0], ad_receiver=self.other)
+        self.unrelated = ExchangeProposal.objects.create(ad_sender=self.offers[1], ad_receiver=self.other)
+
+    def statuses(self):
+        return dict(ExchangeProposal.objects.values_list('pk', 'status'))
+
+    def test_accept_rejects_conflicts(self):
+        accept_proposal(self.proposals[0])
+        statuses = self.statuses()
+        self.assertEqual(statuses[self.proposals[0].pk], 'accepted')
+        self.assertEqual([statuses[p.pk] for p in self.proposals[1:]], ['rejected', 'rejected'])
+        self.assertEqual(statuses[self.counter_offer.pk], 'rejected')
+        self.assertEqual(statuses[self.unrelated.pk], 'pending')
+        self.assertStatsConsistent()
+
+    def test_accept_decided_proposal(self):
+        accept_proposal(self.proposals[0])
+        with self.assertRaises(ProposalConflict):
+            accept_proposal(ExchangeProposal.objects.get(pk=self.proposals[1].pk))
+        with self.assertRaises(ProposalConflict):
+            accept_proposal(ExchangeProposal.objects.get(pk=self.proposals[0].pk))
+
+    def test_api_accept(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.receiver).access_token}')
+        url = lambda proposal: reverse('api_proposal_detail', kwargs={'pk': proposal.pk})  # noqa: E731
+        response = client.patch(url(self.proposals[1]), {'status': 'accepted'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'accepted')
+        self.assertEqual(self.statuses()[self.proposals[0].pk], 'rejected')
+
+        response = client.patch(url(self.proposals[2]), {'status': 'accepted'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['status'], ['This proposal is no longer pending.'])
+
+    def test_api_decisions_are_final(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.receiver).access_token}')
+        url = lambda proposal: reverse('api_proposal_detail', kwargs={'pk': proposal.pk})  # noqa: E731
+        response = client.patch(url(self.unrelated), {'status': 'rejected'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'rejected')
+        accept_proposal(self.proposals[0])
+
+        for proposal, status in [(self.unrelated, 'rejected'), (self.unrelated, 'pending'),
+                                 (self.proposals[0], 'rejected'), (self.proposals[1], 'accepted')]:
+            response = client.patch(url(proposal), {'status': status})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['status'], ['This proposal is no longer pending.'])
+        self.assertEqual(self.statuses()[self.proposals[0].pk], 'accepted')
+        self.assertStatsConsistent()
+
+    def test_form_accept(self):
+        self.client.login(username='receiver', password='testpass123')
+        url = lambda proposal: reverse('update_proposal_status', kwargs={'pk': proposal.pk})  # noqa: E731
+        response = self.client.post(url(self.proposals[2]), {'status': 'accepted'})
+        self.assertRedirects(response, reverse('manage_proposals'), fetch_redirect_response=False)
+        self.assertEqual(self.statuses()[self.proposals[0].pk], 'rejected')
+
+        response = self.client.post(url(self.proposals[0]), {'status': 'accepted'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'status', 'This proposal is no longer pending.')
+
+
+class ConcurrentAcceptTests(ProposalFixtureMixin, TransactionTestCase):
+    """Competing accepts from many threads, each on its own connection like separate workers."""
+
+    def setUp(self):
+        self.create_fixture(senders=8)
+
+    def test_one_accept_wins(self):
+        outcomes = []
+        barrier = threading.Barrier(len(self.proposals))
+
+        def accept(proposal_id):
+            try:
+                proposal = ExchangeProposal.objects.select_related('ad_sender', 'ad_receiver').get(pk=proposal_id)
+                barrier.wait()
+                for attempt in range(MAX_ATTEMPTS):
+                    try:
+                        accept_proposal(proposal)
+                        outcomes.append('accepted')
+                    except ProposalConflict:
+                        outcomes.append('conflict')
+                    except OperationalError:
+                        # The shared in-memory test database reports lock contention instead of waiting.
+                        time.sleep(0.01 * attempt)
+                        continue
+                    break
+                else:
+                    outcomes.append('locked')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=(proposal.pk,)) for proposal in self.proposals]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['accepted'] + ['conflict'] * (len(self.proposals) - 1))
+        statuses = list(ExchangeProposal.objects.values_list('status', flat=True))
+        self.assertEqual(sorted(statuses), ['accepted'] + ['rejected'] * (len(self.proposals) - 1))
+        self.assertStatsConsistent()
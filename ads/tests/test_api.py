@@ -1,8 +1,13 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import User
-from ..models import Ad, ExchangeProposal
+from ..models import Ad, ExchangeProposal, UserStats
+from ..stats import STAT_FIELDS, compute_user_stats
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
@@ -286,3 +291,169 @@ class ExchangeProposalAPITests(BaseAPITestCase):
         data = {'status': 'rejected'}
         response = self.client.patch(url, data)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CursorPaginationTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.list_url = reverse('api_ad_list')
+        # Identical timestamps must still page in a stable (created_at, id) order.
+        Ad.objects.update(created_at=self.ad1.created_at)
+
+    def walk(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            self.assertNotIn('count', data)
+            ids.extend(item['id'] for item in data['results'])
+            if data['next'] is None:
+                return ids
+            response = self.client.get(data['next'])
+
+    def test_cursor_pages_ads_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, {'cursor': ''})
+        self.assertEqual(len(response.data['results']), 9)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+        ids = self.walk(self.list_url, {'cursor': ''})
+        self.assertEqual(ids, sorted(Ad.objects.values_list('id', flat=True), reverse=True))
+
+    def test_cursor_keeps_filters(self):
+        ids = self.walk(self.list_url, {'cursor': '', 'category': 'electronics'})
+        expected = Ad.objects.filter(category='electronics').values_list('id', flat=True)
+        self.assertEqual(ids, sorted(expected, reverse=True))
+
+    def test_cursor_pages_proposals(self):
+        self.authenticate(self.user1)
+        ids = self.walk(reverse('api_proposal_list'), {'cursor': ''})
+        self.assertEqual(len(ids), 11)
+        self.assertEqual(len(set(ids)), 11)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.list_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProposalBatchTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api_proposal_batch')
+        # user2 receives the odd proposals, user1 the even ones.
+        self.received = list(ExchangeProposal.objects.filter(ad_receiver__user=self.user2).order_by('id'))
+        self.sent = list(ExchangeProposal.objects.filter(ad_sender__user=self.user2).order_by('id'))
+
+    def post(self, operations):
+        return self.client.post(self.url, {'operations': operations}, format='json')
+
+    def test_batch_unauthenticated(self):
+        response = self.post([{'op': 'accept', 'id': self.received[0].id}])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_batch_rejects_malformed_operations(self):
+        self.authenticate(self.user2)
+        response = self.post([{'op': 'accept'}, {'op': 'delete', 'id': 1}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post([]).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_mixed_operations(self):
+        self.authenticate(self.user2)
+        pending = self.received[0]
+        response = self.post([
+            {'op': 'accept', 'id': pending.id},
+            {'op': 'reject', 'id': self.received[2].id},
+            {'op': 'reject', 'id': self.sent[0].id},
+            {'op': 'accept', 'id': pending.id},
+            {'op': 'accept', 'id': 0},
+            {'op': 'create', 'ad_sender_id': self.ads[3].id, 'ad_receiver_id': self.ads[2].id, 'comment': 'Swap?'},
+            {'op': 'create', 'ad_sender_id': self.ad1.id, 'ad_receiver_id': self.ad2.id},
+            {'op': 'create', 'ad_sender_id': self.ad2.id, 'ad_receiver_id': self.ads[3].id},
+            {'op': 'reject', 'id': self.received[1].id},
+            {'op': 'accept', 'id': self.received[3].id},
+            {'op': 'create', 'ad_sender_id': self.ad2.id, 'ad_receiver_id': self.ad1.id},
+            {'op': 'accept', 'id': self.received[4].id},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([result['ok'] for result in results],
+                         [True, True, False, False, False, True, False, False, False, False, False, False])
+        self.assertEqual(results[0]['status'], 'accepted')
+        self.assertEqual(results[2]['error'], 'You do not have permission to perform this action.')
+        self.assertEqual(results[3]['error'], 'Duplicate operation for this proposal.')
+        self.assertEqual(results[6]['error'], 'You cannot send a proposal for this ad.')
+        self.assertEqual(results[7]['error'], 'You cannot send a proposal to yourself.')
+        self.assertEqual(results[8]['error'], 'This proposal is no longer pending.')
+        self.assertEqual(results[9]['error'], 'Conflicts with a proposal accepted earlier in this batch.')
+        self.assertEqual(results[10]['error'], 'Ad is traded by a proposal accepted in this batch.')
+        # Decisions are final: accepting an accepted proposal fails too.
+        self.assertEqual(results[11]['error'], 'This proposal is no longer pending.')
+
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'accepted')
+        self.assertEqual(ExchangeProposal.objects.get(pk=self.received[2].id).status, 'rejected')
+        created = ExchangeProposal.objects.get(pk=results[5]['id'])
+        self.assertEqual((created.ad_sender, created.ad_receiver, created.status),
+                         (self.ads[3], self.ads[2], 'pending'))
+        # Accepting traded both ads away: every other pending proposal for them was rejected.
+        self.assertEqual(list(ExchangeProposal.objects.filter(status='pending')), [created])
+
+        for user in (self.user1, self.user2):
+            stats = UserStats.objects.get(user=user)
+            recount = compute_user_stats([user.pk])[user.pk]
+            self.assertEqual({field: getattr(stats, field) for field in STAT_FIELDS},
+                             {field: recount[field] for field in STAT_FIELDS})
+
+    def test_batch_create_for_an_ad_traded_later_in_the_batch(self):
+        self.authenticate(self.user2)
+        response = self.post([
+            {'op': 'create', 'ad_sender_id': self.ad2.id, 'ad_receiver_id': self.ad1.id},
+            {'op': 'accept', 'id': self.received[0].id},
+        ])
+        results = response.data['results']
+        self.assertEqual([result['ok'] for result in results], [False, True])
+        self.assertEqual(results[0]['error'], 'Ad is traded by a proposal accepted in this batch.')
+        self.assertFalse(ExchangeProposal.objects.filter(status='pending').exists())
+
+    def test_batch_conflicts_with_concurrent_decision(self):
+        self.authenticate(self.user2)
+        accepted, rejected = self.received[0], self.received[2]
+
+        def decide_elsewhere(ad_ids):
+            # Another request rejects the proposal between the batch reading and writing it.
+            ExchangeProposal.objects.filter(pk=accepted.pk).update(status='rejected')
+
+        with mock.patch('ads.proposals._lock_ads', side_effect=decide_elsewhere):
+            response = self.post([
+                {'op': 'reject', 'id': rejected.id},
+                {'op': 'accept', 'id': accepted.id},
+                {'op': 'create', 'ad_sender_id': self.ad2.id, 'ad_receiver_id': self.ad1.id},
+            ])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(ExchangeProposal.objects.get(pk=rejected.pk).status, 'pending')
+        self.assertEqual(ExchangeProposal.objects.count(), 11)
+
+    def test_batch_query_count_is_constant(self):
+        self.authenticate(self.user2)
+        self.client.get(reverse('api_proposal_list'))  # Warm the user cache.
+        # Pending proposals between distinct pairs of ads: user1's ads[2k] to user2's ads[2k + 1].
+        trades = [
+            ExchangeProposal.objects.create(ad_sender=self.ads[i], ad_receiver=self.ads[i + 1]) for i in range(2, 10, 2)
+        ]
+
+        def count_queries(operations):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(operations)
+            self.assertTrue(all(result['ok'] for result in response.data['results']))
+            return len(queries.captured_queries)
+
+        small = count_queries([
+            {'op': 'accept', 'id': trades[0].id},
+            {'op': 'create', 'ad_sender_id': self.ad2.id, 'ad_receiver_id': self.ad1.id},
+        ])
+        large = count_queries(
+            [{'op': 'accept', 'id': proposal.id} for proposal in trades[1:]] +
+            [{'op': 'create', 'ad_sender_id': self.ad2.id, 'ad_receiver_id': self.ad1.id}] * 20
+        )
+        self.assertEqual(small, large)
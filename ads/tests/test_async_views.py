@@ -0,0 +1,84 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Ad, ExchangeProposal
+
+
+@override_settings(ROOT_URLCONF='ads.tests.async_urls')
+class AsyncAPIViewTests(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='password123')
+        self.user2 = User.objects.create_user(username='user2', password='password123')
+        self.ads = [
+            Ad.objects.create(user=user, title=f'{title} {i}', description='Desc', category=category,
+                              condition='used')
+            for i, (user, title, category) in enumerate([
+                (self.user1, 'Bicycle', 'other'), (self.user1, 'Guitar', 'other'), (self.user2, 'Novel', 'books'),
+            ] * 4)
+        ]
+        ExchangeProposal.objects.create(ad_sender=self.ads[0], ad_receiver=self.ads[2])
+        ExchangeProposal.objects.create(ad_sender=self.ads[5], ad_receiver=self.ads[1])
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def assertSameResponse(self, sync_url, async_url, params=None):
+        sync_response = self.client.get(sync_url, params)
+        async_response = self.client.get(async_url, params)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        # Pagination links point back at the async endpoint.
+        self.assertEqual(json.loads(async_response.content.decode().replace('/api/async/', '/api/')),
+                         sync_response.json())
+        return async_response
+
+    def test_ad_list(self):
+        sync_url, async_url = reverse('api_ad_list'), reverse('api_async_ad_list')
+        for params in [None, {'page': 2}, {'category': 'books'}, {'search': 'guitar'}, {'cursor': ''},
+                       {'category': 'cars'}, {'page': 9}, {'cursor': 'garbage'}]:
+            with self.subTest(params=params):
+                self.assertSameResponse(sync_url, async_url, params)
+
+        first = self.client.get(async_url, {'cursor': ''}).json()
+        self.assertSameResponse(sync_url, async_url, {'cursor': first['next'].split('cursor=')[1]})
+
+    def test_ad_detail(self):
+        self.assertSameResponse(reverse('api_ad_detail', kwargs={'pk': self.ads[3].pk}),
+                                reverse('api_async_ad_detail', kwargs={'pk': self.ads[3].pk}))
+        response = self.client.get(reverse('api_async_ad_detail', kwargs={'pk': 999999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_proposal_list(self):
+        sync_url, async_url = reverse('api_proposal_list'), reverse('api_async_proposal_list')
+        self.assertEqual(self.client.get(async_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.authenticate(self.user2)
+        response = self.assertSameResponse(sync_url, async_url)
+        self.assertEqual(response.json()['count'], 2)
+        self.assertSameResponse(sync_url, async_url, {'status': 'pending', 'ad_sender': self.ads[5].pk})
+
+    def test_query_count(self):
+        self.authenticate(self.user2)
+        self.client.get(reverse('api_async_proposal_list'))  # Warm the user cache.
+        with self.assertNumQueries(2):
+            self.client.get(reverse('api_async_proposal_list'))
+
+
+@override_settings(ROOT_URLCONF='ads.tests.async_urls')
+class AsyncClientTests(APITestCase):
+    async def test_served_on_the_event_loop(self):
+        user = await User.objects.acreate(username='user1')
+        await Ad.objects.acreate(user=user, title='Lamp', description='Desk lamp', category='home', condition='new')
+        response = await AsyncClient().get(reverse('api_async_ad_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([ad['title'] for ad in response.json()['results']], ['Lamp'])
+
+    def test_off_by_default(self):
+        path = reverse('api_async_ad_list')
+        with override_settings(ROOT_URLCONF='barter_platform.urls'):
+            self.assertEqual(self.client.get(path).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,114 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..authentication import get_cached_user
+from ..cache import get_cache
+from ..models import Ad, ExchangeProposal
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='password123')
+        self.user2 = User.objects.create_user(username='user2', password='password123')
+        self.ad1 = Ad.objects.create(user=self.user1, title='Bicycle', description='Red', category='other',
+                                     condition='used')
+        self.ad2 = Ad.objects.create(user=self.user2, title='Guitar', description='Old', category='other',
+                                     condition='used')
+        self.proposal = ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2)
+        self.authenticate(self.user1)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        user_queries = [query for query in queries.captured_queries if 'FROM "auth_user"' in query['sql']]
+        return response, len(user_queries)
+
+    def test_user_is_cached(self):
+        url = reverse('api_proposal_list')
+        self.assertEqual(self.get(url)[1], 1)
+        response, user_queries = self.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_queries, 0)
+
+    def test_cache_leaves_out_the_password_hash(self):
+        self.get(reverse('api_proposal_list'))
+        entry = get_cache().get(f'ads:user:{self.user1.pk}')
+        self.assertNotIn(self.user1.password, repr(entry))
+        user = get_cached_user(self.user1.pk)
+        self.assertEqual((user.pk, user.username, user.is_active), (self.user1.pk, 'user1', True))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.password, self.user1.password)  # Deferred, loaded on access.
+
+    def test_user_change_drops_cache(self):
+        url = reverse('api_proposal_list')
+        self.get(url)
+        self.user1.first_name = 'Renamed'
+        self.user1.save()
+        self.assertEqual(self.get(url)[1], 1)
+
+    def test_deactivated_user_is_refused(self):
+        url = reverse('api_proposal_list')
+        self.get(url)
+        self.user1.is_active = False
+        self.user1.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_STATELESS_SAFE_METHODS=True)
+    def test_stateless_reads(self):
+        response, user_queries = self.get(reverse('api_proposal_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_queries, 0)
+        self.assertEqual(response.data['count'], 1)
+
+        detail_url = reverse('api_proposal_detail', kwargs={'pk': self.proposal.pk})
+        self.assertEqual(self.get(detail_url)[0].status_code, status.HTTP_200_OK)
+        self.authenticate(User.objects.create_user(username='user3', password='password123'))
+        self.assertEqual(self.client.get(detail_url).status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(JWT_STATELESS_SAFE_METHODS=True)
+    def test_stateless_writes_load_user(self):
+        response = self.client.post(reverse('api_ad_list'), {
+            'title': 'Lamp', 'description': 'Desk lamp', 'category': 'home', 'condition': 'new',
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ad.objects.get(pk=response.data['id']).user, self.user1)
+
+    @override_settings(JWT_STATELESS_SAFE_METHODS=True)
+    def test_stateless_refuses_deactivated_user(self):
+        self.user1.is_active = False
+        self.user1.save()
+        self.assertEqual(self.client.get(reverse('api_proposal_list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user1.is_active = True
+        self.user1.save()
+        self.assertEqual(self.client.get(reverse('api_proposal_list')).status_code, status.HTTP_200_OK)
+
+    @override_settings(JWT_STATELESS_SAFE_METHODS=True)
+    def test_stateless_revocation_survives_the_cache(self):
+        url = reverse('api_proposal_list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user1.is_active = False
+            self.user1.save()
+        # A worker whose cache never saw the change, or evicted it, reads it from the database.
+        get_cache().clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.authenticate(self.user2)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.authenticate(self.user1)
+        self.user1.delete()
+        get_cache().clear()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
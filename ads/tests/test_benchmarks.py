@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from .. import benchmarks
+from ..management.commands.benchmark import benchmark_database
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_run_reports_latency_and_queries(self):
+        report = benchmarks.run([20, 40], ['api_ad_list', 'html_ad_detail'], iterations=3)
+        self.assertEqual(sorted(report['results']), [
+            'api_ad_list@20', 'api_ad_list@40', 'html_ad_detail@20', 'html_ad_detail@40',
+        ])
+        result = report['results']['api_ad_list@40']
+        self.assertEqual(result['iterations'], 3)
+        self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(result['queries'], 2)  # count + page; the JWT user is cached
+
+    def test_trade_cycle_cases(self):
+        report = benchmarks.run([20], ['api_trade_cycles', 'trade_cycles_synthetic'], iterations=2)
+        self.assertEqual(report['results']['trade_cycles_synthetic@20']['queries'], 0)
+
+    def test_recommendation_cases(self):
+        report = benchmarks.run([20], ['api_ad_suggestions', 'recommendations_synthetic'], iterations=2)
+        self.assertEqual(report['results']['recommendations_synthetic@20']['queries'], 0)
+
+    def test_unknown_benchmark(self):
+        with self.assertRaises(KeyError):
+            benchmarks.run([20], ['no_such_case'], iterations=1)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': {'a@10': {'p50_ms': 10.0, 'queries': 2}, 'b@10': {'p50_ms': 10.0, 'queries': 2}}}
+        report = {'results': {
+            'a@10': {'p50_ms': 11.0, 'queries': 2},
+            'b@10': {'p50_ms': 13.0, 'queries': 3},
+            'c@10': {'p50_ms': 99.0, 'queries': 9},
+        }}
+        self.assertEqual(benchmarks.compare(report, baseline, threshold=0.2), [
+            'b@10: p50 10.00ms -> 13.00ms',
+            'b@10: queries 2 -> 3',
+        ])
+
+
+class BenchmarkDatabaseTests(TestCase):
+    def test_restores_the_test_database_name(self):
+        test_name = connection.settings_dict['TEST'].get('NAME')
+        with mock.patch.object(connection, 'creation') as creation:
+            with benchmark_database('/tmp/bench'):
+                self.assertEqual(connection.settings_dict['TEST']['NAME'], '/tmp/bench/benchmark.sqlite3')
+            creation.destroy_test_db.assert_called_once()
+        self.assertEqual(connection.settings_dict['TEST'].get('NAME'), test_name)
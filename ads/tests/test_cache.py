@@ -0,0 +1,116 @@
+import os
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.checks import run_checks
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..cache import cache_stats
+from ..models import Ad, ExchangeProposal
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user1', password='testpass123')
+        self.other = User.objects.create_user(username='user2', password='testpass123')
+        self.ad = Ad.objects.create(
+            user=self.user, title='Bicycle', description='Red bicycle', category='other', condition='used'
+        )
+
+    def get(self, name, params=None, **kwargs):
+        return self.client.get(reverse(name, kwargs=kwargs), params)
+
+    def test_anonymous_list_is_cached(self):
+        self.assertEqual(self.get('ad_list', {'category': 'other'})['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.get('ad_list', {'category': 'other'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, 'Bicycle')
+
+    def test_key_ignores_parameter_order(self):
+        self.client.get(reverse('ad_list') + '?category=other&condition=used')
+        response = self.client.get(reverse('ad_list') + '?condition=used&category=other')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(self.get('ad_list', {'category': 'books'})['X-Cache'], 'MISS')
+
+    def test_ad_writes_invalidate(self):
+        self.get('ad_list')
+        self.get('api_ad_detail', pk=self.ad.pk)
+
+        self.ad.title = 'Tandem'
+        self.ad.save()
+        response = self.get('ad_list')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Tandem')
+        self.assertEqual(self.get('api_ad_detail', pk=self.ad.pk).json()['title'], 'Tandem')
+
+        Ad.objects.create(user=self.user, title='Kayak', description='Kayak', category='other', condition='new')
+        self.assertContains(self.get('ad_list'), 'Kayak')
+
+        self.ad.delete()
+        self.assertNotContains(self.get('ad_list'), 'Tandem')
+
+    def test_proposals_invalidate_detail_page(self):
+        self.get('ad_detail', pk=self.ad.pk)
+        other_ad = Ad.objects.create(
+            user=self.other, title='Kayak', description='Kayak', category='other', condition='new'
+        )
+        self.get('ad_list')
+        ExchangeProposal.objects.create(ad_sender=other_ad, ad_receiver=self.ad)
+
+        response = self.get('ad_detail', pk=self.ad.pk)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.context['owner_stats'].proposals_received, 1)
+        self.assertEqual(self.get('ad_list')['X-Cache'], 'HIT')
+
+    def test_api_key_uses_negotiated_format(self):
+        url = reverse('api_ad_detail', kwargs={'pk': self.ad.pk})
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT='application/json')['X-Cache'], 'MISS')
+        response = self.client.get(url, HTTP_ACCEPT='application/json, text/plain, */*')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        response = self.client.get(url, HTTP_ACCEPT='text/html,application/xhtml+xml,*/*;q=0.8')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+
+    def test_username_change_invalidates(self):
+        self.get('ad_detail', pk=self.ad.pk)
+        self.user.last_login = timezone.now()
+        self.user.save()
+        self.assertEqual(self.get('ad_detail', pk=self.ad.pk)['X-Cache'], 'HIT')
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertContains(self.get('ad_detail', pk=self.ad.pk), 'renamed')
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.login(username='user1', password='testpass123')
+        self.get('ad_list')
+        self.assertNotIn('X-Cache', self.get('ad_list'))
+
+    def test_stats(self):
+        before = cache_stats()['AdListView']
+        self.get('ad_list')
+        self.get('ad_list')
+        after = cache_stats()['AdListView']
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+        out = StringIO()
+        call_command('response_cache_stats', stdout=out)
+        self.assertIn('AdListView', out.getvalue())
+
+
+class SharedCacheCheckTests(TestCase):
+    def errors(self, **kwargs):
+        return [error.id for error in run_checks(tags=['caches'], **kwargs)]
+
+    def test_local_memory_cache_with_several_workers(self):
+        self.assertEqual(self.errors(), [])
+        self.assertEqual(self.errors(include_deployment_checks=True), ['ads.E001'])
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual(self.errors(), ['ads.E001'])
+            with override_settings(RESPONSE_CACHE_ENABLED=False):
+                self.assertEqual(self.errors(), [])
@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.http import parse_http_date
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..cache import bump_version
+from ..models import Ad, ExchangeProposal
+from ..proposals import accept_proposal
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(username='user1', password='password123')
+        self.user2 = User.objects.create_user(username='user2', password='password123')
+        self.ad1 = Ad.objects.create(user=self.user1, title='Bicycle', description='Red bike', category='other',
+                                     condition='used')
+        self.ad2 = Ad.objects.create(user=self.user2, title='Novel', description='Paperback', category='books',
+                                     condition='new')
+        self.proposal = ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        self.client.get(reverse('api_proposal_list'))  # Warm the user cache.
+
+    def assertRevalidates(self, url, params=None, queries=1, last_modified=True):
+        """A repeated GET with the ETag is a bodyless 304 costing at most ``queries``; returns the ETag."""
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual('Last-Modified' in response, last_modified)
+        with self.assertNumQueries(queries):
+            not_modified = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], etag)
+        self.assertEqual(not_modified.content, b'')
+        return etag
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_ad_detail(self):
+        url = reverse('api_ad_detail', kwargs={'pk': self.ad1.pk})
+        etag = self.assertRevalidates(url)
+        self.ad1.title = 'Blue bicycle'
+        self.ad1.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['title'], 'Blue bicycle')
+
+    def test_ad_detail_if_modified_since(self):
+        url = reverse('api_ad_detail', kwargs={'pk': self.ad1.pk})
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(parse_http_date(last_modified), int(self.ad1.updated_at.timestamp()))
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Ad.objects.filter(pk=self.ad1.pk).update(updated_at=self.ad1.updated_at + timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version('ads')
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_ad_list(self):
+        url = reverse('api_ad_list')
+        etag = self.assertRevalidates(url, {'category': 'books'}, last_modified=False)
+        self.assertNotEqual(self.assertRevalidates(url, {'category': 'other'}, last_modified=False), etag)
+        self.assertRevalidates(url, {'cursor': ''}, last_modified=False)
+
+        Ad.objects.create(user=self.user1, title='Atlas', description='Maps', category='books', condition='new')
+        response = self.client.get(url, {'category': 'books'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_ad_list_cache_hit(self):
+        url = reverse('api_ad_list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_proposals(self):
+        self.authenticate(self.user2)
+        list_url = reverse('api_proposal_list')
+        detail_url = reverse('api_proposal_detail', kwargs={'pk': self.proposal.pk})
+        list_etag = self.assertRevalidates(list_url, last_modified=False)
+        detail_etag = self.assertRevalidates(detail_url)
+
+        # Editing a nested ad changes both representations.
+        self.ad1.title = 'Blue bicycle'
+        self.ad1.save()
+        for url, etag in [(list_url, list_etag), (detail_url, detail_etag)]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+        # So does a bulk status change.
+        detail_etag = self.client.get(detail_url)['ETag']
+        accept_proposal(self.proposal)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.json()['status'], 'accepted')
+
+    def test_owner_rename(self):
+        self.authenticate(self.user2)
+        urls = [
+            reverse('api_ad_list'),
+            reverse('api_ad_detail', kwargs={'pk': self.ad1.pk}),
+            reverse('api_proposal_list'),
+            reverse('api_proposal_detail', kwargs={'pk': self.proposal.pk}),
+        ]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.user1.username = 'cyclist'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user1.save()
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertIn('cyclist', response.content.decode())
+
+    def test_proposal_list_per_user(self):
+        self.authenticate(self.user2)
+        etag = self.client.get(reverse('api_proposal_list'))['ETag']
+        self.authenticate(self.user1)
+        response = self.client.get(reverse('api_proposal_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
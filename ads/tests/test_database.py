@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from ..benchmarks import concurrency
+
+
+class ConnectionSettingsTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class ConcurrencyBenchmarkTests(SimpleTestCase):
+    def test_configured_profile_has_no_lock_errors(self):
+        result = concurrency.run_profile(concurrency.profiles()['configured'], workers=2, duration=0.3, rows=100)
+        self.assertGreater(result['reads_per_s'], 0)
+        self.assertGreater(result['writes_per_s'], 0)
+        self.assertEqual(result['errors'], 0)
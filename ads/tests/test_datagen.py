@@ -0,0 +1,44 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from ..datagen import DataGenerator
+from ..models import Ad, ExchangeProposal, UserStats
+from ..stats import STAT_FIELDS, compute_user_stats
+
+
+class DataGeneratorTests(TestCase):
+    def generate(self, seed=7, prefix='gen'):
+        DataGenerator(seed=seed, batch_size=40, username_prefix=prefix).generate(users=30, ads=200, proposals=300)
+
+    def test_counts_and_consistency(self):
+        out = StringIO()
+        call_command('generate_data', users=30, ads=200, proposals=300, batch_size=40, stdout=out)
+        self.assertIn('rows/s', out.getvalue())
+
+        self.assertEqual(Ad.objects.count(), 200)
+        self.assertEqual(ExchangeProposal.objects.count(), 300)
+        self.assertFalse(ExchangeProposal.objects.filter(ad_sender__user=F('ad_receiver__user')).exists())
+
+        user_ids = list(UserStats.objects.values_list('user_id', flat=True))
+        self.assertEqual(len(user_ids), 30)
+        recount = compute_user_stats(user_ids)
+        for stats in UserStats.objects.all():
+            for field in STAT_FIELDS:
+                self.assertEqual(getattr(stats, field), recount[stats.user_id][field])
+
+    def test_same_seed_same_dataset(self):
+        self.generate()
+        first = list(Ad.objects.order_by('pk').values_list('title', 'category', 'condition'))
+        Ad.objects.all().delete()
+        self.generate(prefix='again')
+        second = list(Ad.objects.order_by('pk').values_list('title', 'category', 'condition'))
+        self.assertEqual(first, second)
+
+    def test_listings_are_skewed(self):
+        self.generate()
+        counts = sorted(UserStats.objects.values_list('listings_count', flat=True), reverse=True)
+        # The busiest tenth of users owns far more than a tenth of the ads.
+        self.assertGreater(sum(counts[:3]), 200 * 0.3)
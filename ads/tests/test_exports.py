@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..exports import AD_EXPORT_COLUMNS
+from ..models import Ad, ExchangeProposal
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='password123')
+        self.user2 = User.objects.create_user(username='user2', password='password123')
+        self.user3 = User.objects.create_user(username='user3', password='password123')
+        self.ads = [
+            Ad.objects.create(user=user, title=title, description=f'{title}, barely used', category=category,
+                              condition='used')
+            for user, title, category in [
+                (self.user1, 'Bicycle', 'other'), (self.user1, 'Novel', 'books'), (self.user2, 'Atlas', 'books'),
+                (self.user2, 'Guitar', 'other'), (self.user3, 'Cookbook', 'books'),
+            ]
+        ]
+        ExchangeProposal.objects.create(ad_sender=self.ads[0], ad_receiver=self.ads[2])
+        ExchangeProposal.objects.create(ad_sender=self.ads[3], ad_receiver=self.ads[1], status='rejected')
+        ExchangeProposal.objects.create(ad_sender=self.ads[4], ad_receiver=self.ads[3])
+
+    def export(self, url, params=None, **headers):
+        response = self.client.get(url, params, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ads_ndjson(self):
+        response, content = self.export(reverse('api_ad_export'), {'category': 'books'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="ads.ndjson"')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Novel', 'Atlas', 'Cookbook'])
+        self.assertEqual(list(rows[0]), list(AD_EXPORT_COLUMNS))
+        self.assertEqual(rows[1]['username'], 'user2')
+        self.assertTrue(rows[0]['created_at'].endswith('Z'))
+
+        _, content = self.export(reverse('api_ad_export'), {'search': 'guitar'})
+        self.assertEqual([json.loads(line)['title'] for line in content.splitlines()], ['Guitar'])
+
+    def test_ads_csv(self):
+        for params, headers in [({'format': 'csv'}, {}), ({'user': self.user2.pk}, {'HTTP_ACCEPT': 'text/csv'})]:
+            with self.subTest(params=params):
+                response, content = self.export(reverse('api_ad_export'), params, **headers)
+                self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+                rows = list(csv.DictReader(io.StringIO(content)))
+                expected = [ad for ad in self.ads if 'user' not in params or ad.user == self.user2]
+                self.assertEqual([row['title'] for row in rows], [ad.title for ad in expected])
+        self.assertEqual(rows[0]['description'], 'Atlas, barely used')
+        self.assertEqual(rows[0]['image_url'], '')
+
+    def test_csv_neutralizes_formulas(self):
+        Ad.objects.filter(pk=self.ads[0].pk).update(title='=HYPERLINK("http://evil.example")',
+                                                    description='-2+3', image_url='@SUM(A1)')
+        _, content = self.export(reverse('api_ad_export'), {'format': 'csv'})
+        row = next(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(row['title'], '\'=HYPERLINK("http://evil.example")')
+        self.assertEqual(row['description'], "'-2+3")
+        self.assertEqual(row['image_url'], "'@SUM(A1)")
+        self.assertEqual(row['id'], str(self.ads[0].pk))
+
+        # NDJSON is data, not a spreadsheet: kept verbatim.
+        _, content = self.export(reverse('api_ad_export'), {'category': 'other'})
+        self.assertEqual(json.loads(content.splitlines()[0])['title'], '=HYPERLINK("http://evil.example")')
+
+    @override_settings(EXPORT_BATCH_SIZE=2)
+    def test_reads_in_batches(self):
+        response = self.client.get(reverse('api_ad_export'))
+        with self.assertNumQueries(3):
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).count(b'\n'), 5)
+
+    def test_proposals(self):
+        url = reverse('api_proposal_export')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user2).access_token}')
+        _, content = self.export(url)
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 3)
+        _, content = self.export(url, {'status': 'rejected', 'format': 'csv'})
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([(row['ad_sender_id'], row['status']) for row in rows], [(str(self.ads[3].pk), 'rejected')])
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse('api_ad_export'), {'category': 'cars'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('category', json.loads(response.content))
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'ads.csv'
+            call_command('export', 'ads', '--format', 'csv', '--category', 'other', '--output', str(path),
+                         stderr=io.StringIO())
+            rows = list(csv.DictReader(path.open()))
+        self.assertEqual([row['title'] for row in rows], ['Bicycle', 'Guitar'])
+        with self.assertRaises(CommandError):
+            call_command('export', 'proposals')
+
+
+class AsyncExportTests(APITestCase):
+    async def test_streams_asynchronously(self):
+        user = await User.objects.acreate(username='user1')
+        await Ad.objects.acreate(user=user, title='Lamp', description='Desk lamp', category='home', condition='new')
+        response = await AsyncClient().get(reverse('api_ad_export'))
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(content)['title'], 'Lamp')
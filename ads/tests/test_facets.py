@@ -0,0 +1,96 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..facets import ad_facets
+from ..imports import import_ads
+from ..models import Ad
+
+
+def counts(facets, name):
+    return {option['value']: option['count'] for option in facets[name] if option['count']}
+
+
+class FacetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(username='user1', password='password123')
+        self.user2 = User.objects.create_user(username='user2', password='password123')
+        for user, title, category, condition in [
+            (self.user1, 'Red bicycle', 'other', 'used'),
+            (self.user1, 'Paperback novel', 'books', 'new'),
+            (self.user1, 'Old atlas', 'books', 'used'),
+            (self.user2, 'Blue bicycle', 'other', 'broken'),
+            (self.user2, 'Laptop', 'electronics', 'used'),
+        ]:
+            Ad.objects.create(user=user, title=title, description=title, category=category, condition=condition)
+
+    def test_counts(self):
+        facets = ad_facets()
+        self.assertEqual([option['value'] for option in facets['category']],
+                         [value for value, _ in Ad.CATEGORY_CHOICES])
+        self.assertEqual(facets['condition'][2], {'value': 'broken', 'label': 'Needs Repair', 'count': 1})
+        self.assertEqual(counts(facets, 'category'), {'other': 2, 'books': 2, 'electronics': 1})
+        self.assertEqual(counts(facets, 'condition'), {'used': 3, 'new': 1, 'broken': 1})
+
+    def test_search_filters_and_selection(self):
+        facets = ad_facets('bicycle')
+        self.assertEqual(counts(facets, 'category'), {'other': 2})
+        self.assertEqual(counts(facets, 'condition'), {'used': 1, 'broken': 1})
+
+        facets = ad_facets(filters={'user': self.user1.pk})
+        self.assertEqual(counts(facets, 'category'), {'other': 1, 'books': 2})
+
+        # Each facet is restricted by the other's selection, not its own.
+        facets = ad_facets(selected={'category': 'books', 'condition': 'used'})
+        self.assertEqual(counts(facets, 'category'), {'other': 1, 'books': 1, 'electronics': 1})
+        self.assertEqual(counts(facets, 'condition'), {'used': 1, 'new': 1})
+
+    def test_one_grouped_query_then_cached(self):
+        with self.assertNumQueries(1):
+            ad_facets('bicycle', selected={'category': 'other'})
+        # The selection is applied to the cached rows, so it shares the entry.
+        with self.assertNumQueries(0):
+            ad_facets('  bicycle ', selected={'condition': 'used'})
+        with self.assertNumQueries(1):
+            ad_facets('novel')
+
+    def test_writes_invalidate(self):
+        self.assertEqual(counts(ad_facets(), 'category')['books'], 2)
+        Ad.objects.create(user=self.user2, title='Cookbook', description='Recipes', category='books',
+                          condition='new')
+        self.assertEqual(counts(ad_facets(), 'category')['books'], 3)
+        # Bulk imports send no signals and bump the version themselves.
+        import_ads(self.user2.pk, [{'title': 'Atlas', 'description': 'Maps', 'category': 'books',
+                                    'condition': 'new'}])
+        self.assertEqual(counts(ad_facets(), 'category')['books'], 4)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_api(self):
+        response = self.client.get(reverse('api_ad_list'), {'category': 'books', 'search': 'atlas novel'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get(reverse('api_ad_list'), {'category': 'books', 'user': self.user1.pk})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(counts(response.data['facets'], 'category'), {'other': 1, 'books': 2})
+        self.assertEqual(counts(response.data['facets'], 'condition'), {'used': 1, 'new': 1})
+
+        # An ad outside the filtered list still changes the facets, and so the ETag.
+        etag = response['ETag']
+        Ad.objects.create(user=self.user1, title='Lamp', description='Lamp', category='home', condition='new')
+        response = self.client.get(reverse('api_ad_list'), {'category': 'books', 'user': self.user1.pk},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(counts(response.data['facets'], 'category'), {'other': 1, 'books': 2, 'home': 1})
+
+        response = self.client.get(reverse('api_ad_list'), {'cursor': ''})
+        self.assertNotIn('facets', response.data)
+
+    def test_template(self):
+        response = self.client.get(reverse('ad_list'), {'condition': 'used'})
+        self.assertEqual(counts(response.context['facets'], 'category'), {'other': 1, 'books': 1, 'electronics': 1})
+        self.assertContains(response, 'Books (1)')
+        self.assertContains(response, 'Used (3)')
@@ -0,0 +1,130 @@
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..cache import get_versions
+from ..imports import MAX_ROW_BYTES, MalformedRow, import_ads, iter_json_array, iter_ndjson
+from ..models import Ad, UserStats
+
+
+def ad_row(title, **fields):
+    return {'title': title, 'description': f'{title}, barely used', 'category': 'books', 'condition': 'used',
+            **fields}
+
+
+class ImportParserTests(APITestCase):
+    def test_ndjson(self):
+        body = b'\n'.join([
+            json.dumps(ad_row('Atlas')).encode(), b'', b'{"title": ', json.dumps([1]).encode(),
+            b'x' * (MAX_ROW_BYTES + 10), json.dumps(ad_row('Novel')).encode(),
+        ])
+        rows = list(iter_ndjson(io.BytesIO(body)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['title'], 'Atlas')
+        self.assertIsInstance(rows[1], MalformedRow)
+        self.assertEqual(rows[2], [1])
+        self.assertIn('longer than', rows[3].message)
+        self.assertEqual(rows[4]['title'], 'Novel')
+
+    def test_json_array_across_chunks(self):
+        rows = [ad_row('Livre été'), 12345, 'text', None, [1, {'a': 2}]]
+        body = json.dumps(rows, ensure_ascii=False, indent=2).encode()
+        # Chunks this small split values, numbers and multi-byte characters.
+        for chunk_size in (1, 3, 7, len(body)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(iter_json_array(io.BytesIO(body), chunk_size)), rows)
+        self.assertEqual(list(iter_json_array(io.BytesIO(b' [ ] '), 2)), [])
+
+    def test_json_array_errors(self):
+        rows = list(iter_json_array(io.BytesIO(b'[{"title": "Atlas"}, {"title": }]'), 4))
+        self.assertEqual(rows[0], {'title': 'Atlas'})
+        self.assertIsInstance(rows[1], MalformedRow)
+        self.assertEqual(len(rows), 2)
+
+        rows = list(iter_json_array(io.BytesIO(b'[1 2]'), 4))
+        self.assertEqual(rows[0], 1)
+        self.assertIsInstance(rows[1], MalformedRow)
+
+        with self.assertRaises(ParseError):
+            list(iter_json_array(io.BytesIO(b'{"title": "Atlas"}')))
+
+
+class AdImportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user1', password='password123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.url = reverse('api_ad_import')
+
+    def test_ndjson_import(self):
+        rows = [
+            ad_row('Atlas'),
+            ad_row('Guitar', category='music'),
+            ad_row('', condition='mint'),
+            ad_row('Lamp', image_url='https://example.com/lamp.jpg', user=999, created_at='2000-01-01'),
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\nnot json\n'
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 3)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 5])
+        self.assertEqual(list(response.data['errors'][0]['errors']), ['category'])
+        self.assertEqual(sorted(response.data['errors'][1]['errors']), ['condition', 'title'])
+        self.assertIn('non_field_errors', response.data['errors'][2]['errors'])
+
+        # Read-only fields are ignored, as on the ad API.
+        lamp = Ad.objects.get(title='Lamp')
+        self.assertEqual(lamp.user, self.user)
+        self.assertGreater(lamp.created_at.year, 2000)
+        self.assertEqual(set(Ad.objects.values_list('title', flat=True)), {'Atlas', 'Lamp'})
+
+    def test_json_array_import(self):
+        rows = [ad_row(f'Book {number}') for number in range(5)] + [{'title': 'No category'}, 'text']
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['failed']), (5, 2))
+        self.assertEqual(response.data['errors'][1],
+                         {'row': 7, 'errors': {'non_field_errors': ['Expected an object.']}})
+
+    def test_batches_and_bookkeeping(self):
+        versions = get_versions(['ads'])
+        rows = [ad_row(f'Book {number}') for number in range(7)]
+        rows[4]['condition'] = 'mint'
+        # Per batch of 3: SAVEPOINT, INSERT, the stats UPDATE and RELEASE.
+        with self.assertNumQueries(12):
+            report = import_ads(self.user.pk, rows, batch_size=3)
+        self.assertEqual(report, {'created': 6, 'failed': 1, 'errors': [report['errors'][0]]})
+        self.assertEqual(report['errors'][0]['row'], 5)
+        self.assertEqual(UserStats.objects.get(user=self.user).listings_count, 6)
+        self.assertNotEqual(get_versions(['ads']), versions)
+
+        self.client.credentials()
+        # The search index is kept by triggers, which bulk inserts fire too.
+        response = self.client.get(reverse('api_ad_list'), {'search': 'book'})
+        self.assertEqual(response.data['count'], 6)
+
+    @override_settings(IMPORT_MAX_ERRORS=2)
+    def test_error_report_is_capped(self):
+        report = import_ads(self.user.pk, [{}] * 5)
+        self.assertEqual(report['failed'], 5)
+        self.assertEqual([error['row'] for error in report['errors']], [1, 2])
+
+    def test_rejected_requests(self):
+        response = self.client.post(self.url, '', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, 'title=Atlas', content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        response = self.client.post(self.url, {'title': 'Atlas'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.credentials()
+        response = self.client.post(self.url, [ad_row('Atlas')], format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(Ad.objects.exists())
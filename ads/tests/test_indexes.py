@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import incr_version, log_changes
+from ..indexes import RELOAD, SharedIndex
+
+
+class Items(SharedIndex):
+    namespace = 'test-items'
+    source = ()
+
+    def clear_data(self):
+        self.items = set()
+
+    def populate(self):
+        self.items.update(self.source)
+
+    def apply_changes(self, changes):
+        for name, item in changes:
+            if name == 'add':
+                self.items.add(item)
+            else:
+                self.items.discard(item)
+
+
+class SharedIndexTests(SimpleTestCase):
+    def setUp(self):
+        Items.source = (1, 2)
+        # Loads run inline on the in-memory test database.
+        self.index = Items()
+
+    def test_loads_in_the_background(self):
+        with mock.patch.object(connection, 'is_in_memory_db', return_value=False):
+            self.assertFalse(self.index.sync())
+            self.index.worker.join()
+            self.assertTrue(self.index.sync())
+        self.assertEqual(self.index.items, {1, 2})
+
+    def test_replays_other_processes_changes(self):
+        self.assertTrue(self.index.sync())
+        Items.source = ()
+        with mock.patch.object(self.index, 'load') as load:
+            log_changes(Items.namespace, [('add', 3)])
+            log_changes(Items.namespace, [('remove', 1)])
+            self.index.sync()
+            load.assert_not_called()
+        self.assertEqual(self.index.items, {2, 3})
+
+    def test_own_changes_apply_at_once(self):
+        self.index.sync()
+        self.index.commit([('add', 3)])
+        self.assertEqual(self.index.items, {1, 2, 3})
+        self.assertEqual(self.index.version, incr_version(Items.namespace) - 1)
+
+    def test_reloads_on_request(self):
+        self.index.sync()
+        Items.source = (4,)
+        log_changes(Items.namespace, [('add', 3)])
+        log_changes(Items.namespace, RELOAD)
+        self.index.sync()
+        self.assertEqual(self.index.items, {4})
+
+    @override_settings(INDEX_LOG_MAX_GAP=2)
+    def test_reloads_when_far_behind(self):
+        self.index.sync()
+        Items.source = (4,)
+        for item in range(3):
+            log_changes(Items.namespace, [('add', item)])
+        self.index.sync()
+        self.assertEqual(self.index.items, {4})
+
+    def test_waits_for_a_missing_change(self):
+        self.index.sync()
+        Items.source = (4,)
+        incr_version(Items.namespace)  # Its writer has not stored the entry yet.
+        log_changes(Items.namespace, [('add', 3)])
+        self.index.sync()
+        self.assertEqual(self.index.items, {1, 2})
+        with override_settings(INDEX_LOG_WAIT=0):
+            self.index.sync()
+        self.assertEqual(self.index.items, {4})
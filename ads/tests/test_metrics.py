@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics
+from ..models import Ad
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.clear()
+        user = User.objects.create_user(username='user1', password='testpass123')
+        self.ad = Ad.objects.create(user=user, title='Bicycle', description='Red', category='other',
+                                    condition='used')
+
+    def scrape(self, **extra):
+        response = self.client.get('/metrics', **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    @override_settings(DEBUG=False, RESPONSE_CACHE_ENABLED=False)
+    def test_records_latency_and_sql_per_view(self):
+        self.client.get(reverse('ad_list'))
+        self.client.get(reverse('ad_list'))
+        self.client.get(reverse('ad_detail', kwargs={'pk': self.ad.pk}))
+        self.client.get('/no-such-page/')
+
+        text = self.scrape()
+        self.assertIn('http_requests_total{view="ad_list",method="GET",status="200"} 2', text)
+        self.assertIn('http_requests_total{view="unresolved",method="GET",status="404"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="ad_list",le="+Inf"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{view="ad_detail"} 1', text)
+        # Counted by the execute wrapper even though DEBUG is off; the second list reuses the cached facets.
+        self.assertIn('db_queries_total{view="ad_list"} 5', text)
+        self.assertIn('db_query_duration_seconds_total{view="ad_detail"}', text)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False, ROOT_URLCONF='ads.tests.async_urls')
+    async def test_counts_sql_under_asgi(self):
+        # The ASGI handler runs sync views and the async ORM in worker threads.
+        client = AsyncClient()
+        await client.get(reverse('api_async_ad_list'))
+        await client.get(reverse('api_ad_list'))
+        await client.get(reverse('ad_list'))
+        self.assertEqual(metrics.registry.sql_queries['api_async_ad_list'], 3)  # Count, page and facets.
+        self.assertEqual(metrics.registry.sql_queries['api_ad_list'], 2)  # The facets are cached by now.
+        self.assertGreater(metrics.registry.sql_queries['ad_list'], 0)
+
+    def test_response_cache_counters(self):
+        self.client.get(reverse('ad_list'))
+        self.client.get(reverse('ad_list'))
+        text = self.scrape()
+        self.assertRegex(text, r'response_cache_requests_total\{view="AdListView",result="hits"\} [1-9]')
+
+    def test_sums_worker_files(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other = metrics.Registry()
+            other.observe('ad_list', 'GET', 200, 0.02, 3, 0.001)
+            other.observe('ad_list', 'GET', 200, 0.2, 3, 0.001)
+            with open(os.path.join(directory, '99999999.json'), 'w') as f:
+                json.dump(other.snapshot(), f)
+
+            self.client.get(reverse('ad_list'))
+            text = self.scrape()
+        self.assertIn('http_requests_total{view="ad_list",method="GET",status="200"} 3', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="ad_list",le="0.25"} 3', text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.scrape(HTTP_AUTHORIZATION='Bearer secret')
@@ -0,0 +1,79 @@
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Ad, ExchangeProposal
+
+# Query counts are fixed per endpoint and must not grow with the page size.
+AD_LIST_QUERIES = 3  # count and max(updated_at) + facets (until cached) + page
+AD_LIST_CURSOR_QUERIES = 1  # page only
+AD_DETAIL_QUERIES = 1
+# JWT users come from the cache once warm.
+PROPOSAL_LIST_QUERIES = 2  # count and max(updated_at) + page
+PROPOSAL_DETAIL_QUERIES = 1  # proposal
+HTML_PROPOSAL_LIST_QUERIES = 4  # session + user + counts + page
+
+
+class QueryBudgetTests(APITestCase):
+    sizes = [1, 4, 9, 20]
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='sender', password='password123')
+        self.receiver = User.objects.create_user(username='receiver', password='password123')
+
+    def seed(self, size):
+        ExchangeProposal.objects.all().delete()
+        Ad.objects.all().delete()
+        for i in range(size):
+            ad_sender = Ad.objects.create(
+                user=self.sender, title=f'Offer {i}', description='Offer', category='books', condition='new'
+            )
+            ad_receiver = Ad.objects.create(
+                user=self.receiver, title=f'Wish {i}', description='Wish', category='home', condition='used'
+            )
+            ExchangeProposal.objects.create(ad_sender=ad_sender, ad_receiver=ad_receiver, comment=f'Deal {i}')
+
+    def authenticate(self, user):
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.client.get(reverse('api_proposal_list'))  # Warm the user cache.
+
+    def assertBudget(self, budget, url, params=None):
+        for size in self.sizes:
+            self.seed(size)
+            with self.subTest(size=size), self.assertNumQueries(budget):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_ad_list(self):
+        self.assertBudget(AD_LIST_QUERIES, reverse('api_ad_list'))
+
+    def test_ad_list_cursor(self):
+        self.assertBudget(AD_LIST_CURSOR_QUERIES, reverse('api_ad_list'), {'cursor': ''})
+
+    def test_ad_detail(self):
+        for size in self.sizes:
+            self.seed(size)
+            url = reverse('api_ad_detail', kwargs={'pk': Ad.objects.first().pk})
+            with self.subTest(size=size), self.assertNumQueries(AD_DETAIL_QUERIES):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_proposal_list(self):
+        self.authenticate(self.receiver)
+        self.assertBudget(PROPOSAL_LIST_QUERIES, reverse('api_proposal_list'))
+
+    def test_proposal_detail(self):
+        self.authenticate(self.receiver)
+        for size in self.sizes:
+            self.seed(size)
+            url = reverse('api_proposal_detail', kwargs={'pk': ExchangeProposal.objects.first().pk})
+            with self.subTest(size=size), self.assertNumQueries(PROPOSAL_DETAIL_QUERIES):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_html_proposal_list(self):
+        self.client.force_login(self.receiver)
+        self.assertBudget(HTML_PROPOSAL_LIST_QUERIES, reverse('manage_proposals'))
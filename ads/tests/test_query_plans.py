@@ -0,0 +1,91 @@
+from itertools import combinations
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from rest_framework.request import Request
+
+from ..api_views import AdListCreateAPIView
+from ..models import Ad
+from ..pagination import encode_cursor, keyset_filter
+from ..views import AdListView
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class AdListQueryPlanTests(TestCase):
+    """Every list/filter combination must be served from an index, without a sort step."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create(username=f'planner{i}') for i in range(10)]
+        cls.user = users[0]
+        for i in range(100):
+            Ad.objects.create(
+                user=users[i % len(users)],
+                title=f'Ad {i}',
+                description=f'Description {i}',
+                category=Ad.CATEGORY_CHOICES[i % len(Ad.CATEGORY_CHOICES)][0],
+                condition=Ad.CONDITION_CHOICES[i % len(Ad.CONDITION_CHOICES)][0],
+            )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def filter_combinations(self, *names):
+        values = {'category': 'electronics', 'condition': 'used', 'user': str(self.user.pk)}
+        params = {name: values[name] for name in names}
+        for size in range(len(params) + 1):
+            for keys in combinations(params, size):
+                yield {key: params[key] for key in keys}
+
+    def html_queryset(self, params):
+        view = AdListView()
+        view.setup(self.factory.get('/', params))
+        return view.get_queryset()
+
+    def api_queryset(self, params):
+        view = AdListCreateAPIView()
+        view.setup(self.factory.get('/api/ads/', params))
+        view.request = Request(view.request)
+        view.format_kwarg = None
+        return view.filter_queryset(view.get_queryset())
+
+    def query_plan(self, queryset):
+        sql, params = queryset[:9].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlan(self, queryset, params):
+        plan = self.query_plan(queryset)
+        for step in plan:
+            self.assertNotIn('TEMP B-TREE', step, f'{params} sorts in a temp B-tree: {plan}')
+            if step.startswith('SCAN'):
+                self.assertIn('USING', step, f'{params} falls back to a table scan: {plan}')
+
+    def test_html_list_uses_indexes(self):
+        for params in self.filter_combinations('category', 'condition'):
+            with self.subTest(params=params):
+                self.assertIndexedPlan(self.html_queryset(params), params)
+
+    def test_api_list_uses_indexes(self):
+        for params in self.filter_combinations('category', 'condition', 'user'):
+            with self.subTest(params=params):
+                self.assertIndexedPlan(self.api_queryset(params), params)
+
+    def test_cursor_pages_use_indexes(self):
+        cursor = encode_cursor(Ad.objects.all()[5])
+        for params in self.filter_combinations('category', 'condition', 'user'):
+            with self.subTest(params=params):
+                self.assertIndexedPlan(keyset_filter(self.api_queryset(params), cursor), params)
+
+    def test_search_joins_the_index_once(self):
+        for params in self.filter_combinations('category', 'user'):
+            params = {**params, 'search': 'description'}
+            with self.subTest(params=params):
+                plan = self.query_plan(self.api_queryset(params))
+                self.assertEqual(sum('ads_ad_fts VIRTUAL TABLE' in step for step in plan), 1, plan)
+                self.assertFalse([step for step in plan if 'SUBQUERY' in step], plan)
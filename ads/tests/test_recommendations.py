@@ -0,0 +1,190 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..cache import log_changes
+from ..imports import import_ads
+from ..models import Ad
+from ..recommendations import (
+    VERSION_NAMESPACE, RecommendationIndex, invalidate as invalidate_recommendations, recommendations)
+
+ADS = [
+    # pk, user, category, title, description
+    (1, 10, 'books', 'Fantasy novel', 'Paperback fantasy novel, like new'),
+    (2, 11, 'books', 'Science fiction novel', 'Hardcover novel'),
+    (3, 11, 'electronics', 'Laptop', 'Fast laptop with charger'),
+    (4, 12, 'other', 'Mountain bicycle', 'Red bicycle'),
+    (5, 12, 'books', 'Fantasy atlas', 'Maps of fantasy worlds'),
+    (6, 13, 'other', 'Fantasy board game', 'Complete board game'),
+]
+
+
+class RecommendationIndexTests(TestCase):
+    def setUp(self):
+        self.index = RecommendationIndex()
+        for row in ADS:
+            self.index.add(*row)
+
+    def ad(self, pk):
+        _, _, category, title, description = ADS[pk - 1]
+        return Ad(pk=pk, category=category, title=title, description=description)
+
+    def ids(self, ranked):
+        return [ad_id for ad_id, _ in ranked]
+
+    def test_ranking(self):
+        own, others = self.index.suggest(self.ad(1), limit=10)
+        self.assertEqual(own, [])
+        # "novel" is rarer than "fantasy"; the same category puts the atlas before the game.
+        self.assertEqual(self.ids(others), [2, 5, 6])
+        self.assertTrue(all(0 < score <= 1.25 for _, score in others))
+        self.assertEqual(self.ids(self.index.suggest(self.ad(1), limit=2)[1]), [2, 5])
+
+    def test_own_ads_ranked_separately(self):
+        own, others = self.index.suggest(self.ad(1), user_id=12)
+        self.assertEqual(self.ids(own), [5])
+        self.assertEqual(self.ids(others), [2, 6])
+
+    def test_updates(self):
+        self.index.add(2, 11, 'books', 'Road atlas', 'Maps of Europe')
+        self.index.remove(6)
+        self.assertEqual(self.ids(self.index.suggest(self.ad(1))[1]), [5])
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(len(self.index.ad_ids), 7)
+
+        before = self.index.suggest(self.ad(2))
+        self.index.compact()
+        self.assertEqual(len(self.index.ad_ids), 5)
+        self.assertEqual(self.ids(self.index.suggest(self.ad(2))[1]), self.ids(before[1]))
+
+    def test_unknown_words(self):
+        ad = Ad(pk=99, category='home', title='Teapot', description='Porcelain')
+        self.assertEqual(self.index.suggest(ad), ([], []))
+
+
+class RecommendationTests(APITestCase):
+    def setUp(self):
+        recommendations.clear()
+        self.users = [User.objects.create_user(username=f'user{i}', password='password123') for i in range(3)]
+        self.ads = {}
+        for pk, user, category, title, description in ADS:
+            self.ads[pk] = self.create(self.users[user % 3], category, title, description)
+
+    def create(self, user, category, title, description):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Ad.objects.create(user=user, category=category, title=title, description=description,
+                                     condition='used')
+
+    def suggestions(self, ad, **params):
+        response = self.client.get(reverse('api_ad_suggestions', kwargs={'pk': ad.pk}), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return ([item['ad']['id'] for item in response.data['your_ads']],
+                [item['ad']['id'] for item in response.data['similar']])
+
+    def test_api(self):
+        fantasy = self.ads[1]
+        self.assertEqual(self.suggestions(fantasy), ([], [self.ads[2].pk, self.ads[5].pk, self.ads[6].pk]))
+        response = self.client.get(reverse('api_ad_suggestions', kwargs={'pk': fantasy.pk}), {'limit': 1})
+        self.assertEqual(response.data['similar'][0]['ad']['title'], 'Science fiction novel')
+        self.assertGreater(response.data['similar'][0]['score'], 0)
+
+        # The viewer's own ads are ranked apart from the other listings.
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.users[0]).access_token}')
+        self.assertEqual(self.suggestions(fantasy), ([self.ads[5].pk], [self.ads[2].pk, self.ads[6].pk]))
+
+        self.assertEqual(self.client.get(reverse('api_ad_suggestions', kwargs={'pk': 999})).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('api_ad_suggestions', kwargs={'pk': fantasy.pk}), {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_updates_incrementally(self):
+        fantasy = self.ads[1]
+        self.suggestions(fantasy)
+        with mock.patch.object(recommendations, 'load', wraps=recommendations.load) as load:
+            novel = self.ads[2]
+            novel.title, novel.description = 'Road atlas', 'Maps of Europe'
+            with self.captureOnCommitCallbacks(execute=True):
+                novel.save()
+                self.ads[6].delete()
+            self.assertEqual(self.suggestions(fantasy), ([], [self.ads[5].pk]))
+            sequel = self.create(self.users[2], 'books', 'Fantasy novel sequel', 'Paperback')
+            self.assertEqual(self.suggestions(fantasy)[1][0], sequel.pk)
+            load.assert_not_called()
+
+    def test_imports_update_incrementally(self):
+        fantasy = self.ads[1]
+        self.assertEqual(len(self.suggestions(fantasy)[1]), 3)
+        with mock.patch.object(recommendations, 'load', wraps=recommendations.load) as load:
+            with self.captureOnCommitCallbacks(execute=True):
+                report = import_ads(self.users[1].pk, [
+                    {'title': 'Fantasy poster', 'description': 'Framed', 'category': 'other', 'condition': 'new'},
+                ])
+            self.assertEqual(report['created'], 1)
+            self.assertEqual(len(self.suggestions(fantasy)[1]), 4)
+            load.assert_not_called()
+
+    def test_replays_changes_of_another_process(self):
+        fantasy = self.ads[1]
+        self.assertEqual(len(self.suggestions(fantasy)[1]), 3)
+        with mock.patch.object(recommendations, 'load', wraps=recommendations.load) as load:
+            # Deleted without signals, like another worker's write: only its log entry reaches us.
+            others = Ad.objects.exclude(pk=fantasy.pk)
+            ad_ids = list(others.values_list('pk', flat=True))
+            others._raw_delete(Ad.objects.db)
+            log_changes(VERSION_NAMESPACE, [('remove', ad_id) for ad_id in ad_ids])
+            self.assertEqual(self.suggestions(fantasy)[1], [])
+            self.assertEqual(len(recommendations), 1)
+            load.assert_not_called()
+
+    def test_reloads_after_bulk_writes(self):
+        fantasy = self.ads[1]
+        self.assertEqual(len(self.suggestions(fantasy)[1]), 3)
+        Ad.objects.exclude(pk=fantasy.pk)._raw_delete(Ad.objects.db)
+        self.assertEqual(len(recommendations), 6)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_recommendations()
+        self.suggestions(fantasy)
+        self.assertEqual(len(recommendations), 1)
+
+    def test_compacts_in_the_background(self):
+        fantasy = self.ads[1]
+        self.suggestions(fantasy)
+        with mock.patch.object(recommendations, 'start') as start:
+            with self.captureOnCommitCallbacks(execute=True):
+                for ad in list(self.ads.values())[1:3]:
+                    ad.delete()
+            start.assert_called_with(recommendations.compact)
+        self.assertEqual(len(recommendations.ad_ids), 6)
+        recommendations.compact()
+        self.assertEqual(len(recommendations.ad_ids), 4)
+        self.assertEqual(len(self.suggestions(fantasy)[1]), 2)
+
+    def test_unavailable_until_loaded(self):
+        with mock.patch.object(recommendations, 'start'):
+            response = self.client.get(reverse('api_ad_suggestions', kwargs={'pk': self.ads[1].pk}))
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response['Retry-After'], '5')
+
+            response = self.client.get(reverse('ad_detail', kwargs={'pk': self.ads[1].pk}))
+            self.assertEqual(response.context['similar_ads'], [])
+            self.assertEqual(response['X-Cache'], 'MISS')
+            response = self.client.get(reverse('ad_detail', kwargs={'pk': self.ads[1].pk}))
+            self.assertEqual(response['X-Cache'], 'MISS')
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False, RECOMMENDATION_LIMIT=2)
+    def test_detail_page(self):
+        self.client.force_login(self.users[0])
+        laptop = self.create(self.users[0], 'electronics', 'Old laptop', 'Slow')
+        response = self.client.get(reverse('ad_detail', kwargs={'pk': self.ads[1].pk}))
+        self.assertEqual(response.context['similar_ads'], [self.ads[2], self.ads[6]])
+        self.assertContains(response, 'Similar Listings')
+        # The viewer's ads most alike come first in the proposal form, the others after them.
+        self.assertEqual(response.context['user_ads'], [self.ads[5], laptop, self.ads[4]])
+
+        response = self.client.get(reverse('ad_detail', kwargs={'pk': self.ads[3].pk}))
+        self.assertEqual(response.context['user_ads'][0], laptop)
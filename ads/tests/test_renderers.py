@@ -0,0 +1,56 @@
+import json
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Ad
+from ..renderers import ORJSONRenderer, msgpack
+
+MSGPACK = 'application/msgpack'
+
+
+class RendererTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user1', password='password123')
+        Ad.objects.create(user=self.user, title='Bicycle   bike', description='Red bike, café edition',
+                          category='other', condition='used', image_url='https://img.example/bike.jpg')
+
+    def test_json_matches_drf(self):
+        response = self.client.get(reverse('api_ad_list'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = json.loads(response.content)
+        self.assertEqual(response.content, JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_negotiation(self):
+        url = reverse('api_ad_list')
+        expected = self.client.get(url).json()
+        for params, headers in [(None, {'HTTP_ACCEPT': MSGPACK}), ({'format': 'msgpack'}, {})]:
+            with self.subTest(params=params):
+                response = self.client.get(url, params, **headers)
+                self.assertEqual(response['Content-Type'], MSGPACK)
+                self.assertEqual(msgpack.unpackb(response.content)['results'], expected['results'])
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_request_body(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        body = {'title': 'Lamp', 'description': 'Desk lamp', 'category': 'home', 'condition': 'new'}
+        response = self.client.post(reverse('api_ad_list'), msgpack.packb(body), content_type=MSGPACK,
+                                    HTTP_ACCEPT=MSGPACK)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(msgpack.unpackb(response.content)['title'], 'Lamp')
+
+        response = self.client.post(reverse('api_ad_list'), b'\xc1', content_type=MSGPACK)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_browsable_api(self):
+        response = self.client.get(reverse('api_ad_list'), HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'Bicycle')
@@ -0,0 +1,89 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Ad
+from ..search import FTS_TABLE, build_match_query, search_ads
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 search is SQLite specific')
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='password123')
+        self.guitar = self.create_ad('Acoustic guitar', 'Six strings, barely played.')
+        self.amp = self.create_ad('Amplifier', 'Great match for an electric guitar.')
+        self.lamp = self.create_ad('Desk lamp', 'LED lamp with dimmer.')
+
+    def create_ad(self, title, description):
+        return Ad.objects.create(
+            user=self.user,
+            title=title,
+            description=description,
+            category='other',
+            condition='used'
+        )
+
+    def search(self, text):
+        return list(search_ads(Ad.objects.all(), text))
+
+    def test_build_match_query(self):
+        self.assertEqual(build_match_query('red "bike"  2x'), '"red"* "bike"* "2x"*')
+        self.assertEqual(build_match_query('!!!'), '')
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search('guitar'), [self.guitar, self.amp])
+
+    def test_prefix_terms(self):
+        self.assertEqual(self.search('guit'), [self.guitar, self.amp])
+        self.assertEqual(self.search('electric gui'), [self.amp])
+
+    def test_punctuation_only_matches_nothing(self):
+        self.assertEqual(self.search('"*'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.lamp.title = 'Floor lamp with guitar stickers'
+        self.lamp.save()
+        self.assertIn(self.lamp, self.search('stickers'))
+
+        self.guitar.delete()
+        self.assertEqual(self.search('acoustic'), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+        self.assertEqual(self.search('lamp'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('lamp'), [self.lamp])
+
+    def test_html_list_uses_full_text_search(self):
+        response = self.client.get(reverse('ad_list'), {'search': 'guit'})
+        self.assertEqual(list(response.context['ads']), [self.guitar, self.amp])
+
+    def test_api_list_uses_full_text_search(self):
+        response = self.client.get(reverse('api_ad_list'), {'search': 'guit'})
+        self.assertEqual([ad['id'] for ad in response.data['results']], [self.guitar.id, self.amp.id])
+
+    def test_cursor_pages_keep_relevance_order(self):
+        for i in range(10):
+            self.create_ad(f'Strap {i}', 'Fits any guitar' + ' and bass' * i)
+        expected = [ad.pk for ad in search_ads(Ad.objects.all(), 'guitar')]
+        self.assertEqual(expected[0], self.guitar.pk)
+
+        pages, url, params = [], reverse('api_ad_list'), {'search': 'guitar', 'cursor': ''}
+        while url:
+            response = self.client.get(url, params)
+            pages.append([ad['id'] for ad in response.data['results']])
+            url, params = response.data['next'], None
+        self.assertEqual(len(pages), 2)
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+        response = self.client.get(reverse('ad_list'), {'search': 'guitar', 'cursor': ''})
+        self.assertEqual([ad.pk for ad in response.context['ads']], expected[:9])
+        response = self.client.get(reverse('ad_list') + '?' + response.context['next_cursor_query'])
+        self.assertEqual([ad.pk for ad in response.context['ads']], expected[9:])
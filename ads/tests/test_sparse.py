@@ -0,0 +1,88 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Ad, ExchangeProposal
+from ..serializers import AD_FIELD_COLUMNS, AdRetrieveSerializer, AdRowSerializer
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='password123')
+        self.user2 = User.objects.create_user(username='user2', password='password123')
+        self.ad1 = Ad.objects.create(user=self.user1, title='Bicycle', description='Red bike', category='other',
+                                     condition='used', image_url='https://img.example/bike.jpg')
+        self.ad2 = Ad.objects.create(user=self.user2, title='Novel', description='Paperback', category='books',
+                                     condition='new')
+        self.proposal = ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2, comment='Swap?')
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json(), ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_row_serializer_matches_model_serializer(self):
+        request = APIRequestFactory().get('/')
+        context = {'request': request}
+        ads = Ad.objects.select_related('user').order_by('pk')
+        rows = ads.values(*{column for columns in AD_FIELD_COLUMNS.values() for column in columns})
+        self.assertEqual(AdRowSerializer(rows.order_by('pk'), many=True, context=context).data,
+                         AdRetrieveSerializer(ads, many=True, context=context).data)
+        self.assertEqual(AdRowSerializer(rows.first(), fields=['title', 'thumbnails']).data,
+                         AdRetrieveSerializer(ads.first(), fields=['title', 'thumbnails']).data)
+
+    def test_ad_list(self):
+        url = reverse('api_ad_list')
+        data, sql = self.get(url, {'fields': 'title, id'})
+        self.assertEqual(data['results'],
+                         [{'id': self.ad2.pk, 'title': 'Novel'}, {'id': self.ad1.pk, 'title': 'Bicycle'}])
+        self.assertNotIn('description', sql)
+        self.assertNotIn('auth_user', sql)
+
+        data, _ = self.get(url, {'fields': 'user', 'cursor': ''})
+        self.assertEqual(data['results'][0], {'user': {'id': self.user2.pk, 'username': 'user2'}})
+
+        full, _ = self.get(url)
+        self.assertEqual(list(full['results'][0]), AdRetrieveSerializer.Meta.fields)
+
+    def test_unknown_field(self):
+        for fields in ['title,password', '']:
+            with self.subTest(fields=fields):
+                response = self.client.get(reverse('api_ad_list'), {'fields': fields})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('fields', response.json())
+
+    def test_ad_detail(self):
+        data, sql = self.get(reverse('api_ad_detail', kwargs={'pk': self.ad1.pk}), {'fields': 'title,thumbnails'})
+        self.assertEqual(list(data), ['title', 'thumbnails'])
+        self.assertEqual(sorted(data['thumbnails']), ['card', 'detail', 'small'])
+        self.assertNotIn('description', sql)
+
+    def test_proposals(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user2).access_token}')
+        self.client.get(reverse('api_proposal_list'))  # Warm the user cache.
+
+        data, sql = self.get(reverse('api_proposal_list'), {'fields': 'id,status'})
+        self.assertEqual(data['results'], [{'id': self.proposal.pk, 'status': 'pending'}])
+        self.assertNotIn('comment', sql)
+        self.assertNotIn('auth_user', sql)
+
+        data, sql = self.get(reverse('api_proposal_list'), {'fields': 'ad_sender', 'cursor': ''})
+        self.assertEqual(data['results'][0]['ad_sender']['user'], {'id': self.user1.pk, 'username': 'user1'})
+        self.assertNotIn('password', sql)
+
+        url = reverse('api_proposal_detail', kwargs={'pk': self.proposal.pk})
+        with self.assertNumQueries(1):
+            data, _ = self.get(url, {'fields': 'comment'})
+        self.assertEqual(data, {'comment': 'Swap?'})
+
+        outsider = User.objects.create_user(username='outsider')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(outsider).access_token}')
+        self.assertEqual(self.client.get(url, {'fields': 'comment'}).status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,118 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Ad, ExchangeProposal, UserStats
+from ..recommendations import recommendations
+from ..stats import STAT_FIELDS, compute_user_stats
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = User.objects.create_user(username='user2', password='testpass123')
+        self.ad1 = self.create_ad(self.user1, 'Bicycle')
+        self.ad2 = self.create_ad(self.user2, 'Guitar')
+
+    def create_ad(self, user, title):
+        return Ad.objects.create(user=user, title=title, description=title, category='other', condition='used')
+
+    def stats(self, user):
+        stats = UserStats.objects.get(user=user)
+        return {field: getattr(stats, field) for field in STAT_FIELDS}
+
+    def assertStats(self, user, **expected):
+        expected = {field: expected.get(field, 0) for field in STAT_FIELDS}
+        self.assertEqual(self.stats(user), expected)
+        # The denormalized row must always agree with a full recount.
+        recount = compute_user_stats([user.pk])[user.pk]
+        self.assertEqual({field: recount[field] for field in STAT_FIELDS}, expected)
+
+    def test_new_user_gets_stats_row(self):
+        user = User.objects.create_user(username='user3', password='testpass123')
+        self.assertStats(user)
+
+    def test_listing_counts(self):
+        self.create_ad(self.user1, 'Lamp')
+        self.assertStats(self.user1, listings_count=2)
+
+        self.ad1.delete()
+        self.assertStats(self.user1, listings_count=1)
+
+    def test_proposal_lifecycle(self):
+        proposal = ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2)
+        self.assertStats(self.user1, listings_count=1, proposals_sent=1)
+        self.assertStats(self.user2, listings_count=1, proposals_received=1)
+
+        proposal.status = 'accepted'
+        proposal.save()
+        self.assertStats(self.user1, listings_count=1, proposals_sent=1, trades_accepted=1)
+        self.assertStats(self.user2, listings_count=1, proposals_received=1, trades_accepted=1)
+
+        proposal.delete()
+        self.assertStats(self.user1, listings_count=1)
+        self.assertStats(self.user2, listings_count=1)
+
+    def test_reloaded_proposal_status_change(self):
+        ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2, status='accepted')
+        proposal = ExchangeProposal.objects.get()
+        proposal.status = 'rejected'
+        proposal.save()
+        self.assertStats(self.user1, listings_count=1, proposals_sent=1)
+        self.assertStats(self.user2, listings_count=1, proposals_received=1)
+
+    def test_cascade_delete(self):
+        ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2, status='accepted')
+        self.ad2.delete()
+        self.assertStats(self.user1, listings_count=1)
+        self.assertStats(self.user2)
+
+    def test_delete_user(self):
+        user3 = User.objects.create_user(username='user3', password='testpass123')
+        ad3 = self.create_ad(user3, 'Lamp')
+        ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2, status='accepted')
+        ExchangeProposal.objects.create(ad_sender=self.ad2, ad_receiver=self.ad1)
+        ExchangeProposal.objects.create(ad_sender=ad3, ad_receiver=self.ad1)
+        self.create_ad(self.user2, 'Drum')
+        self.user2.delete()
+        self.assertFalse(UserStats.objects.filter(user_id=self.user2.pk).exists())
+        self.assertStats(self.user1, listings_count=1, proposals_received=1)
+        self.assertStats(user3, listings_count=1, proposals_sent=1)
+
+    def test_cascade_loads_owners_once(self):
+        other = self.create_ad(self.user2, 'Drum')
+        for ad in (self.ad2, other, self.ad2):
+            ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=ad)
+        with CaptureQueriesContext(connection) as context:
+            self.ad1.delete()
+        # The other ads' owners are loaded in one query, not once per proposal.
+        ad_queries = [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT "ads_ad"')]
+        self.assertEqual(len(ad_queries), 1)
+        self.assertStats(self.user1)
+        self.assertStats(self.user2, listings_count=2)
+
+    def test_recompute_command(self):
+        ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2)
+        UserStats.objects.all().delete()
+
+        call_command('recompute_user_stats', stdout=StringIO())
+        self.assertStats(self.user1, listings_count=1, proposals_sent=1)
+        self.assertStats(self.user2, listings_count=1, proposals_received=1)
+
+    def test_missing_row_is_rebuilt(self):
+        UserStats.objects.filter(user=self.user1).delete()
+        self.create_ad(self.user1, 'Lamp')
+        self.assertStats(self.user1, listings_count=2)
+
+    def test_detail_page_reads_stats_row(self):
+        ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2)
+        # Without similar listings, whose queries depend on what the index holds.
+        with self.assertNumQueries(1), mock.patch.object(recommendations, 'sync', return_value=False):
+            response = self.client.get(reverse('ad_detail', kwargs={'pk': self.ad2.pk}))
+        self.assertEqual(response.context['owner_stats'].proposals_received, 1)
@@ -0,0 +1,170 @@
+import os
+import shutil
+import socket
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Ad
+from .. import thumbnails
+from ..cache import get_cache
+from ..thumbnails import USAGE_KEY, ThumbnailError, _check_url, evict, fetch, get_thumbnail, thumbnail_url
+
+ORIGIN = {}
+FETCHED = []
+
+
+def fetch_local(url):
+    """Stand-in origin serving the images in ``ORIGIN``."""
+    FETCHED.append(url)
+    if url not in ORIGIN:
+        raise ThumbnailError(f'No such image: {url}')
+    return ORIGIN[url]
+
+
+def make_image(size, color='red', format='JPEG'):
+    output = BytesIO()
+    Image.new('RGB', size, color).save(output, format)
+    return output.getvalue()
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        overrides = override_settings(THUMBNAIL_CACHE_DIR=self.cache_dir,
+                                      THUMBNAIL_FETCHER='ads.tests.test_thumbnails.fetch_local')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        FETCHED.clear()
+        ORIGIN.clear()
+        get_cache().delete(USAGE_KEY)
+        ORIGIN['https://img.example/bike.jpg'] = make_image((3000, 1000))
+        ORIGIN['https://img.example/logo.png'] = make_image((500, 500), format='PNG')
+
+        self.user = User.objects.create_user(username='user1', password='password123')
+        self.ad = Ad.objects.create(user=self.user, title='Bicycle', description='Red bike', category='other',
+                                    condition='used', image_url='https://img.example/bike.jpg')
+
+    def get_image(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        self.addCleanup(response.close)
+        if response.status_code != 200:
+            return response, None
+        return response, Image.open(BytesIO(b''.join(response.streaming_content)))
+
+    def test_thumbnails_rendered_once(self):
+        card_url = thumbnail_url(self.ad, 'card')
+        response, image = self.get_image(card_url)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(image.size, (640, 400))
+
+        with self.assertNumQueries(0):
+            _, image = self.get_image(thumbnail_url(self.ad, 'detail'))
+        self.assertEqual(image.size, (1200, 400))
+        self.assertEqual(FETCHED, ['https://img.example/bike.jpg'])
+
+        response, _ = self.get_image(card_url, if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_rerenders_a_file_evicted_after_the_lookup(self):
+        url = thumbnail_url(self.ad, 'card')
+        self.get_image(url)
+        path = next(Path(self.cache_dir).glob('*/*.jpg'))
+        with mock.patch('ads.views.cached_path', return_value=path):
+            for rendered in Path(self.cache_dir).glob('*/*.jpg'):
+                rendered.unlink()  # Another worker's evict() ran in between.
+            response, image = self.get_image(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(image.size, (640, 400))
+        self.assertEqual(len(FETCHED), 2)
+
+    def test_transparent_png(self):
+        self.ad.image_url = 'https://img.example/logo.png'
+        self.ad.save()
+        response, image = self.get_image(thumbnail_url(self.ad, 'small'))
+        self.assertEqual((image.format, image.size), ('JPEG', (400, 400)))
+
+    def test_changed_image_redirects(self):
+        old_url = thumbnail_url(self.ad, 'card')
+        self.ad.image_url = 'https://img.example/logo.png'
+        self.ad.save()
+        self.assertRedirects(self.client.get(old_url), thumbnail_url(self.ad, 'card'), fetch_redirect_response=False)
+
+    def test_broken_origin_is_not_refetched(self):
+        self.ad.image_url = 'https://img.example/missing.jpg'
+        self.ad.save()
+        for _ in range(2):
+            self.assertEqual(self.client.get(thumbnail_url(self.ad, 'card')).status_code, 404)
+        self.assertEqual(FETCHED, ['https://img.example/missing.jpg'])
+
+    def test_unknown_size(self):
+        url = thumbnail_url(self.ad, 'card').replace('/card/', '/huge/')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_evicts_least_recently_used(self):
+        paths = []
+        for i in range(4):
+            path = os.path.join(self.cache_dir, 'ab', f'{i:024x}.jpg')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(b'x' * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+        os.utime(paths[0], (2000, 2000))  # Used most recently.
+        with override_settings(THUMBNAIL_CACHE_MAX_BYTES=250):
+            self.assertEqual(evict(), 2)
+        self.assertEqual([os.path.exists(path) for path in paths], [True, False, False, True])
+
+    def test_scans_only_when_over_the_limit(self):
+        ORIGIN['https://img.example/lamp.jpg'] = make_image((800, 600), 'blue')
+        with mock.patch.object(thumbnails, 'evict', wraps=evict) as scan:
+            get_thumbnail('https://img.example/bike.jpg', 'card')
+            self.assertEqual(scan.call_count, 1)  # The size is not known yet.
+            get_thumbnail('https://img.example/logo.png', 'card')
+            self.assertEqual(scan.call_count, 1)
+            with override_settings(THUMBNAIL_CACHE_MAX_BYTES=get_cache().get(USAGE_KEY)):
+                get_thumbnail('https://img.example/lamp.jpg', 'card')
+            self.assertEqual(scan.call_count, 2)
+        self.assertFalse(thumbnails.cached_path(thumbnails.thumbnail_digest('https://img.example/bike.jpg', 'card')))
+
+    def test_pages_and_api_link_thumbnails(self):
+        card_url = thumbnail_url(self.ad, 'card')
+        self.assertContains(self.client.get(reverse('ad_list')), card_url)
+        self.assertContains(self.client.get(reverse('ad_detail', kwargs={'pk': self.ad.pk})),
+                            thumbnail_url(self.ad, 'detail'))
+
+        Ad.objects.create(user=self.user, title='Lamp', description='Desk lamp', category='home', condition='new')
+        results = self.client.get(reverse('api_ad_list')).json()['results']
+        thumbnails = {ad['title']: ad['thumbnails'] for ad in results}
+        self.assertIsNone(thumbnails['Lamp'])
+        self.assertEqual(thumbnails['Bicycle']['card'], f'http://testserver{card_url}')
+
+    def test_refuses_internal_hosts(self):
+        for url in ['http://127.0.0.1/image.jpg', 'http://localhost/image.jpg', 'ftp://img.example/image.jpg',
+                    'http://10.0.0.1/image.jpg']:
+            with self.subTest(url=url), self.assertRaises(ThumbnailError):
+                _check_url(url)
+
+    def test_connects_to_the_checked_address(self):
+        public = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('93.184.216.34', 80))]
+        private = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 80))]
+        with mock.patch('socket.getaddrinfo', side_effect=[public, private]), \
+                mock.patch('socket.create_connection') as connect:
+            # The second lookup, made to connect, rebinds the name to an internal address.
+            with self.assertRaisesMessage(ThumbnailError, 'Refusing to fetch from img.example.'):
+                fetch('http://img.example/image.jpg')
+            connect.assert_not_called()
+
+        with mock.patch('socket.getaddrinfo', return_value=public), \
+                mock.patch('socket.create_connection', side_effect=ConnectionRefusedError) as connect:
+            with self.assertRaises(ThumbnailError):
+                fetch('http://img.example/image.jpg')
+            self.assertEqual(connect.call_args.args[0], ('93.184.216.34', 80))
@@ -0,0 +1,68 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..cache import get_cache
+from ..models import RevokedToken
+from ..tokens import _revoked_key, revoke
+
+
+class TokenRefreshTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user1', password='password123')
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'user1', 'password': 'password123'})
+        self.refresh_token = response.data['refresh']
+
+    def refresh(self, token):
+        return self.client.post(reverse('token_refresh'), {'refresh': token})
+
+    def test_rotation_revokes_the_old_token(self):
+        response = self.refresh(self.refresh_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        self.assertNotEqual(response.data['refresh'], self.refresh_token)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+        self.assertEqual(self.refresh(self.refresh_token).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, status.HTTP_200_OK)
+
+    def test_replay_without_cache_entry(self):
+        # Another worker, or an evicted marker: the table still refuses the token.
+        self.assertEqual(self.refresh(self.refresh_token).status_code, status.HTTP_200_OK)
+        get_cache().delete(_revoked_key(RevokedToken.objects.get().jti))
+        self.assertEqual(self.refresh(self.refresh_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user_cannot_refresh(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.refresh(self.refresh_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_writes_one_row(self):
+        new_token = self.refresh(self.refresh_token).data['refresh']
+        # One INSERT, wrapped in a savepoint inside the test transaction.
+        with self.assertNumQueries(3):
+            self.assertEqual(self.refresh(new_token).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh(new_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RevokeTests(APITestCase):
+    def test_revoke_once(self):
+        expires_at = timezone.now() + timedelta(hours=1)
+        self.assertTrue(revoke('jti-1', expires_at))
+        self.assertFalse(revoke('jti-1', expires_at))
+
+    def test_purge_expired(self):
+        now = timezone.now()
+        RevokedToken.objects.create(jti='expired', expires_at=now - timedelta(minutes=1))
+        RevokedToken.objects.create(jti='valid', expires_at=now + timedelta(hours=1))
+        out = StringIO()
+        call_command('purge_revoked_tokens', stdout=out)
+        self.assertIn('Purged 1 expired tokens.', out.getvalue())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['valid'])
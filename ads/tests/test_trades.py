@@ -0,0 +1,177 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..cache import incr_version, log_changes
+from ..models import Ad, ExchangeProposal
+from ..trades import VERSION_NAMESPACE, TradeGraph, invalidate as invalidate_trade_graph, trade_graph
+
+
+class TradeGraphTests(SimpleTestCase):
+    def setUp(self):
+        self.graph = TradeGraph()
+        # Ad n belongs to user n * 10 unless given otherwise.
+        self.edges = 0
+
+    def add(self, sender, receiver, owners=None):
+        self.edges += 1
+        owners = owners or (sender * 10, receiver * 10)
+        self.graph.add_edge(self.edges, sender, receiver, *owners)
+        return self.edges
+
+    def ads(self, cycles):
+        return [ads for ads, _ in cycles]
+
+    def test_finds_cycles_shortest_first(self):
+        self.add(1, 2)
+        self.add(2, 3)
+        self.add(3, 1)
+        self.add(2, 1)
+        self.add(3, 4)
+        cycles = self.graph.find_cycles([1])
+        self.assertEqual(self.ads(cycles), [[1, 2], [1, 2, 3]])
+        self.assertEqual(cycles[1][1], [1, 2, 3])
+
+    def test_respects_max_length_and_limit(self):
+        for ad in range(1, 6):
+            self.add(ad, ad % 5 + 1)
+        self.assertEqual(self.graph.find_cycles([1], max_length=4), [])
+        self.assertEqual(self.ads(self.graph.find_cycles([1], max_length=5)), [[1, 2, 3, 4, 5]])
+
+        self.add(1, 3)
+        self.assertEqual(len(self.graph.find_cycles([1], max_length=5, limit=1)), 1)
+
+    def test_owners_are_distinct(self):
+        self.add(1, 2, (10, 20))
+        self.add(2, 3, (20, 10))
+        self.add(3, 1, (10, 10))
+        self.assertEqual(self.graph.find_cycles([1, 3]), [])
+
+    def test_parallel_proposals(self):
+        first = self.add(1, 2)
+        second = self.add(1, 2)
+        back = self.add(2, 1)
+        self.graph.remove_edge(first, 1, 2)
+        self.assertEqual(self.graph.find_cycles([1])[0][1], [second, back])
+        self.graph.remove_edge(second, 1, 2)
+        self.assertEqual(self.graph.find_cycles([1]), [])
+        self.assertEqual(len(self.graph), 1)
+        self.assertEqual(self.graph.succ, {2: {1: back}})
+
+    def test_step_budget(self):
+        for ad in range(2, 200):
+            self.add(1, ad)
+            self.add(ad, 1)
+        self.assertEqual(len(self.graph.find_cycles([1], limit=50, max_steps=20)), 10)
+
+
+class TradeCycleAPITests(APITestCase):
+    def setUp(self):
+        trade_graph.clear()
+        self.users = [User.objects.create_user(username=f'user{i}', password='password123') for i in range(3)]
+        self.ads = [
+            Ad.objects.create(user=user, title=f'Ad {i}', description='Item', category='other', condition='used')
+            for i, user in enumerate(self.users)
+        ]
+        self.url = reverse('api_trade_cycles')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.users[0]).access_token}')
+
+    def propose(self, sender, receiver):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ExchangeProposal.objects.create(ad_sender=self.ads[sender], ad_receiver=self.ads[receiver])
+
+    def cycles(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [[ad['id'] for ad in cycle['ads']] for cycle in response.data['results']]
+
+    def test_unauthenticated(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_max_length(self):
+        response = self.client.get(self.url, {'max_length': 99})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_three_way_cycle_updates_incrementally(self):
+        proposals = [self.propose(0, 1), self.propose(1, 2)]
+        self.assertEqual(self.cycles(), [])
+
+        proposals.append(self.propose(2, 0))
+        with mock.patch.object(trade_graph, 'load', wraps=trade_graph.load) as load:
+            response = self.client.get(self.url)
+            cycle = response.data['results'][0]
+            self.assertEqual([ad['id'] for ad in cycle['ads']], [ad.pk for ad in self.ads])
+            self.assertEqual(cycle['proposals'], [proposal.pk for proposal in proposals])
+            self.assertEqual(cycle['ads'][1]['user']['username'], 'user1')
+
+            with self.captureOnCommitCallbacks(execute=True):
+                proposals[1].status = 'rejected'
+                proposals[1].save()
+            self.assertEqual(self.cycles(), [])
+            load.assert_not_called()
+
+    def test_replays_changes_of_another_process(self):
+        proposals = [self.propose(0, 1), self.propose(1, 0)]
+        self.assertEqual(len(self.cycles()), 1)
+
+        # Deleted without signals, like another worker's write: only its log entry reaches us.
+        ExchangeProposal.objects.all()._raw_delete(ExchangeProposal.objects.db)
+        with mock.patch.object(trade_graph, 'load', wraps=trade_graph.load) as load:
+            log_changes(VERSION_NAMESPACE, [
+                ('remove', proposal.pk, proposal.ad_sender_id, proposal.ad_receiver_id) for proposal in proposals
+            ])
+            self.assertEqual(self.cycles(), [])
+            load.assert_not_called()
+
+    @override_settings(INDEX_LOG_WAIT=0)
+    def test_reloads_when_a_change_is_lost(self):
+        self.propose(0, 1)
+        self.propose(1, 0)
+        self.assertEqual(len(self.cycles()), 1)
+
+        ExchangeProposal.objects.all()._raw_delete(ExchangeProposal.objects.db)
+        incr_version(VERSION_NAMESPACE)  # Its writer died before logging the change.
+        self.assertEqual(len(self.cycles()), 1)
+        self.assertEqual(self.cycles(), [])
+
+    def test_reloads_after_bulk_writes(self):
+        self.propose(0, 1)
+        self.propose(1, 0)
+        self.assertEqual(len(self.cycles()), 1)
+
+        ExchangeProposal.objects.all()._raw_delete(ExchangeProposal.objects.db)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_trade_graph()
+        self.assertEqual(self.cycles(), [])
+
+    def test_unchanged_proposal_loads_no_ads(self):
+        proposal = ExchangeProposal.objects.get(pk=self.propose(0, 1).pk)
+        proposal.comment = 'Still interested?'
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            proposal.save()
+        self.assertEqual([query['sql'] for query in queries if 'FROM "ads_ad"' in query['sql']], [])
+
+    def test_unavailable_until_loaded(self):
+        with mock.patch.object(trade_graph, 'start'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_batch_updates_graph(self):
+        self.propose(1, 2)
+        self.propose(2, 0)
+        self.assertEqual(self.cycles(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('api_proposal_batch'), {'operations': [
+                {'op': 'create', 'ad_sender_id': self.ads[0].pk, 'ad_receiver_id': self.ads[1].pk},
+            ]}, format='json')
+        self.assertTrue(response.data['results'][0]['ok'])
+        self.assertEqual(self.cycles(ad=self.ads[0].pk), [[ad.pk for ad in self.ads]])
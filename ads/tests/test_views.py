@@ -143,6 +143,24 @@ class BarterPlatformTests(TestCase):
         response = self.client.get(reverse('ad_list'))
         self.assertContains(response, 'page=2')
 
+    def test_load_more(self):
+        for i in range(15):
+            Ad.objects.create(
+                user=self.user1,
+                title=f'Test Ad {i}',
+                description='Test',
+                category='electronics',
+                condition='new'
+            )
+        response = self.client.get(reverse('ad_list'), {'cursor': ''})
+        self.assertEqual(len(response.context['ads']), 9)
+        self.assertContains(response, 'Load more')
+        self.assertNotContains(response, 'page=2')
+
+        response = self.client.get(reverse('ad_list') + '?' + response.context['next_cursor_query'])
+        self.assertEqual(len(response.context['ads']), 8)
+        self.assertIsNone(response.context['next_cursor_query'])
+
     def test_proposal_creation_flow(self):
         self.client.login(username='user1', password='testpass123')
         url = reverse('send_proposal', kwargs={'ad_receiver_pk': self.ad2.pk})
@@ -152,6 +170,33 @@ class BarterPlatformTests(TestCase):
         })
         self.assertEqual(response.status_code, 302)
 
+    def test_proposal_inbox(self):
+        ad3 = Ad.objects.create(user=self.user1, title='Camera', description='Old', category='electronics',
+                                condition='used')
+        for i in range(12):
+            status = 'rejected' if i % 4 else 'pending'
+            ExchangeProposal.objects.create(ad_sender=self.ad2, ad_receiver=ad3, status=status)
+        for i in range(12):
+            ExchangeProposal.objects.create(ad_sender=ad3, ad_receiver=self.ad2)
+        self.client.login(username='user1', password='testpass123')
+
+        response = self.client.get(reverse('manage_proposals'))
+        counts = response.context['proposal_counts']
+        self.assertEqual((counts['received'], counts['sent']), (12, 13))
+        self.assertEqual([count for _, _, count in response.context['status_choices']], [16, 0, 9])
+        received, sent = response.context['received_proposals'], response.context['sent_proposals']
+        self.assertEqual((len(received), len(sent)), (8, 12))
+        self.assertTrue(all(proposal.ad_receiver.user == self.user1 for proposal in received))
+        self.assertContains(response, 'Received (12)')
+
+        response = self.client.get(reverse('manage_proposals'), {'page': 2})
+        self.assertEqual(len(response.context['received_proposals']) + len(response.context['sent_proposals']), 5)
+
+        response = self.client.get(reverse('manage_proposals'), {'status': 'rejected'})
+        self.assertEqual(len(response.context['received_proposals']), 9)
+        self.assertEqual(response.context['sent_proposals'], [])
+        self.assertContains(response, "You haven't sent any trade proposals yet.")
+
     def test_proposal_status_update(self):
         self.client.login(username='user2', password='testpass123')
         url = reverse('update_proposal_status', kwargs={'pk': self.proposal.pk})
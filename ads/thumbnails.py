@@ -0,0 +1,273 @@
+"""
+Resized copies of ad images, served by ``AdThumbnailView``.
+
+The first request for an image fetches the original once through
+``THUMBNAIL_FETCHER`` and renders every size in ``THUMBNAIL_SIZES`` into
+``THUMBNAIL_CACHE_DIR``. A file's mtime doubles as its last use, and the
+directory is trimmed back under ``THUMBNAIL_CACHE_MAX_BYTES`` least recently
+used first; its size is counted in the cache as files are written, so the
+directory is only scanned once it is over the limit. Thumbnail URLs carry a digest of the image URL, so they can be
+cached forever: a new image gets a new URL, and a cache hit needs no query.
+"""
+import hashlib
+import ipaddress
+import os
+import re
+import socket
+import threading
+import time
+from functools import lru_cache
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlsplit
+from urllib.request import HTTPHandler, HTTPRedirectHandler, HTTPSHandler, ProxyHandler, Request, build_opener
+
+from django.conf import settings
+from django.urls import get_script_prefix, reverse
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from .cache import KEY_PREFIX, get_cache
+
+DIGEST_RE = re.compile(r'[0-9a-f]{24}')
+# Refresh a file's last use at most this often, to spare a metadata write per hit.
+TOUCH_INTERVAL = 3600
+# Trim to this share of the limit, so that not every new file triggers a scan.
+EVICT_TO = 0.9
+USAGE_KEY = f'{KEY_PREFIX}:thumbnail-bytes'
+
+
+class ThumbnailError(Exception):
+    """The original could not be fetched or is not an image."""
+
+
+def thumbnail_digest(image_url, size):
+    return hashlib.sha256(f'{size}\n{image_url}'.encode()).hexdigest()[:24]
+
+
+@lru_cache
+def _url_template(script_prefix):
+    # Reversing once per thumbnail would dominate serializing a page of ads.
+    url = reverse('ad_thumbnail', kwargs={'pk': 987654321, 'size': 'SIZE', 'digest': 'DIGEST'})
+    return url.replace('987654321', '{pk}', 1).replace('SIZE', '{size}', 1).replace('DIGEST', '{digest}', 1)
+
+
+def thumbnail_url(ad, size):
+    """Path of the ``size`` thumbnail of ``ad``, or None when it has no image."""
+    if not ad.image_url:
+        return None
+    return _url_template(get_script_prefix()).format(
+        pk=ad.pk, size=size, digest=thumbnail_digest(ad.image_url, size),
+    )
+
+
+def thumbnail_urls(pk, image_url):
+    """Paths of every thumbnail size of the ad ``pk``, or None when it has no image."""
+    if not image_url:
+        return None
+    template = _url_template(get_script_prefix())
+    return {
+        size: template.format(pk=pk, size=size, digest=thumbnail_digest(image_url, size))
+        for size in settings.THUMBNAIL_SIZES
+    }
+
+
+def _public_addresses(host, port=None):
+    """The addresses of ``host``, provided every one of them is public."""
+    try:
+        addresses = list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+    except (socket.gaierror, UnicodeError, ValueError) as exc:
+        raise ThumbnailError(f'Cannot resolve {host}.') from exc
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            raise ThumbnailError(f'Refusing to fetch from {host}.')
+    return addresses
+
+
+def _check_url(url):
+    """Only fetch http(s) URLs on public addresses, never the internal network."""
+    parsed = urlsplit(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ThumbnailError(f'Unsupported image URL: {url}')
+    _public_addresses(parsed.hostname, parsed.port)
+
+
+def _create_public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """
+    ``socket.create_connection`` to an address vetted in the same lookup:
+    resolving the host again to connect would let its DNS answer with an
+    internal address the second time.
+    """
+    host, port = address
+    error = None
+    for ip in _public_addresses(host, port):
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as exc:
+            error = exc
+    raise error
+
+
+class _PublicHTTPConnection(HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPSConnection(HTTPSConnection):
+    # TLS still verifies the certificate against the host name.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPHandler(HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _CheckedRedirectHandler(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def fetch(url):
+    """Download an original image; the default ``THUMBNAIL_FETCHER``."""
+    _check_url(url)
+    # No proxies: the address connected to must be the origin's, checked above.
+    opener = build_opener(ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler, _CheckedRedirectHandler)
+    limit = settings.THUMBNAIL_MAX_SOURCE_BYTES
+    try:
+        with opener.open(Request(url, headers={'User-Agent': 'barter-platform-thumbnailer'}),
+                         timeout=settings.THUMBNAIL_FETCH_TIMEOUT) as response:
+            content = response.read(limit + 1)
+    except (OSError, ValueError, HTTPException) as exc:
+        raise ThumbnailError(f'Cannot fetch {url}: {exc}') from exc
+    if len(content) > limit:
+        raise ThumbnailError(f'{url} is larger than {limit} bytes.')
+    return content
+
+
+def render(content, size):
+    """Resize image bytes to the ``size`` box, cropped to fill it when the size asks for it; returns JPEG."""
+    width, height, crop = settings.THUMBNAIL_SIZES[size]
+    try:
+        with Image.open(BytesIO(content)) as original:
+            # JPEG can decode straight to a smaller scale; allow for EXIF rotation.
+            original.draft('RGB', (max(width, height),) * 2)
+            image = ImageOps.exif_transpose(original)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            image = image.convert('RGB')
+            if crop:
+                image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+            else:
+                image.thumbnail((width, height), Image.Resampling.LANCZOS)
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=82, optimize=True, progressive=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise ThumbnailError(f'Not a usable image: {exc}') from exc
+    return output.getvalue()
+
+
+def _path(digest):
+    return Path(settings.THUMBNAIL_CACHE_DIR) / digest[:2] / f'{digest}.jpg'
+
+
+def cached_path(digest):
+    """The cached file for ``digest``, marked as used, or None."""
+    if not DIGEST_RE.fullmatch(digest):
+        return None
+    path = _path(digest)
+    try:
+        if path.stat().st_mtime < time.time() - TOUCH_INTERVAL:
+            os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def _store(digest, content):
+    path = _path(digest)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per thread: two requests may render the same thumbnail at once.
+    temporary = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    temporary.write_bytes(content)
+    os.replace(temporary, path)
+    return path
+
+
+def _count_usage(size):
+    """Add ``size`` bytes to the directory's size counted in the cache; None when it is not known."""
+    try:
+        return get_cache().incr(USAGE_KEY, size)
+    except ValueError:
+        return None
+
+
+def evict():
+    """
+    Delete least recently used thumbnails once the cache outgrows
+    ``THUMBNAIL_CACHE_MAX_BYTES``, and record the size that remains.
+    """
+    files = []
+    for path in Path(settings.THUMBNAIL_CACHE_DIR).glob('*/*.jpg'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    if total > settings.THUMBNAIL_CACHE_MAX_BYTES:
+        for _, size, path in sorted(files, key=lambda file: file[0]):
+            if total <= settings.THUMBNAIL_CACHE_MAX_BYTES * EVICT_TO:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            deleted += 1
+    get_cache().set(USAGE_KEY, total, timeout=None)
+    return deleted
+
+
+def _failure_key(image_url):
+    return f"{KEY_PREFIX}:thumbnail-failed:{hashlib.sha256(image_url.encode()).hexdigest()}"
+
+
+def get_thumbnail(image_url, size):
+    """
+    Path of the ``size`` thumbnail of ``image_url``, rendering every size on
+    a miss. Raises ``ThumbnailError`` when the original is unusable; failures
+    are remembered in the cache for ``THUMBNAIL_FAILURE_TIMEOUT`` seconds so
+    a broken origin is not fetched on every page view, by any worker when the
+    cache is shared (see ``ads.checks``).
+    """
+    path = cached_path(thumbnail_digest(image_url, size))
+    if path is not None:
+        return path
+
+    cache = get_cache()
+    if cache.get(_failure_key(image_url)):
+        raise ThumbnailError(f'{image_url} failed recently.')
+    try:
+        content = import_string(settings.THUMBNAIL_FETCHER)(image_url)
+        rendered = {name: render(content, name) for name in settings.THUMBNAIL_SIZES}
+    except ThumbnailError:
+        cache.set(_failure_key(image_url), True, settings.THUMBNAIL_FAILURE_TIMEOUT)
+        raise
+    for name, thumbnail in rendered.items():
+        _store(thumbnail_digest(image_url, name), thumbnail)
+    usage = _count_usage(sum(len(thumbnail) for thumbnail in rendered.values()))
+    if usage is None or usage > settings.THUMBNAIL_CACHE_MAX_BYTES:
+        evict()  # A file written twice, or deleted by hand, is only corrected here.
+    return _path(thumbnail_digest(image_url, size))
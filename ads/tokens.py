@@ -0,0 +1,89 @@
+"""
+Refresh token rotation that actually revokes the rotated token.
+
+simplejwt only blacklists through its ``token_blacklist`` app, which costs
+several queries per refresh. Here a rotated token is recorded in
+``RevokedToken`` with a single INSERT; ``jti`` is unique, so the table is
+the exact authority and two workers racing to rotate the same token cannot
+both succeed. The cache fronts the table: a revoked token is refused without
+a query while it could still be valid, and the marker expires with the
+token. With a per-process cache a replay on another worker falls through to
+the INSERT, which refuses it just the same. Expired rows are purged at most
+once per ``PURGE_INTERVAL`` seconds, or by ``manage.py purge_revoked_tokens``.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .authentication import get_cached_user
+from .cache import KEY_PREFIX, get_cache
+from .models import RevokedToken
+
+PURGE_INTERVAL = 3600
+_PURGE_KEY = f'{KEY_PREFIX}:revoked-tokens:purged'
+
+
+def _revoked_key(jti):
+    return f'{KEY_PREFIX}:revoked-token:{jti}'
+
+
+def purge_expired():
+    """Delete the rows of tokens that have expired anyway; returns how many."""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def revoke(jti, expires_at):
+    """Revoke ``jti`` until ``expires_at``; returns False when it already was revoked."""
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        revoked = False
+    else:
+        revoked = True
+    cache = get_cache()
+    remaining = (expires_at - timezone.now()).total_seconds()
+    if remaining > 0:
+        cache.set(_revoked_key(jti), True, remaining)
+    if cache.add(_PURGE_KEY, True, PURGE_INTERVAL):
+        purge_expired()
+    return revoked
+
+
+class RevocableRefreshToken(RefreshToken):
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if get_cache().get(_revoked_key(self.payload[api_settings.JTI_CLAIM])):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        if not revoke(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp'])):
+            raise TokenError(_("Token is blacklisted"))
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    """simplejwt's refresh with the user from the cache and rotation through ``RevokedToken``."""
+    token_class = RevocableRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id and not api_settings.USER_AUTHENTICATION_RULE(get_cached_user(user_id)):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
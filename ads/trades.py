@@ -0,0 +1,168 @@
+"""
+Multi-party trade cycles over pending proposals.
+
+A pending proposal is an edge ``ad_sender -> ad_receiver``: the sender's
+owner gives that ad to get the receiver ad. A cycle A -> B -> C -> A lets
+every owner in it give one ad and get the next one, even though no two of
+them proposed to each other directly.
+
+Each process keeps the graph in memory and patches it from the proposal
+signals once their transaction commits; other workers' patches are
+replayed from the shared ``trade-graph`` log (see ``ads.indexes``).
+"""
+from collections import deque
+
+from .indexes import SharedIndex
+from .models import ExchangeProposal
+
+VERSION_NAMESPACE = 'trade-graph'
+
+
+class TradeGraph(SharedIndex):
+    namespace = VERSION_NAMESPACE
+
+    def clear_data(self):
+        # succ[a][b] is one pending proposal a -> b; further ones for the pair wait in spare.
+        self.succ = {}
+        self.pred = {}
+        self.spare = {}
+        self.owner = {}
+
+    def __len__(self):
+        return sum(len(targets) for targets in self.succ.values())
+
+    # Mutations.
+
+    def add_edge(self, proposal_id, sender_ad, receiver_ad, sender_user, receiver_user):
+        self.owner[sender_ad] = sender_user
+        self.owner[receiver_ad] = receiver_user
+        targets = self.succ.setdefault(sender_ad, {})
+        if targets.get(receiver_ad) == proposal_id:
+            return
+        if receiver_ad in targets:
+            self.spare.setdefault((sender_ad, receiver_ad), set()).add(proposal_id)
+        else:
+            targets[receiver_ad] = proposal_id
+            self.pred.setdefault(receiver_ad, set()).add(sender_ad)
+
+    def remove_edge(self, proposal_id, sender_ad, receiver_ad):
+        targets = self.succ.get(sender_ad, {})
+        spare = self.spare.get((sender_ad, receiver_ad))
+        if targets.get(receiver_ad) == proposal_id:
+            if spare:
+                targets[receiver_ad] = spare.pop()
+            else:
+                del targets[receiver_ad]
+                self.pred[receiver_ad].discard(sender_ad)
+                self._forget(sender_ad)
+                self._forget(receiver_ad)
+        elif spare:
+            spare.discard(proposal_id)
+        if spare is not None and not spare:
+            del self.spare[(sender_ad, receiver_ad)]
+
+    def _forget(self, ad):
+        for adjacency in (self.succ, self.pred):
+            if ad in adjacency and not adjacency[ad]:
+                del adjacency[ad]
+        if ad not in self.succ and ad not in self.pred:
+            self.owner.pop(ad, None)
+
+    def move_ad(self, ad, user):
+        if ad in self.owner:
+            self.owner[ad] = user
+
+    def populate(self):
+        rows = ExchangeProposal.objects.filter(status='pending').values_list(
+            'pk', 'ad_sender_id', 'ad_receiver_id', 'ad_sender__user_id', 'ad_receiver__user_id',
+        ).order_by().iterator(chunk_size=10000)
+        for row in rows:
+            self.add_edge(*row)
+
+    def apply_changes(self, changes):
+        """
+        ``changes`` are ``('add', *add_edge args)``, ``('remove', *remove_edge
+        args)`` or ``('move', ad, user)``.
+        """
+        handlers = {'add': self.add_edge, 'remove': self.remove_edge, 'move': self.move_ad}
+        for name, *args in changes:
+            handlers[name](*args)
+
+    # Search.
+
+    def _distances_to(self, start, max_length):
+        """Fewest hops from each ad back to ``start``, up to ``max_length - 1``."""
+        distances = {start: 0}
+        queue = deque([start])
+        while queue:
+            ad = queue.popleft()
+            distance = distances[ad] + 1
+            if distance >= max_length:
+                continue
+            for previous in self.pred.get(ad, ()):
+                if previous not in distances:
+                    distances[previous] = distance
+                    queue.append(previous)
+        return distances
+
+    def _cycles_of_length(self, start, length, distances, budget):
+        """
+        Yield cycles of exactly ``length`` ads through ``start`` whose ads all
+        have different owners. An ad is only entered when the remaining hops
+        can still reach ``start`` in time, which prunes most of the graph.
+        """
+        path = [start]
+        owners = {self.owner[start]}
+        stack = [iter(self.succ.get(start, ()))]
+        while stack:
+            ad = next(stack[-1], None)
+            if ad is None:
+                stack.pop()
+                owners.discard(self.owner[path.pop()])
+                continue
+            budget[0] -= 1
+            if budget[0] < 0:
+                return
+            if ad == start:
+                if len(path) == length:
+                    yield list(path)
+                continue
+            distance = distances.get(ad)
+            if distance is None or len(path) + distance > length or self.owner[ad] in owners:
+                continue
+            path.append(ad)
+            owners.add(self.owner[ad])
+            stack.append(iter(self.succ.get(ad, ())))
+
+    def find_cycles(self, ad_ids, max_length=4, limit=10, max_steps=100000):
+        """
+        Up to ``limit`` cycles through any of ``ad_ids``, shortest first. Each
+        cycle is ``(ads, proposals)`` where ``proposals[i]`` goes from
+        ``ads[i]`` to the next ad. ``max_steps`` bounds the edges explored.
+        """
+        with self.lock:
+            starts = [ad for ad in ad_ids if ad in self.succ and ad in self.pred]
+            distances = {start: self._distances_to(start, max_length) for start in starts}
+            budget = [max_steps]
+            cycles = []
+            for length in range(2, max_length + 1):
+                for start in starts:
+                    for ads in self._cycles_of_length(start, length, distances[start], budget):
+                        proposals = [self.succ[ad][ads[(i + 1) % length]] for i, ad in enumerate(ads)]
+                        cycles.append((ads, proposals))
+                        if len(cycles) == limit:
+                            return cycles
+            return cycles
+
+
+trade_graph = TradeGraph()
+
+
+def record_changes(changes):
+    """Patch the graph of every process with ``changes`` once the current transaction commits."""
+    trade_graph.record(changes)
+
+
+def invalidate():
+    """Make every process reload the graph, e.g. after bulk writes that skip the signals."""
+    trade_graph.invalidate()
@@ -1,4 +1,5 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import include, path
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework_simplejwt.views import (
@@ -6,12 +7,13 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from .views import (
-    AdListView, AdCreateView, AdDetailView, AdUpdateView, AdDeleteView,
-    ProposalCreateView, ProposalListView, ProposalUpdateView, generate_ads
+    AdListView, AdCreateView, AdDetailView, AdUpdateView, AdDeleteView, AdThumbnailView,
+    ProposalCreateView, ProposalListView, ProposalUpdateView
 )
 from .api_views import (
-    AdListCreateAPIView, AdRetrieveUpdateDestroyAPIView,
-    ExchangeProposalListCreateAPIView, ExchangeProposalRetrieveUpdateAPIView)
+    AdExportAPIView, AdImportAPIView, AdListCreateAPIView, AdRetrieveUpdateDestroyAPIView, AdSuggestionAPIView,
+    ExchangeProposalBatchAPIView, ExchangeProposalExportAPIView, ExchangeProposalListCreateAPIView,
+    ExchangeProposalRetrieveUpdateAPIView, TradeCycleAPIView)
 
 urlpatterns = [
     path('', AdListView.as_view(), name='ad_list'),
@@ -19,11 +21,11 @@ urlpatterns = [
     path('<int:pk>/', AdDetailView.as_view(), name='ad_detail'),
     path('<int:pk>/edit/', AdUpdateView.as_view(), name='ad_edit'),
     path('<int:pk>/delete/', AdDeleteView.as_view(), name='ad_delete'),
+    path('<int:pk>/thumbnails/<slug:size>/<slug:digest>.jpg', AdThumbnailView.as_view(), name='ad_thumbnail'),
 
     path('<int:ad_receiver_pk>/propose/', ProposalCreateView.as_view(), name='send_proposal'),
     path('proposals/', ProposalListView.as_view(), name='manage_proposals'),
     path('proposals/<int:pk>/update/', ProposalUpdateView.as_view(), name='update_proposal_status'),
-    path('generate/', generate_ads, name='generate_ads')
 ]
 
 schema_view = get_schema_view(
@@ -37,12 +39,21 @@ schema_view = get_schema_view(
 
 api_urlpatterns = [
     path('api/ads/', AdListCreateAPIView.as_view(), name='api_ad_list'),
+    path('api/ads/export/', AdExportAPIView.as_view(), name='api_ad_export'),
+    path('api/ads/import/', AdImportAPIView.as_view(), name='api_ad_import'),
     path('api/ads/<int:pk>/', AdRetrieveUpdateDestroyAPIView.as_view(), name='api_ad_detail'),
+    path('api/ads/<int:pk>/suggestions/', AdSuggestionAPIView.as_view(), name='api_ad_suggestions'),
     path('api/proposals/', ExchangeProposalListCreateAPIView.as_view(), name='api_proposal_list'),
+    path('api/proposals/export/', ExchangeProposalExportAPIView.as_view(), name='api_proposal_export'),
+    path('api/proposals/batch/', ExchangeProposalBatchAPIView.as_view(), name='api_proposal_batch'),
     path('api/proposals/<int:pk>/', ExchangeProposalRetrieveUpdateAPIView.as_view(), name='api_proposal_detail'),
+    path('api/trade-cycles/', TradeCycleAPIView.as_view(), name='api_trade_cycles'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/docs/', schema_view.with_ui('swagger', cache_timeout=0), name='api-docs'),
 ]
 
 urlpatterns += api_urlpatterns
+
+if settings.ASYNC_API_ENABLED:
+    urlpatterns.append(path('', include('ads.async_urls')))
@@ -1,13 +1,16 @@
 from django.core.exceptions import PermissionDenied
-from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count
+from django.shortcuts import get_object_or_404, redirect
+from django.db.models import Count, Q
 from django.urls import reverse_lazy
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from .cache import CachedResponseMixin
+from .facets import ad_facets
 from .forms import AdForm, ProposalForm, ProposalStatusForm
-from django.http import HttpResponse
-from django.utils import timezone
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.views import View
 from django.views.generic import (
     ListView,
     DetailView,
@@ -16,6 +19,12 @@ from django.views.generic import (
     DeleteView,
 )
 from .models import Ad, ExchangeProposal
+from .pagination import CURSOR_PARAM, CountedPaginator, InvalidCursor, keyset_page
+from .proposals import ProposalConflict, decide_proposal
+from .recommendations import ranked_ads, recommendations
+from .search import search_ads
+from .stats import get_user_stats
+from .thumbnails import ThumbnailError, cached_path, get_thumbnail, thumbnail_digest, thumbnail_url
 
 
 class SignUpView(CreateView):
@@ -29,31 +38,43 @@ class SignUpView(CreateView):
         return response
 
 
-class AdListView(ListView):
+class AdListView(CachedResponseMixin, ListView):
     model = Ad
     template_name = "ads/ad_list.html"
     context_object_name = "ads"
     paginate_by = 9
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('user')
         category = self.request.GET.get("category")
         search_query = self.request.GET.get("search")
         condition = self.request.GET.get("condition")
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) | Q(description__icontains=search_query)
-            )
+            queryset = search_ads(queryset, search_query)
         if category:
             queryset = queryset.filter(category=category)
         if condition:
             queryset = queryset.filter(condition=condition)
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        if CURSOR_PARAM not in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            ads, self.next_cursor = keyset_page(queryset, self.request.GET[CURSOR_PARAM], page_size)
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return None, None, ads, False
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Ad.CATEGORY_CHOICES
-        context['conditions'] = Ad.CONDITION_CHOICES
+        if CURSOR_PARAM in self.request.GET:
+            params = self.request.GET.copy()
+            params.pop('page', None)
+            params[CURSOR_PARAM] = self.next_cursor
+            context['load_more'] = True
+            context['next_cursor_query'] = params.urlencode() if self.next_cursor else None
+        context['facets'] = ad_facets(self.request.GET.get('search', ''), selected=self.request.GET)
         return context
 
 
@@ -71,27 +92,35 @@ class AdCreateView(LoginRequiredMixin, CreateView):
         return reverse_lazy('ad_detail', kwargs={'pk': self.object.pk})
 
 
-class AdDetailView(DetailView):
+class AdDetailView(CachedResponseMixin, DetailView):
+    cache_namespaces = ('ads', 'proposals')
     model = Ad
     template_name = "ads/ad_detail.html"
     context_object_name = "ad"
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('user__stats')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['exchange_proposals'] = ExchangeProposal.objects.filter(
             Q(ad_sender=self.object) | Q(ad_receiver=self.object)
         )
 
+        own, similar = [], []
+        if recommendations.sync():
+            own, similar = recommendations.suggest(self.object, self.request.user.pk, settings.RECOMMENDATION_LIMIT)
+        else:
+            self.partial_response = True  # Without similar listings while the index loads.
+        context['similar_ads'] = ranked_ads(similar)
         if self.request.user.is_authenticated:
-            context['user_ads'] = Ad.objects.filter(user=self.request.user)
-
-        ad_user = self.object.user
-        proposal_counts = ExchangeProposal.objects.aggregate(
-            sent_count=Count('id', filter=Q(ad_sender__user=ad_user)),
-            received_count=Count('id', filter=Q(ad_receiver__user=ad_user))
-        )
+            # Best swaps first; ads with nothing in common keep their usual order after them.
+            rank = {ad_id: index for index, (ad_id, _) in enumerate(own)}
+            context['user_ads'] = sorted(
+                Ad.objects.filter(user=self.request.user), key=lambda item: rank.get(item.pk, len(rank)),
+            )
 
-        context['user_proposals'] = proposal_counts
+        context['owner_stats'] = get_user_stats(self.object.user)
         return context
 
 
@@ -158,126 +187,91 @@ class ProposalUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         proposal = self.get_object()
         return self.request.user == proposal.ad_receiver.user
 
+    def form_valid(self, form):
+        try:
+            decide_proposal(self.object, form.cleaned_data['status'])
+        except ProposalConflict as error:
+            form.add_error('status', str(error))
+            return self.form_invalid(form)
+        return redirect(self.get_success_url())
+
 
 class ProposalListView(LoginRequiredMixin, ListView):
     model = ExchangeProposal
     template_name = "ads/proposals.html"
     context_object_name = "proposals"
+    paginate_by = 20
 
     def get_queryset(self):
-        queryset = super().get_queryset()
         user = self.request.user
+        queryset = ExchangeProposal.objects.filter(Q(ad_sender__user=user) | Q(ad_receiver__user=user))
         status = self.request.GET.get("status")
+        status_filter = Q(status=status) if status else Q()
+        # Tab totals, per-status totals and the paginator count in one aggregate.
+        self.counts = queryset.aggregate(
+            total=Count('pk', filter=status_filter),
+            received=Count('pk', filter=status_filter & Q(ad_receiver__user=user)),
+            sent=Count('pk', filter=status_filter & Q(ad_sender__user=user)),
+            **{value: Count('pk', filter=Q(status=value)) for value, _ in ExchangeProposal.STATUS_CHOICES},
+        )
         if status:
             queryset = queryset.filter(status=status)
-        return queryset.filter(
-            Q(ad_sender__user=user) | Q(ad_receiver__user=user)
-        )
+        return queryset.select_related('ad_sender__user', 'ad_receiver__user').order_by('-created_at', '-pk')
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return CountedPaginator(queryset, per_page, self.counts['total'], orphans=orphans,
+                                allow_empty_first_page=allow_empty_first_page, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['status_choices'] = ExchangeProposal.STATUS_CHOICES
+        context['status_choices'] = [
+            (value, label, self.counts[value]) for value, label in ExchangeProposal.STATUS_CHOICES
+        ]
+        context['proposal_counts'] = self.counts
 
         user = self.request.user
-        context['received_proposals'] = self.object_list.filter(ad_receiver__user=user)
-        context['sent_proposals'] = self.object_list.filter(ad_sender__user=user)
+        received, sent = [], []
+        for proposal in context['proposals']:
+            (received if proposal.ad_receiver.user_id == user.pk else sent).append(proposal)
+        context['received_proposals'] = received
+        context['sent_proposals'] = sent
 
         return context
 
 
-def generate_ads(request):
-    from django.contrib.auth.models import User
-    import random
-    ad_data = [
-        {
-            'title': 'iPhone 13 Pro - 128GB',
-            'description': 'Like new iPhone 13 Pro with original box and accessories. Battery health 98%.',
-            'image_url': 'https://example.com/iphone13.jpg',
-            'category': 'electronics',
-            'condition': 'new',
-            'created_at': timezone.now() - timezone.timedelta(days=2)
-        },
-        {
-            'title': 'Samsung Galaxy S21 Ultra',
-            'description': 'Excellent condition, no scratches. Comes with case and screen protector.',
-            'image_url': 'https://example.com/s21ultra.jpg',
-            'category': 'electronics',
-            'condition': 'used',
-            'created_at': timezone.now() - timezone.timedelta(days=5)
-        },
-        {
-            'title': 'Nike Air Jordan 1 Retro',
-            'description': 'Size 10.5, worn twice. Original box included.',
-            'image_url': 'https://example.com/jordans.jpg',
-            'category': 'clothing',
-            'condition': 'used',
-            'created_at': timezone.now() - timezone.timedelta(days=1)
-        },
-        {
-            'title': 'Harry Potter Book Set',
-            'description': 'Complete 7-book collection in great condition. No markings inside.',
-            'image_url': 'https://example.com/harrypotter.jpg',
-            'category': 'books',
-            'condition': 'used',
-            'created_at': timezone.now() - timezone.timedelta(hours=3)
-        },
-        {
-            'title': 'Instant Pot Duo 7-in-1',
-            'description': 'Brand new in box. Never opened.',
-            'image_url': 'https://example.com/instantpot.jpg',
-            'category': 'home',
-            'condition': 'new',
-            'created_at': timezone.now() - timezone.timedelta(days=7)
-        },
-        {
-            'title': 'Vintage Leather Jacket',
-            'description': 'Genuine leather, size M. Some wear but still stylish.',
-            'image_url': 'https://example.com/jacket.jpg',
-            'category': 'clothing',
-            'condition': 'broken',
-            'created_at': timezone.now() - timezone.timedelta(days=10)
-        },
-        {
-            'title': 'Bose QuietComfort 35 II',
-            'description': 'Wireless headphones with excellent noise cancellation. Includes carrying case.',
-            'image_url': 'https://example.com/bose.jpg',
-            'category': 'electronics',
-            'condition': 'used',
-            'created_at': timezone.now() - timezone.timedelta(hours=12)
-        },
-        {
-            'title': 'IKEA KALLAX Shelf Unit',
-            'description': 'White 4x2 cube organizer. Some scratches but fully functional.',
-            'image_url': 'https://example.com/kallax.jpg',
-            'category': 'home',
-            'condition': 'used',
-            'created_at': timezone.now() - timezone.timedelta(days=3)
-        },
-        {
-            'title': 'Nintendo Switch OLED',
-            'description': 'Complete set with dock, 2 joycons, and Mario Kart game.',
-            'image_url': 'https://example.com/switch.jpg',
-            'category': 'electronics',
-            'condition': 'new',
-            'created_at': timezone.now() - timezone.timedelta(hours=1)
-        },
-        {
-            'title': 'Designer Sunglasses',
-            'description': 'Ray-Ban Wayfarer, authentic. Minor scratch on left lens.',
-            'image_url': 'https://example.com/rayban.jpg',
-            'category': 'other',
-            'condition': 'broken',
-            'created_at': timezone.now() - timezone.timedelta(days=15)
-        }
-    ]
-    users = User.objects.all()
-    for ad in ad_data:
-        Ad.objects.create(
-            user=random.choice(users),
-            title=ad['title'],
-            description=ad['description'],
-            category=ad['category'],
-            condition=ad['condition'],
-            created_at=ad['created_at']
-        )
-    return HttpResponse("Ads generated successfully.")
+class AdThumbnailView(View):
+    """
+    A resized ad image. The URL embeds a digest of the image URL, so a
+    response never changes and is cached for ``THUMBNAIL_MAX_AGE``.
+    """
+
+    def get(self, request, pk, size, digest):
+        if size not in settings.THUMBNAIL_SIZES:
+            raise Http404
+        etag = f'"{digest}"'
+        if request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified()
+
+        path = cached_path(digest)
+        if path is not None:
+            try:
+                return self.file_response(path, etag)
+            except FileNotFoundError:
+                pass  # Evicted by another worker since the lookup; render it again.
+
+        ad = get_object_or_404(Ad.objects.only('image_url'), pk=pk)
+        if not ad.image_url:
+            raise Http404
+        if thumbnail_digest(ad.image_url, size) != digest:
+            # The image changed since the page linking here was rendered.
+            return redirect(thumbnail_url(ad, size))
+        try:
+            return self.file_response(get_thumbnail(ad.image_url, size), etag)
+        except (ThumbnailError, FileNotFoundError):
+            raise Http404
+
+    def file_response(self, path, etag):
+        response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+        response['Cache-Control'] = f'public, max-age={settings.THUMBNAIL_MAX_AGE}, immutable'
+        response['ETag'] = etag
+        return response
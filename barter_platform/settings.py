@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import importlib.util
 import os
 from pathlib import Path
 from datetime import timedelta
@@ -60,6 +61,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its latency covers every other middleware.
+    'ads.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,14 +95,112 @@ WSGI_APPLICATION = 'barter_platform.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned for several worker processes. WAL lets readers run alongside
+# the writer; IMMEDIATE transactions take the write lock when they begin, so
+# competing writers wait out the busy timeout instead of failing with
+# "database is locked" on a lock upgrade. Connections are kept across
+# requests and checked before reuse.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024)),  # Negative values are KiB.
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH') or BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+            'transaction_mode': os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
     }
 }
 
 
+# The local-memory default suits a single process. Versions of cached
+# responses and in-memory indexes must be seen by every worker, so run
+# several behind a shared cache, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://127.0.0.1:6379 (checked by ads.checks).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'barter-platform'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))},
+    }
+}
+
+# Anonymous ad pages are cached until an Ad write bumps their version;
+# the timeout only bounds how long unused entries occupy the cache.
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+# Facet counts of the ad list (ads.facets), cached per search and filters.
+FACET_CACHE_TIMEOUT = 60 * 60
+
+# In-memory indexes (ads.indexes) replay other workers' changes from a log in
+# the cache: how long entries are kept, the most entries replayed before a
+# full reload instead, and how long a missing entry may be waited for.
+INDEX_LOG_TIMEOUT = 60 * 60
+INDEX_LOG_MAX_GAP = 1000
+INDEX_LOG_WAIT = 10
+
+# Trade cycle search: longest cycle a client may ask for, and the number of
+# graph edges one search may explore before returning what it has found.
+TRADE_CYCLE_MAX_LENGTH = 5
+TRADE_CYCLE_MAX_STEPS = 200000
+
+# Suggested trades (ads.recommendations): listings shown per ad, the strongest
+# terms of an ad that are matched and the postings they may read in total,
+# and the score bonus for the same category.
+RECOMMENDATION_LIMIT = 5
+RECOMMENDATION_QUERY_TERMS = 24
+RECOMMENDATION_MAX_POSTINGS = 100000
+RECOMMENDATION_CATEGORY_BOOST = 0.25
+
+# Experimental async API views (ads.async_views) under /api/async/, routed only
+# when enabled, and the threads running them in each ASGI worker, each keeping
+# its database connection across requests.
+ASYNC_API_ENABLED = os.getenv('ASYNC_API_ENABLED', '').lower() in ('1', 'true', 'yes')
+ASYNC_API_THREADS = int(os.getenv('ASYNC_API_THREADS', 4))
+
+# Rows per query of the streaming exports (ads.exports).
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 2000))
+
+# Bulk ad import (ads.imports): rows validated and inserted per transaction,
+# and the most row errors listed in one report.
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+IMPORT_MAX_ERRORS = 1000
+
+# Ad image thumbnails (ads.thumbnails): name -> (width, height, crop to fill).
+THUMBNAIL_SIZES = {
+    'card': (640, 400, True),
+    'small': (400, 400, False),
+    'detail': (1200, 1200, False),
+}
+THUMBNAIL_CACHE_DIR = os.getenv('THUMBNAIL_CACHE_DIR') or BASE_DIR / 'thumbnail_cache'
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv('THUMBNAIL_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Dotted path of a callable taking an image URL and returning its bytes.
+THUMBNAIL_FETCHER = 'ads.thumbnails.fetch'
+THUMBNAIL_FETCH_TIMEOUT = 5
+THUMBNAIL_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+THUMBNAIL_FAILURE_TIMEOUT = 5 * 60
+THUMBNAIL_MAX_AGE = 365 * 24 * 60 * 60
+
+# Request metrics served at /metrics. With several worker processes, point
+# METRICS_DIR at a directory shared by them (emptied on master start) so the
+# endpoint sums every worker; unset, it reports the serving process only.
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+# When set, scrapes must send "Authorization: Bearer <token>".
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -123,23 +224,45 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'ads.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 9
+    'PAGE_SIZE': 9,
+    'DEFAULT_RENDERER_CLASSES': [
+        'ads.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# MessagePack is optional: offered to clients only when the package is installed.
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('ads.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('ads.renderers.MessagePackParser')
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Rotated refresh tokens are revoked through ads.RevokedToken, not the token_blacklist app.
+    'TOKEN_REFRESH_SERIALIZER': 'ads.tokens.TokenRefreshSerializer',
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# API users are resolved through the cache; saving or deleting a user drops
+# their entry. The stateless mode serves GET/HEAD/OPTIONS from the token
+# claims alone, without the user row.
+JWT_USER_CACHE_TIMEOUT = 60
+JWT_STATELESS_SAFE_METHODS = os.getenv('JWT_STATELESS_SAFE_METHODS', '').lower() in ('1', 'true', 'yes')
+
 SWAGGER_SETTINGS = {
    'SECURITY_DEFINITIONS': {
       'Bearer': {